@@ -8,4 +8,80 @@ class Settings:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     OPENAI_API_KEY1 = os.getenv("OPENAI_API_KEY1")
+    # "batch" grades every document with its own call, run concurrently;
+    # "single_call" grades all retrieved documents in one structured call;
+    # "local" scores documents in-process and asks the LLM only about those
+    # scoring between GRADER_LOCAL_REJECT and GRADER_LOCAL_ACCEPT.
+    GRADER_MODE = os.getenv("GRADER_MODE", "batch")
+    GRADER_MAX_CONCURRENCY = int(os.getenv("GRADER_MAX_CONCURRENCY", "4"))
+    GRADER_LOCAL_DENSE_WEIGHT = float(os.getenv("GRADER_LOCAL_DENSE_WEIGHT", "0.6"))
+    GRADER_LOCAL_ACCEPT = float(os.getenv("GRADER_LOCAL_ACCEPT", "0.6"))
+    GRADER_LOCAL_REJECT = float(os.getenv("GRADER_LOCAL_REJECT", "0.35"))
+    # Local stage before the LLM query classifier: "off", "rules" (tax
+    # vocabulary) or "centroid" (rules, then nearest centroid of example
+    # question embeddings, deciding when one beats the other by the margin).
+    PRECLASSIFIER = os.getenv("PRECLASSIFIER", "off")
+    PRECLASSIFIER_MARGIN = float(os.getenv("PRECLASSIFIER_MARGIN", "0.08"))
+    PRECLASSIFIER_EXAMPLES = os.getenv("PRECLASSIFIER_EXAMPLES")
+    # Web search fallback: results cached per query for WEB_SEARCH_CACHE_TTL
+    # seconds, WEB_SEARCH_TIMEOUT seconds for the whole node, and optionally
+    # the original question searched alongside the rewritten one.
+    WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "3600"))
+    WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512"))
+    WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "8"))
+    WEB_SEARCH_ORIGINAL_QUERY = os.getenv("WEB_SEARCH_ORIGINAL_QUERY", "false").lower() == "true"
+    # Rewrites kept per normalised question. REWRITE_MODE "race" runs the
+    # rewrite alongside a web search on the raw question and uses whichever
+    # search returns results first, instead of rewriting before searching.
+    REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "1024"))
+    REWRITE_MODE = os.getenv("REWRITE_MODE", "sequential")
+    # Build the LLM, embedding and search clients, the chains and the graph
+    # at startup; when false each is built on its first use.
+    PREWARM = os.getenv("PREWARM", "true").lower() == "true"
+    # Add a Server-Timing header with per-node durations to responses.
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+    # Vector-db service used by the retrieve node
+    VECTOR_DB_URL = os.getenv("VECTOR_DB_URL", "http://3.109.157.165:5001")
+    VECTOR_DB_TIMEOUT = float(os.getenv("VECTOR_DB_TIMEOUT", "10"))
+    VECTOR_DB_CONNECT_TIMEOUT = float(os.getenv("VECTOR_DB_CONNECT_TIMEOUT", "2"))
+    VECTOR_DB_MAX_RETRIES = int(os.getenv("VECTOR_DB_MAX_RETRIES", "2"))
+    VECTOR_DB_RETRY_BACKOFF = float(os.getenv("VECTOR_DB_RETRY_BACKOFF", "0.2"))
+    VECTOR_DB_MAX_CONNECTIONS = int(os.getenv("VECTOR_DB_MAX_CONNECTIONS", "20"))
+    VECTOR_DB_BREAKER_THRESHOLD = int(os.getenv("VECTOR_DB_BREAKER_THRESHOLD", "5"))
+    VECTOR_DB_BREAKER_RESET = float(os.getenv("VECTOR_DB_BREAKER_RESET", "30"))
+    # Start the vector lookup while the query is still being classified.
+    SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+    # Question embedding cache; the SQLite tier is off unless a path is set.
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+    # Concurrent /response requests for the same normalised question share
+    # one graph run.
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+    # Admission control: graph runs in flight at once (0 disables it),
+    # requests allowed to wait for a slot, and seconds they may wait.
+    # Overflow is rejected with 429, expired waits with 503.
+    MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "32"))
+    MAX_QUEUE = int(os.getenv("MAX_QUEUE", "64"))
+    QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "10"))
+    # Retries of transient LLM errors (connection, rate limit, 5xx) and the
+    # initial backoff in seconds; the OpenAI client itself does not retry.
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "1"))
+    # Requests per second (and burst) allowed to each upstream, shared by
+    # all nodes; a rate of 0 leaves the upstream unlimited.
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0"))
+    LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "10"))
+    EMBEDDINGS_RATE_LIMIT = float(os.getenv("EMBEDDINGS_RATE_LIMIT", "0"))
+    EMBEDDINGS_RATE_BURST = int(os.getenv("EMBEDDINGS_RATE_BURST", "10"))
+    WEB_SEARCH_RATE_LIMIT = float(os.getenv("WEB_SEARCH_RATE_LIMIT", "0"))
+    WEB_SEARCH_RATE_BURST = int(os.getenv("WEB_SEARCH_RATE_BURST", "5"))
+    # Answer cache in front of the graph: "memory", "sqlite" or "none".
+    ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+    ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3")
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    # Cosine similarity for a semantic (near-duplicate) hit; at 1 only the
+    # exact normalised question hits. Near-duplicates that differ in a year
+    # or section number are never matched.
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "1"))
 settings = Settings()
\ No newline at end of file
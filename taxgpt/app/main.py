@@ -1,13 +1,65 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.core.config import settings
 from app.routes.response import router as response_router
+from app.services import metrics
+from app.services.admission import Overloaded
+from app.services.lazy import prewarm
+from app.services.workflow import vector_db_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.PREWARM:
+        timings = await asyncio.to_thread(prewarm)
+        logging.info(f"Prewarmed {len(timings)} components in"
+                     f" {sum(timings.values()):.2f}s.")
+    # The pooled vector-db connections live as long as the server does.
+    yield
+    await vector_db_client.aclose()
+
 
 app = FastAPI(
     title="Tax Assistance API",
     version="1.0",
-    description="API for tax-related question answering"
+    description="API for tax-related question answering",
+    lifespan=lifespan
 )
 
-# Include routes
-app.include_router(response_router)
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Time each request and, if enabled, report node timings to the client.
+
+    A streamed response sends its headers before the graph has run, so its
+    Server-Timing header only covers the time to the first byte.
+    """
+    timings = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(
+        elapsed, method=request.method,
+        path=route.path if route else "unmatched",
+        status=response.status_code)
+    if settings.SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics.server_timing(timings,
+                                                                  elapsed)
+    return response
 
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """Turn an admission rejection into a 429/503 with Retry-After."""
+    return JSONResponse(status_code=exc.status_code,
+                        content={"detail": exc.detail},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+# Include routes
+app.include_router(response_router)
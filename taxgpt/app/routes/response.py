@@ -1,23 +1,78 @@
+import json
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from app.models.input_model import InputModel
 from app.models.output_model import OutputModel
-from app.services.workflow import tax_app
-from pprint import pprint
+from app.services.cache import normalize_question
+from app.services.metrics import registry
+from app.services import workflow
+from app.services.workflow import (answer_cache, astream_tax_app, embeddings,
+                                   preclassifier, web_searcher)
 
 router = APIRouter()
 
 @router.post("/response", response_model=OutputModel)
 async def get_response(inputs: InputModel):
-    initial_state = {
-        "question": inputs.question,
-        "generation": "",
-        "web_search": "No",
-        "documents": [],
-        "query_type": "",
+    # Identical questions arriving together share one graph run.
+    flight = workflow.response_flight
+    if flight is None:
+        generation = await workflow.arun_tax_app(inputs.question)
+    else:
+        generation = await flight.run(
+            normalize_question(inputs.question),
+            lambda: workflow.arun_tax_app(inputs.question))
+    return {"generation": generation}
+
+
+@router.post("/response/stream")
+async def stream_response(inputs: InputModel):
+    """Stream node progress and answer tokens as newline-delimited JSON."""
+    # The slot is taken before the headers go out, so an overloaded server
+    # can still answer 429/503 instead of a stream.
+    admission = workflow.admission
+    if admission is not None:
+        await admission.acquire()
+    released = False
+
+    def release():
+        # Runs from the generator and again as the background task, which
+        # also covers a body that is never iterated; only the first call
+        # frees the slot.
+        nonlocal released
+        if admission is not None and not released:
+            released = True
+            admission.release()
+
+    async def events():
+        try:
+            async for event in astream_tax_app(inputs.question):
+                yield json.dumps(event) + "\n"
+        finally:
+            release()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson",
+                             background=BackgroundTask(release))
+
+
+@router.get("/stats")
+async def stats():
+    """Counters of the caches, admission control, request coalescing and
+    the pre-classifier."""
+    return {
+        "admission": (workflow.admission.stats()
+                      if workflow.admission else None),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "coalescing": (workflow.response_flight.stats()
+                       if workflow.response_flight else None),
+        "embeddings": embeddings.stats(),
+        "preclassifier": preclassifier.stats() if preclassifier else None,
+        "web_search": web_searcher.stats(),
     }
-    for output in tax_app.stream(initial_state):
-        for key, value in output.items():
-            pprint(f"Node '{key}':")
 
-    return {"generation": value["generation"]}
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Node, LLM and request metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(),
+                             media_type="text/plain; version=0.0.4")
@@ -0,0 +1,134 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.services.metrics import ADMISSION, QUEUE_WAIT_SECONDS
+
+
+class Overloaded(Exception):
+    """Raised when a request is turned away by admission control.
+
+    Args:
+        status_code (int): 429 when the wait queue is full, 503 when the
+            request waited past the queue deadline.
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+
+    def __init__(self, status_code, retry_after, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class AdmissionController:
+    """Caps the graph runs in flight, with a bounded FIFO wait queue.
+
+    A request is admitted straight away while fewer than `max_in_flight`
+    runs are going. Otherwise it waits in the queue for at most
+    `queue_timeout` seconds, and is rejected at once if `max_queue`
+    requests are already waiting. Rejections carry a Retry-After estimate
+    from the recent run time and the queue length, so a burst fails fast
+    instead of every request slowly timing out upstream.
+
+    Args:
+        max_in_flight (int): Graph runs allowed at the same time.
+        max_queue (int): Requests allowed to wait for a slot.
+        queue_timeout (float): Seconds a request may wait for a slot.
+    """
+
+    def __init__(self, max_in_flight=32, max_queue=64, queue_timeout=10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self._run_seconds = None
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        run_seconds = self._run_seconds or 1.0
+        rounds = (self.waiting + self.in_flight) / self.max_in_flight
+        return max(1, math.ceil(rounds * run_seconds))
+
+    def _reject(self, status_code, result, detail):
+        ADMISSION.inc(result=result)
+        raise Overloaded(status_code, self.retry_after(), detail)
+
+    async def acquire(self):
+        """Wait for a run slot; raises `Overloaded` if none is given."""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            ADMISSION.inc(result="admitted")
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject(429, "rejected_queue_full",
+                         "Too many requests are waiting; try again later.")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            # A slot handed over just as the wait timed out or the caller
+            # was cancelled is passed on, not lost.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(503, "rejected_timeout",
+                             "The service is busy; try again later.")
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+        ADMISSION.inc(result="admitted")
+
+    def release(self):
+        """Give the slot to the next waiter, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record(self, seconds):
+        # Exponential moving average of run time, for Retry-After.
+        if self._run_seconds is None:
+            self._run_seconds = seconds
+        else:
+            self._run_seconds = 0.8 * self._run_seconds + 0.2 * seconds
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a run slot for the duration of the block."""
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(time.perf_counter() - started)
+            self.release()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "recent_run_seconds": self._run_seconds,
+        }
+
+
+def build_admission_controller(max_in_flight, max_queue, queue_timeout):
+    """The controller, or None when `max_in_flight` is 0 (unlimited)."""
+    if max_in_flight <= 0:
+        return None
+    return AdmissionController(max_in_flight, max_queue, queue_timeout)
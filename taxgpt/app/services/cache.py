@@ -0,0 +1,319 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def normalize_question(question):
+    """Canonical form of a question used as the exact-match cache key."""
+    question = re.sub(r"\s+", " ", question).strip().lower()
+    return question.rstrip("?.! ")
+
+
+def references(question):
+    """Tokens of a question containing a digit: sections, years, amounts.
+
+    "80C limit for AY 2023-24" gives {"80c", "2023-24"}. Questions that
+    differ only in these can embed almost identically but need different
+    answers.
+    """
+    return frozenset(token.rstrip(".-/") for token in
+                     re.findall(r"[\w().\-/]*\d[\w().\-/]*", question.lower()))
+
+
+def _unit(vector):
+    """Return the embedding as a unit-length float32 array."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LRUCache:
+    """Size-bounded mapping with optional per-entry TTL and LRU eviction.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used one
+            is evicted.
+        ttl (float | None): Seconds an entry stays valid, or None to keep
+            entries until they are evicted.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at):
+        return self.ttl is not None and self._clock() - created_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, created_at = entry
+            if self._expired(created_at):
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def items(self):
+        """Return the live (key, value) pairs, dropping expired ones."""
+        with self._lock:
+            for key in [key for key, (_, created_at) in self._data.items()
+                        if self._expired(created_at)]:
+                del self._data[key]
+            return [(key, value) for key, (value, _) in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InMemoryBackend:
+    """Keeps cached answers and their question embeddings in process."""
+
+    def __init__(self, max_entries=1024, ttl=None, clock=time.monotonic):
+        self._entries = LRUCache(max_entries=max_entries, ttl=ttl, clock=clock)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def set(self, key, answer, embedding):
+        self._entries.set(key, (answer, embedding))
+
+    def embeddings(self):
+        """Return (key, embedding) for every live entry with an embedding."""
+        return [(key, embedding)
+                for key, (_, embedding) in self._entries.items()
+                if embedding is not None]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Keeps cached answers on disk so they survive restarts.
+
+    Recency is tracked in an `accessed_at` column; the least recently used
+    rows are deleted once the table grows past `max_entries`.
+    """
+
+    def __init__(self, path, max_entries=1024, ttl=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, answer TEXT NOT NULL,"
+                " embedding BLOB, created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)")
+
+    def _oldest_valid(self):
+        return float("-inf") if self.ttl is None else self._clock() - self.ttl
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE key = ? AND created_at >= ?",
+                (key, self._oldest_valid())).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE answers SET accessed_at = ? WHERE key = ?",
+                (self._clock(), key))
+            return row[0]
+
+    def set(self, key, answer, embedding):
+        blob = None if embedding is None else embedding.tobytes()
+        now = self._clock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                (key, answer, blob, now, now))
+            self._conn.execute(
+                "DELETE FROM answers WHERE created_at < ?",
+                (self._oldest_valid(),))
+            self._conn.execute(
+                "DELETE FROM answers WHERE key NOT IN (SELECT key FROM answers"
+                " ORDER BY accessed_at DESC LIMIT ?)", (self.max_entries,))
+
+    def embeddings(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, embedding FROM answers WHERE embedding IS NOT NULL"
+                " AND created_at >= ?", (self._oldest_valid(),)).fetchall()
+        return [(key, np.frombuffer(blob, dtype=np.float32))
+                for key, blob in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+class AnswerCache:
+    """Two-stage answer cache placed in front of the tax_app graph.
+
+    A lookup first tries the normalised question as an exact key, then the
+    nearest cached question by cosine similarity of the question embeddings
+    among those with the same `references`, so "AY 2023-24" never matches
+    "AY 2024-25" nor 80CCD(1) 80CCD(1B). Semantic lookup is disabled when
+    no embedding function is given or the threshold is 1 or above.
+
+    Args:
+        backend: `InMemoryBackend` or `SQLiteBackend`.
+        embeddings: LangChain embeddings object used for semantic lookup.
+        similarity_threshold (float): Minimum cosine similarity for a
+            semantic hit.
+    """
+
+    def __init__(self, backend, embeddings=None, similarity_threshold=0.95):
+        self.backend = backend
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # Embeddings computed during a missed lookup, reused by `store`.
+        self._pending = LRUCache(max_entries=256, ttl=600)
+
+    @property
+    def semantic(self):
+        return self.embeddings is not None and self.similarity_threshold < 1
+
+    def _nearest(self, key, embedding):
+        self._pending.set(key, embedding)
+        tokens = references(key)
+        candidates = [(candidate, vector)
+                      for candidate, vector in self.backend.embeddings()
+                      if references(candidate) == tokens]
+        if not candidates:
+            return None
+        keys = [candidate for candidate, _ in candidates]
+        matrix = np.stack([vector for _, vector in candidates])
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        logging.debug(f"Semantic cache match '{keys[best]}'"
+                      f" (similarity {scores[best]:.3f})")
+        return self.backend.get(keys[best])
+
+    def _record(self, answer, semantic=False):
+        if answer is None:
+            self.misses += 1
+        elif semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        return answer
+
+    def lookup(self, question):
+        """Return the cached answer for the question, or None."""
+        key = normalize_question(question)
+        answer = self.backend.get(key)
+        if answer is not None or not self.semantic:
+            return self._record(answer)
+        try:
+            embedding = _unit(self.embeddings.embed_query(key))
+        except Exception as e:
+            logging.error(f"Failed to embed question for cache lookup: {e}")
+            return self._record(None)
+        return self._record(self._nearest(key, embedding), semantic=True)
+
+    async def alookup(self, question):
+        """Async version of `lookup`."""
+        key = normalize_question(question)
+        answer = self.backend.get(key)
+        if answer is not None or not self.semantic:
+            return self._record(answer)
+        try:
+            embedding = _unit(await self.embeddings.aembed_query(key))
+        except Exception as e:
+            logging.error(f"Failed to embed question for cache lookup: {e}")
+            return self._record(None)
+        return self._record(self._nearest(key, embedding), semantic=True)
+
+    def _embedding_for(self, key):
+        embedding = self._pending.get(key)
+        if embedding is None and self.semantic:
+            try:
+                embedding = _unit(self.embeddings.embed_query(key))
+            except Exception as e:
+                logging.error(f"Failed to embed question for cache store: {e}")
+        return embedding
+
+    def store(self, question, answer):
+        """Cache the answer under the normalised question."""
+        key = normalize_question(question)
+        self.backend.set(key, answer, self._embedding_for(key))
+
+    async def astore(self, question, answer):
+        """Async version of `store`."""
+        key = normalize_question(question)
+        embedding = self._pending.get(key)
+        if embedding is None and self.semantic:
+            try:
+                embedding = _unit(await self.embeddings.aembed_query(key))
+            except Exception as e:
+                logging.error(f"Failed to embed question for cache store: {e}")
+        self.backend.set(key, answer, embedding)
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "size": len(self.backend),
+        }
+
+
+def build_answer_cache(embeddings):
+    """Create the answer cache described by the settings, or None."""
+    backend = settings.ANSWER_CACHE_BACKEND
+    if backend == "memory":
+        store = InMemoryBackend(max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                                ttl=settings.ANSWER_CACHE_TTL)
+    elif backend == "sqlite":
+        store = SQLiteBackend(settings.ANSWER_CACHE_PATH,
+                              max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                              ttl=settings.ANSWER_CACHE_TTL)
+    elif backend == "none":
+        return None
+    else:
+        raise ValueError(f"Unknown answer cache backend: {backend}")
+    return AnswerCache(store, embeddings=embeddings,
+                       similarity_threshold=settings.ANSWER_CACHE_SIMILARITY)
@@ -0,0 +1,175 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.cache import LRUCache
+
+
+def normalize_text(text):
+    """Canonical form of a text used in the embedding cache key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class SQLiteEmbeddingStore:
+    """Persistent tier of the embedding cache, one float32 blob per key."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?",
+                    (key,)).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32)
+        return found
+
+    def set_many(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in items])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed cache in front of a LangChain embeddings model.
+
+    Vectors are keyed by a hash of the model name, the kind of embedding
+    (query or document, which some models embed differently) and the
+    normalised text. Lookups go to an in-memory LRU tier first and then to
+    the optional SQLite tier; only the remaining misses reach the model, in
+    a single batched call.
+
+    Args:
+        underlying (Embeddings): The model to cache.
+        max_entries (int): Size of the in-memory LRU tier.
+        sqlite_path (str | None): Location of the persistent tier.
+        query_task_type (str | None): Task type passed to
+            `embed_documents` when a batch of queries is embedded in one
+            call (Gemini embeddings distinguish query and document tasks).
+        model_name (str | None): Name used in the cache keys; taken from
+            `underlying` when not given.
+    """
+
+    def __init__(self, underlying, max_entries=10000, sqlite_path=None,
+                 query_task_type=None, model_name=None):
+        self.underlying = underlying
+        self.model_name = (model_name
+                           or getattr(underlying, "model", None)
+                           or getattr(underlying, "model_name", None)
+                           or type(underlying).__name__)
+        self.query_task_type = query_task_type
+        self.memory = LRUCache(max_entries=max_entries)
+        self.disk = SQLiteEmbeddingStore(sqlite_path) if sqlite_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, kind, text):
+        payload = "\0".join([self.model_name, kind, normalize_text(text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        """Return cached vectors by key and the keys still missing."""
+        found = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+        self.memory_hits += len(found)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if self.disk is not None and missing:
+            from_disk = self.disk.get_many(missing)
+            for key, vector in from_disk.items():
+                self.memory.set(key, vector)
+            found.update(from_disk)
+            self.disk_hits += len(from_disk)
+            missing = [key for key in missing if key not in from_disk]
+        self.misses += len(missing)
+        return found, missing
+
+    def _save(self, keys, vectors, found):
+        items = [(key, np.asarray(vector, dtype=np.float32))
+                 for key, vector in zip(keys, vectors)]
+        for key, vector in items:
+            self.memory.set(key, vector)
+            found[key] = vector
+        if self.disk is not None and items:
+            self.disk.set_many(items)
+
+    def _texts_for(self, keys, texts, missing):
+        by_key = dict(zip(keys, texts))
+        return [by_key[key] for key in missing]
+
+    def embed_documents(self, texts):
+        keys = [self._key("document", text) for text in texts]
+        found, missing = self._lookup(keys)
+        if missing:
+            vectors = self.underlying.embed_documents(
+                self._texts_for(keys, texts, missing))
+            self._save(missing, vectors, found)
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_documents(self, texts):
+        keys = [self._key("document", text) for text in texts]
+        found, missing = self._lookup(keys)
+        if missing:
+            vectors = await self.underlying.aembed_documents(
+                self._texts_for(keys, texts, missing))
+            self._save(missing, vectors, found)
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text):
+        key = self._key("query", text)
+        found, missing = self._lookup([key])
+        if missing:
+            vector = await self.underlying.aembed_query(text)
+            self._save(missing, [vector], found)
+        return found[key].tolist()
+
+    def embed_queries(self, texts):
+        """Embed several queries, sending only the misses in one call."""
+        keys = [self._key("query", text) for text in texts]
+        found, missing = self._lookup(keys)
+        if missing:
+            pending = self._texts_for(keys, texts, missing)
+            if self.query_task_type is not None:
+                vectors = self.underlying.embed_documents(
+                    pending, task_type=self.query_task_type)
+            else:
+                vectors = [self.underlying.embed_query(text)
+                           for text in pending]
+            self._save(missing, vectors, found)
+        return [found[key].tolist() for key in keys]
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "memory_size": len(self.memory),
+            "disk_size": len(self.disk) if self.disk is not None else 0,
+        }
@@ -0,0 +1,321 @@
+"""In-process Prometheus-style metrics and per-request timings.
+
+Counters and histograms are kept in memory and rendered in the Prometheus
+text format by GET /metrics. Durations recorded while a request is being
+served are also collected per request, for the Server-Timing header.
+"""
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from bisect import bisect_left
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", r"\\").replace('"', r"\"")
+               .replace("\n", r"\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class Counter:
+    """Monotonic count per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labels, key)} {_number(value)}"
+                for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * len(self.buckets), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([], 0.0))
+        return sum(counts)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total))
+                            for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _label_text(self.labels, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics exported by this process."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "taxgpt_http_request_seconds", "HTTP request latency.",
+    ["method", "path", "status"])
+NODE_SECONDS = registry.histogram(
+    "taxgpt_node_seconds", "Wall time of each workflow node.", ["node"])
+BRANCHES = registry.counter(
+    "taxgpt_branch_total", "Routing decisions taken in the workflow.",
+    ["decision", "branch"])
+LLM_SECONDS = registry.histogram(
+    "taxgpt_llm_seconds", "LLM call latency by workflow node.",
+    ["node", "model"])
+LLM_TOKENS = registry.counter(
+    "taxgpt_llm_tokens_total", "LLM tokens used by workflow node.",
+    ["node", "type"])
+LLM_ERRORS = registry.counter(
+    "taxgpt_llm_errors_total", "Failed LLM calls by workflow node.", ["node"])
+RETRIES = registry.counter(
+    "taxgpt_retries_total",
+    "Retried calls to downstream services by workflow node.",
+    ["service", "node"])
+PRECLASSIFIER_DECISIONS = registry.counter(
+    "taxgpt_preclassifier_decisions_total",
+    "Query classifications by the stage that decided them.",
+    ["stage", "label"])
+COALESCED = registry.counter(
+    "taxgpt_coalesced_requests_total",
+    "/response requests that ran the graph or shared a run in flight.",
+    ["result"])
+ADMISSION = registry.counter(
+    "taxgpt_admission_total", "Admission decisions for graph runs.",
+    ["result"])
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "taxgpt_admission_queue_seconds",
+    "Time requests waited for a graph run slot.")
+UPSTREAM_WAIT_SECONDS = registry.histogram(
+    "taxgpt_upstream_wait_seconds",
+    "Time calls waited for an upstream rate-limit token.", ["upstream"])
+
+_timings = contextvars.ContextVar("timings", default=None)
+_node = contextvars.ContextVar("node", default="none")
+
+
+def start_request():
+    """Start collecting timings for the current request."""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+def record_timing(name, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def server_timing(timings, total=None):
+    """Server-Timing header value for the collected timings, in ms."""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def current_node():
+    """The workflow node being run in this context, or "none"."""
+    return _node.get()
+
+
+def _observe_node(node, seconds):
+    NODE_SECONDS.observe(seconds, node=node)
+    record_timing(node, seconds)
+
+
+def timed_node(node, func):
+    """Wrap a (sync or async) node function to record its wall time."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state):
+            start = time.perf_counter()
+            token = _node.set(node)
+            try:
+                return await func(state)
+            finally:
+                _node.reset(token)
+                _observe_node(node, time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state):
+        start = time.perf_counter()
+        token = _node.set(node)
+        try:
+            return func(state)
+        finally:
+            _node.reset(token)
+            _observe_node(node, time.perf_counter() - start)
+    return wrapper
+
+
+def counted_branch(decision, router):
+    """Wrap a conditional-edge function to count the branches it picks."""
+    @functools.wraps(router)
+    def wrapper(state):
+        branch = router(state)
+        BRANCHES.inc(decision=decision, branch=branch)
+        return branch
+    return wrapper
+
+
+# Tag `Runnable.with_retry` puts on the run of every attempt but the first.
+RETRY_TAG = "retry:attempt:"
+
+
+class LLMMetrics(BaseCallbackHandler):
+    """Callback handler recording LLM latency, tokens, errors and retries.
+
+    Calls are attributed to the graph node they were made from, taken from
+    the `langgraph_node` run metadata. Retries are seen only by a handler
+    attached to a `with_retry` runnable: it starts every attempt after the
+    first with a "retry:attempt:<n>" tag on the attempt's own run.
+    """
+
+    def __init__(self):
+        self._runs = {}
+
+    def _start(self, run_id, metadata):
+        metadata = metadata or {}
+        self._runs[run_id] = (metadata.get("langgraph_node", "none"),
+                              metadata.get("ls_model_name", "unknown"),
+                              time.perf_counter())
+
+    def _count_retry(self, tags, metadata):
+        if any(tag.startswith(RETRY_TAG) for tag in tags or ()):
+            RETRIES.inc(service="llm", node=(metadata or {}).get(
+                "langgraph_node", current_node()))
+
+    def on_chain_start(self, serialized, inputs, *, run_id, tags=None,
+                       metadata=None, **kwargs):
+        self._count_retry(tags, metadata)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id,
+                            tags=None, metadata=None, **kwargs):
+        self._count_retry(tags, metadata)
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None,
+                     metadata=None, **kwargs):
+        self._count_retry(tags, metadata)
+        self._start(run_id, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node, model, start = self._runs.pop(run_id, ("none", "unknown", None))
+        if start is not None:
+            LLM_SECONDS.observe(time.perf_counter() - start, node=node,
+                                model=model)
+        prompt, completion = _token_usage(response)
+        LLM_TOKENS.inc(prompt, node=node, type="prompt")
+        LLM_TOKENS.inc(completion, node=node, type="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        node, _, _ = self._runs.pop(run_id, ("none", "unknown", None))
+        LLM_ERRORS.inc(node=node)
+
+
+def _token_usage(response):
+    """(prompt, completion) token counts of an LLMResult."""
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None),
+                            "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+    if not prompt and not completion:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+    return prompt, completion
+
+
+llm_metrics = LLMMetrics()
@@ -0,0 +1,209 @@
+"""Local first stage in front of the LLM query classifier.
+
+Obvious cases are settled without an LLM round trip:
+
+1. Rules: a question naming tax vocabulary ("80C", "ITR-2", "TDS",
+   "income tax", ...) is "related".
+2. Nearest centroid: the question embedding is compared with the mean
+   embedding of example "related" and "notrelated" questions; a clear
+   enough margin decides.
+
+Anything that mentions evasion, laundering and the like, or uses an
+evasion-like verb ("avoid paying", "not declaring", "under-report", ...),
+always goes to the LLM, which is the only stage allowed to answer
+"illegal". So do questions that neither stage is confident about.
+"""
+import json
+import logging
+import re
+import threading
+
+import numpy as np
+
+from app.services.cache import normalize_question
+from app.services.metrics import PRECLASSIFIER_DECISIONS
+
+TAX_TERMS = re.compile(r"""\b(
+    income[-\s]?tax | taxes | taxable | taxation | taxpayers? | tax
+    | gst | tds | tcs | cess | surcharge | advance\s+tax
+    | itr(-?\d)? | pan\s+(card|number) | form\s+(16a?|26as|\d+\w*)
+    | section\s+\d+\w*(\(\w+\))* | 80c\w*(\(\w+\))* | 80d\w* | 80e\w* | 80g\w*
+    | 80tt[ab] | 87a | 10\(\d+\w*\)
+    | deductions? | exemptions? | rebate | tax\s+refund | assessment\s+year
+    | financial\s+year | hra | capital\s+gains? | tax\s+slabs? | new\s+regime
+    | old\s+regime | e-?filing | belated\s+return | presumptive | depreciation
+    | ppf | nps | elss | epf
+)\b""", re.VERBOSE | re.IGNORECASE)
+
+# Anything evasion-like, including everyday wording such as "avoid paying"
+# or "not declaring", so a tax term alone never settles such a question.
+ILLEGAL_HINTS = re.compile(r"""\b(
+    evade | evasion | evading | avoid\w* | dodg\w* | escap\w* | skip\w*
+    | hide | hid(den|ing) | conceal\w* | launder\w* | fake | forge\w*
+    | bribe\w* | cheat\w* | black\s+money | benami | unaccounted
+    | undisclosed | undeclared | unreported | under-?(report|declar|stat|valu)\w*
+    | (not|never|without)\s+(\w+\s+)?(declar|report|disclos|show|pay)\w*
+    | off\s+the\s+books
+)\b""", re.VERBOSE | re.IGNORECASE)
+
+EXAMPLES = {
+    "related": [
+        "What is the deduction limit under section 80C?",
+        "How do I file my income tax return online?",
+        "Which ITR form should a salaried person use?",
+        "How is capital gains tax calculated on shares?",
+        "What are the income tax slabs under the new regime?",
+        "How do I claim HRA exemption?",
+        "When is advance tax due?",
+        "How can I check my tax refund status?",
+        "Is interest on a home loan deductible?",
+        "What is TDS on salary?",
+        "How do I link PAN with Aadhaar?",
+        "What documents are needed to file returns?",
+    ],
+    "notrelated": [
+        "What is the weather like today?",
+        "Who won the cricket match yesterday?",
+        "Write a poem about the sea.",
+        "Recommend a good movie to watch.",
+        "How do I bake a chocolate cake?",
+        "What is the capital of France?",
+        "Tell me a joke.",
+        "How do I learn to play the guitar?",
+        "What is the best smartphone to buy?",
+        "Translate hello into Spanish.",
+        "How far is the moon from the earth?",
+        "Suggest a workout routine for beginners.",
+    ],
+}
+
+
+def load_examples(path):
+    """Example questions by label from a JSON file, or the built-in ones."""
+    if not path:
+        return EXAMPLES
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class PreClassifier:
+    """Rules plus nearest-centroid classification of user questions.
+
+    Args:
+        embeddings (Embeddings | None): Embeds questions for the centroid
+            stage; None leaves only the rules.
+        margin (float): Cosine similarity by which one centroid must beat
+            the other for the centroid stage to decide.
+        examples (dict): Example questions per label.
+    """
+
+    def __init__(self, embeddings=None, margin=0.08, examples=EXAMPLES):
+        self.embeddings = embeddings
+        self.margin = margin
+        self.examples = examples
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, source, label):
+        PRECLASSIFIER_DECISIONS.inc(stage=source, label=label)
+        with self._lock:
+            key = (source, label)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def rules(self, question):
+        """'related', 'llm' when the LLM must decide, or None."""
+        if ILLEGAL_HINTS.search(question):
+            return "llm"
+        if TAX_TERMS.search(question):
+            return "related"
+        return None
+
+    def centroids(self):
+        if self._centroids is None:
+            labels = list(self.examples)
+            vectors = _unit_rows(self.embeddings.embed_documents(
+                [q for label in labels for q in self.examples[label]]))
+            means, start = [], 0
+            for label in labels:
+                end = start + len(self.examples[label])
+                means.append(vectors[start:end].mean(axis=0))
+                start = end
+            self._centroids = (labels, _unit_rows(means))
+        return self._centroids
+
+    def nearest(self, embedding):
+        """The label whose centroid is clearly closest, or None."""
+        labels, centroids = self.centroids()
+        similarities = centroids @ _unit_rows(embedding)
+        order = np.argsort(similarities)[::-1]
+        if similarities[order[0]] - similarities[order[1]] >= self.margin:
+            return labels[order[0]]
+        return None
+
+    def _rule_decision(self, rule):
+        if rule == "related":
+            self.record("rules", rule)
+            return rule
+        return None
+
+    def classify(self, question):
+        """A confident label for the question, or None to ask the LLM."""
+        rule = self.rules(question)
+        if rule is not None or self.embeddings is None:
+            return self._rule_decision(rule)
+        try:
+            embedding = self.embeddings.embed_query(
+                normalize_question(question))
+            label = self.nearest(embedding)
+        except Exception as e:
+            logging.error(f"Pre-classifier centroid stage failed: {e}")
+            return None
+        if label is not None:
+            self.record("centroid", label)
+        return label
+
+    async def aclassify(self, question):
+        """Async version of `classify`."""
+        rule = self.rules(question)
+        if rule is not None or self.embeddings is None:
+            return self._rule_decision(rule)
+        try:
+            embedding = await self.embeddings.aembed_query(
+                normalize_question(question))
+            label = self.nearest(embedding)
+        except Exception as e:
+            logging.error(f"Pre-classifier centroid stage failed: {e}")
+            return None
+        if label is not None:
+            self.record("centroid", label)
+        return label
+
+    def stats(self):
+        """Decisions per stage and label, and the share the LLM handled."""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        llm = sum(n for (source, _), n in counts.items() if source == "llm")
+        return {
+            "decisions": {f"{source}:{label}": n
+                          for (source, label), n in sorted(counts.items())},
+            "total": total,
+            "llm_share": llm / total if total else 0.0,
+        }
+
+
+def build_preclassifier(mode, embeddings, margin, examples_path=None):
+    """The pre-classifier for `mode` ("off", "rules" or "centroid")."""
+    if mode == "off":
+        return None
+    if mode not in ("rules", "centroid"):
+        raise ValueError(f"Unknown pre-classifier mode: {mode}")
+    return PreClassifier(embeddings if mode == "centroid" else None, margin,
+                         load_examples(examples_path))
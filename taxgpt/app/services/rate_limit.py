@@ -0,0 +1,118 @@
+"""Token buckets pacing the calls made to each upstream provider.
+
+One bucket per upstream (LLM, embeddings, web search) is shared by every
+node, so a burst of graph runs cannot send more requests per second than
+the provider allows; calls wait for a token instead of failing with the
+provider's rate-limit error.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.services.metrics import UPSTREAM_WAIT_SECONDS
+
+
+class TokenBucket(BaseRateLimiter):
+    """Allows `rate` calls per second on average and bursts of `burst`.
+
+    A call that finds the bucket empty reserves the next token and sleeps
+    until it is due, so waiting callers are served in arrival order. Usable
+    directly as a chat model's `rate_limiter`.
+
+    Args:
+        rate (float): Tokens added per second.
+        burst (int): Bucket size, the calls allowed back to back.
+        name (str): Upstream name used in the wait-time metric.
+    """
+
+    def __init__(self, rate, burst=1, name="upstream", clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.name = name
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self, blocking):
+        """Take a token; returns the seconds to wait for it, or None."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens
+                               + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1 and not blocking:
+                return None
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, *, blocking=True):
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        UPSTREAM_WAIT_SECONDS.observe(wait, upstream=self.name)
+        if wait:
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, *, blocking=True):
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        UPSTREAM_WAIT_SECONDS.observe(wait, upstream=self.name)
+        if wait:
+            await asyncio.sleep(wait)
+        return True
+
+
+def build_bucket(name, rate, burst):
+    """A bucket for the upstream, or None when `rate` is 0 (unlimited)."""
+    return TokenBucket(rate, burst, name) if rate > 0 else None
+
+
+class Throttled:
+    """Proxy taking a token from `bucket` before each call to `methods`.
+
+    Other attributes are passed through untouched.
+
+    Args:
+        target (object): The client to pace, e.g. an embeddings model.
+        bucket (TokenBucket): Bucket shared by every user of the upstream.
+        methods (tuple): Names of the methods that call the upstream.
+    """
+
+    def __init__(self, target, bucket, methods):
+        self._target = target
+        self._bucket = bucket
+        self._methods = frozenset(methods)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        attribute = getattr(self._target, name)
+        if name not in self._methods:
+            return attribute
+        bucket = self._bucket
+        if inspect.iscoroutinefunction(attribute):
+            @functools.wraps(attribute)
+            async def paced_async(*args, **kwargs):
+                await bucket.aacquire()
+                return await attribute(*args, **kwargs)
+            return paced_async
+
+        @functools.wraps(attribute)
+        def paced(*args, **kwargs):
+            bucket.acquire()
+            return attribute(*args, **kwargs)
+        return paced
+
+
+def throttle(target, bucket, methods):
+    """`target` paced by `bucket`, or `target` itself when there is none."""
+    return target if bucket is None else Throttled(target, bucket, methods)
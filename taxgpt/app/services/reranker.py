@@ -0,0 +1,86 @@
+"""Local relevance grading of retrieved chunks, without an LLM call.
+
+Each chunk is scored from two signals that are already at hand:
+
+* the dense relevance score vector-db returned for the hit (LangChain's
+  L2 relevance score, `1 - distance / sqrt(2)`, from the question and
+  chunk embeddings in the FAISS index), carried in the Document metadata
+  as `relevance_score`;
+* lexical overlap: the share of the question's terms found in the chunk,
+  with identifiers such as "80ccd(1b)" or "itr-2" weighted up.
+
+Chunks scoring above `accept` are graded relevant and those below
+`reject` irrelevant. The ones in between are left undecided, for the LLM
+grader to settle.
+"""
+import re
+
+import numpy as np
+
+SCORE_KEY = "relevance_score"
+
+# Same term rules as vector-db's BM25 index: compound identifiers are kept
+# whole and also split into their pieces.
+_PART = r"[a-z0-9]+(?:\([a-z0-9]+\))*"
+TOKEN_RE = re.compile(rf"{_PART}(?:[-/.]{_PART})*")
+PIECE_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it "
+    "its my of on or should that the this to under was what when where "
+    "which who will with".split())
+
+
+def terms(text):
+    found = set()
+    for token in TOKEN_RE.findall(text.lower()):
+        pieces = PIECE_RE.findall(token)
+        if len(pieces) > 1:
+            found.add(token)
+        found.update(piece for piece in pieces if piece not in STOPWORDS)
+    return found
+
+
+def term_weight(term):
+    """Identifiers (anything with a digit) count three times a word."""
+    return 3.0 if any(c.isdigit() for c in term) else 1.0
+
+
+class LocalGrader:
+    """Vectorised relevance scorer over (question, chunk) pairs.
+
+    Args:
+        dense_weight (float): Weight of the dense score; lexical overlap
+            gets the rest. Hits without a dense score use overlap alone.
+        accept (float): Combined score at or above which a chunk is relevant.
+        reject (float): Combined score below which a chunk is irrelevant.
+    """
+
+    def __init__(self, dense_weight=0.6, accept=0.6, reject=0.35):
+        if reject > accept:
+            raise ValueError("reject must not be above accept")
+        self.dense_weight = dense_weight
+        self.accept = accept
+        self.reject = reject
+
+    def scores(self, question, documents):
+        """Combined relevance score of each document, in [0, 1]."""
+        query_terms = sorted(terms(question))
+        weights = np.array([term_weight(term) for term in query_terms])
+        doc_terms = [terms(doc.page_content) for doc in documents]
+        present = np.array([[term in found for term in query_terms]
+                            for found in doc_terms], dtype=float)
+        present = present.reshape(len(documents), len(query_terms))
+        overlap = (present @ weights / weights.sum() if weights.size
+                   else np.zeros(len(documents)))
+        dense = np.array([doc.metadata.get(SCORE_KEY) for doc in documents],
+                         dtype=float)
+        combined = (self.dense_weight * np.clip(dense, 0, 1)
+                    + (1 - self.dense_weight) * overlap)
+        return np.where(np.isnan(dense), overlap, combined)
+
+    def verdicts(self, question, documents):
+        """'Yes', 'No', or None where the chunk needs the LLM grader."""
+        return ["Yes" if score >= self.accept
+                else "No" if score < self.reject else None
+                for score in self.scores(question, documents)]
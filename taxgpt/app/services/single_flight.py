@@ -0,0 +1,62 @@
+import asyncio
+
+
+class SingleFlight:
+    """Shares one execution between concurrent calls with the same key.
+
+    The first caller for a key (the leader) starts the work as a task;
+    callers arriving with the same key while it runs await that task
+    instead of starting their own, and all of them get its result or its
+    exception. The key is freed as soon as the task finishes, so results
+    are never reused afterwards; that is the answer cache's job.
+
+    The task is shielded from cancellation of any one caller, so a client
+    disconnecting does not cancel the work for the others.
+
+    Args:
+        counter (Counter | None): Metric with a "result" label, counted as
+            "executed" or "coalesced" per call.
+    """
+
+    def __init__(self, counter=None):
+        self.counter = counter
+        self._in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception retrieved in case every caller went away.
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key, func):
+        """Await `func()`, or the call already running for `key`.
+
+        Args:
+            key (Hashable): Calls with equal keys are coalesced.
+            func (callable): Returns the coroutine to run when leading.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            result = "executed"
+        else:
+            self.coalesced += 1
+            result = "coalesced"
+        if self.counter is not None:
+            self.counter.inc(result=result)
+        return await asyncio.shield(task)
+
+    def stats(self):
+        calls = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / calls if calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.services.metrics import RETRIES, current_node
+
+
+class CircuitOpenError(Exception):
+    """Raised when the vector-db circuit breaker is rejecting calls."""
+
+
+class CircuitBreaker:
+    """Stops calling the vector-db after repeated failures.
+
+    The breaker opens after `failure_threshold` consecutive failed requests.
+    Once `reset_timeout` seconds have passed, requests are let through again
+    as trials: a success closes the breaker, a failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logging.warning("Vector-db circuit breaker opened after"
+                                f" {self.failures} failures.")
+            self.opened_at = self._clock()
+
+
+class VectorDBClient:
+    """Pooled keep-alive HTTP client for the vector-db service.
+
+    One sync and one async `httpx` client are created on first use and
+    reused for every request, so connections are kept alive between
+    questions. Transport errors and 5xx responses are retried with
+    exponential backoff; requests that still fail count towards the
+    circuit breaker.
+
+    The async client is bound to the event loop it is first used on, so it
+    should be opened and closed by the application lifespan.
+    """
+
+    def __init__(self, base_url, timeout=10.0, connect_timeout=2.0,
+                 max_retries=2, backoff=0.2, max_connections=20,
+                 breaker=None, transport=None, async_transport=None):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._transport = transport
+        self._async_transport = async_transport
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.Client(
+                base_url=self.base_url, timeout=self.timeout,
+                limits=self.limits, transport=self._transport)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout,
+                limits=self.limits, transport=self._async_transport)
+        return self._async_client
+
+    def _backoff(self, attempt):
+        delay = self.backoff * 2 ** attempt
+        return delay + random.uniform(0, delay / 2)
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Vector-db circuit breaker is open.")
+
+    def _finish(self, response):
+        # 4xx responses are the caller's fault, not a sign the service is
+        # unhealthy, so they do not count towards the breaker.
+        self.breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _server_error(response):
+        return httpx.HTTPStatusError(
+            f"Vector-db returned {response.status_code}",
+            request=response.request, response=response)
+
+    def post(self, path, payload):
+        """POST JSON to the vector-db and return the decoded response."""
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.post(path, json=payload)
+            except httpx.TransportError as e:
+                error = e
+            else:
+                if response.status_code < 500:
+                    return self._finish(response)
+                error = self._server_error(response)
+            if attempt < self.max_retries:
+                RETRIES.inc(service="vector_db", node=current_node())
+                logging.warning(f"Vector-db request failed ({error!r}),"
+                                f" retry {attempt + 1}/{self.max_retries}.")
+                time.sleep(self._backoff(attempt))
+        self.breaker.record_failure()
+        raise error
+
+    async def apost(self, path, payload):
+        """Async version of `post`."""
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.async_client.post(path, json=payload)
+            except httpx.TransportError as e:
+                error = e
+            else:
+                if response.status_code < 500:
+                    return self._finish(response)
+                error = self._server_error(response)
+            if attempt < self.max_retries:
+                RETRIES.inc(service="vector_db", node=current_node())
+                logging.warning(f"Vector-db request failed ({error!r}),"
+                                f" retry {attempt + 1}/{self.max_retries}.")
+                await asyncio.sleep(self._backoff(attempt))
+        self.breaker.record_failure()
+        raise error
+
+    def query(self, question):
+        """Search the vector-db for documents relevant to the question."""
+        return self.post("/vector", {"question": question})
+
+    async def aquery(self, question):
+        """Async version of `query`."""
+        return await self.apost("/vector", {"question": question})
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+def build_vector_db_client():
+    """Create the vector-db client described by the settings."""
+    return VectorDBClient(
+        settings.VECTOR_DB_URL,
+        timeout=settings.VECTOR_DB_TIMEOUT,
+        connect_timeout=settings.VECTOR_DB_CONNECT_TIMEOUT,
+        max_retries=settings.VECTOR_DB_MAX_RETRIES,
+        backoff=settings.VECTOR_DB_RETRY_BACKOFF,
+        max_connections=settings.VECTOR_DB_MAX_CONNECTIONS,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.VECTOR_DB_BREAKER_THRESHOLD,
+            reset_timeout=settings.VECTOR_DB_BREAKER_RESET),
+    )
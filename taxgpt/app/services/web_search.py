@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app.services.cache import LRUCache, normalize_question
+
+
+def merge_results(result_lists):
+    """Concatenate search results, dropping repeats of the same page."""
+    seen, merged = set(), []
+    for results in result_lists:
+        for result in results:
+            key = result.get("url") or result.get("content")
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(result)
+    return merged
+
+
+class WebSearcher:
+    """Cached, time-boxed web search over one or more queries.
+
+    Results are cached per normalised query for `ttl` seconds. The queries
+    not in the cache are sent in parallel, and whatever has arrived when
+    the `timeout` budget runs out is merged and returned; a slow or failed
+    query only loses its own results.
+
+    Args:
+        tool (BaseTool): Search tool taking {"query": ...}, e.g. Tavily.
+        ttl (float | None): Seconds a cached result stays valid.
+        max_entries (int): Queries kept in the cache.
+        timeout (float): Seconds allowed for one search, all queries included.
+        max_workers (int): Threads for concurrent synchronous searches.
+    """
+
+    def __init__(self, tool, ttl=3600, max_entries=512, timeout=8.0,
+                 max_workers=4):
+        self.tool = tool
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    def _plan(self, queries):
+        """Split distinct queries into cached results and keys to fetch."""
+        keys, cached, missing = [], {}, []
+        for query in queries:
+            key = normalize_question(query)
+            if key in keys:
+                continue
+            keys.append(key)
+            results = self.cache.get(key)
+            if results is None:
+                missing.append((key, query))
+            else:
+                cached[key] = results
+        self.hits += len(cached)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def _fetch(self, key, query):
+        return self._store(key, self.tool.invoke({"query": query}))
+
+    def _store(self, key, results):
+        # Tools report some failures as a string instead of raising.
+        if not isinstance(results, list):
+            raise RuntimeError(f"Unexpected search results: {results!r}")
+        self.cache.set(key, results)
+        return results
+
+    def _collect(self, keys, cached, fetched, timed_out):
+        if timed_out:
+            self.timeouts += timed_out
+            logging.warning(f"Web search budget of {self.timeout}s ran out"
+                            f" for {timed_out} of {len(keys)} queries.")
+        found = {**cached, **fetched}
+        if not found:
+            raise RuntimeError("No web search results within the budget")
+        return merge_results(found[key] for key in keys if key in found)
+
+    def search(self, queries):
+        """Search for every query and return the merged results."""
+        keys, cached, missing = self._plan(queries)
+        futures = {self._executor.submit(self._fetch, key, query): key
+                   for key, query in missing}
+        done, pending = wait(futures, timeout=self.timeout)
+        # A search already running cannot be stopped; it still fills the
+        # cache when it finishes.
+        for future in pending:
+            future.cancel()
+        fetched = {}
+        for future in done:
+            key = futures[future]
+            try:
+                fetched[key] = future.result()
+            except Exception as e:
+                logging.error(f"Web search for {key!r} failed: {e}")
+        return self._collect(keys, cached, fetched, len(pending))
+
+    async def _afetch(self, key, query):
+        return self._store(key, await self.tool.ainvoke({"query": query}))
+
+    async def asearch(self, queries):
+        """Async version of `search`."""
+        keys, cached, missing = self._plan(queries)
+        tasks = {asyncio.ensure_future(self._afetch(key, query)): key
+                 for key, query in missing}
+        done, pending = set(), set()
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        fetched = {}
+        for task in done:
+            try:
+                fetched[tasks[task]] = task.result()
+            except Exception as e:
+                logging.error(f"Web search for {tasks[task]!r} failed: {e}")
+        return self._collect(keys, cached, fetched, len(pending))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "timeouts": self.timeouts,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.cache),
+        }
@@ -1,31 +1,126 @@
 from typing import List
 from typing_extensions import TypedDict
-from langchain.schema import Document
+from langchain_core.documents import Document
 from pydantic import BaseModel
 from pydantic import Field
 from langgraph.graph import END
 from langgraph.graph import START
 from langgraph.graph import StateGraph
 from app.core.config import settings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.services.admission import build_admission_controller
+from app.services.cache import LRUCache
+from app.services.cache import build_answer_cache
+from app.services.cache import normalize_question
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.lazy import Lazy
+from app.services.metrics import COALESCED
+from app.services.metrics import counted_branch
+from app.services.metrics import llm_metrics
+from app.services.metrics import timed_node
+from app.services.preclassifier import build_preclassifier
+from app.services.rate_limit import build_bucket
+from app.services.rate_limit import throttle
+from app.services.reranker import SCORE_KEY
+from app.services.reranker import LocalGrader
+from app.services.single_flight import SingleFlight
+from app.services.vector_client import CircuitOpenError
+from app.services.vector_client import build_vector_db_client
+from app.services.web_search import WebSearcher
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.tools.tavily_search import TavilySearchResults
-import requests
-from langchain_openai import ChatOpenAI  # Changed from ChatGroq
+import asyncio
+import httpx
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from langchain_core.runnables import RunnableLambda
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
 
+
+
+# One token bucket per upstream, shared by every node that calls it.
+llm_bucket = build_bucket("llm", settings.LLM_RATE_LIMIT,
+                          settings.LLM_RATE_BURST)
+embeddings_bucket = build_bucket("embeddings", settings.EMBEDDINGS_RATE_LIMIT,
+                                 settings.EMBEDDINGS_RATE_BURST)
+web_search_bucket = build_bucket("web_search", settings.WEB_SEARCH_RATE_LIMIT,
+                                 settings.WEB_SEARCH_RATE_BURST)
+
+
+# Provider clients are built on first use (or by `prewarm`), so importing
+# this module does not import their SDKs.
+def _build_llm():
+    from langchain_openai import ChatOpenAI  # Changed from ChatGroq
+    return ChatOpenAI(
+        openai_api_key=settings.OPENAI_API_KEY1,  # Changed to OpenAI API key
+        model_name="gpt-3.5-turbo",
+        max_retries=0,
+        callbacks=[llm_metrics],
+        rate_limiter=llm_bucket
+    )
+
+
+def _retrying(runnable):
+    """Wrap an LLM runnable to retry transient OpenAI errors.
+
+    Retries happen here rather than in the OpenAI client, so each one is
+    counted by `llm_metrics`, which is attached to the retrying runnable
+    and sees the attempts it starts.
+
+    Args:
+        runnable (Runnable): The model or structured-output runnable.
+
+    Returns:
+        Runnable: The retrying runnable.
+    """
+    import openai
+    return runnable.with_retry(
+        retry_if_exception_type=(openai.APIConnectionError,
+                                 openai.RateLimitError,
+                                 openai.InternalServerError),
+        stop_after_attempt=settings.LLM_MAX_RETRIES + 1,
+        exponential_jitter_params={"initial": settings.LLM_RETRY_BACKOFF,
+                                   "jitter": settings.LLM_RETRY_BACKOFF},
+    ).with_config(callbacks=[llm_metrics])
+
+
+def _build_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return throttle(GoogleGenerativeAIEmbeddings(model="models/embedding-001"),
+                    embeddings_bucket,
+                    ("embed_query", "embed_documents",
+                     "aembed_query", "aembed_documents"))
+
+
+def _build_web_search_tool():
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    return throttle(TavilySearchResults(k=3), web_search_bucket,
+                    ("invoke", "ainvoke"))
+
+
 # Initialize components
-llm = ChatOpenAI(
-    openai_api_key=settings.OPENAI_API_KEY1,  # Changed to OpenAI API key
-    model_name="gpt-3.5-turbo"
+llm = Lazy(_build_llm, "llm")
+embeddings = CachedEmbeddings(
+    Lazy(_build_embeddings, "embeddings"),
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    sqlite_path=settings.EMBEDDING_CACHE_PATH,
+    model_name="models/embedding-001"
 )
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-web_search_tool = TavilySearchResults(k=3)
-
-logging.info("Initialized LLM, embeddings, and web search tool.")
+web_search_tool = Lazy(_build_web_search_tool, "web_search_tool")
+web_searcher = WebSearcher(web_search_tool,
+                           ttl=settings.WEB_SEARCH_CACHE_TTL,
+                           max_entries=settings.WEB_SEARCH_CACHE_SIZE,
+                           timeout=settings.WEB_SEARCH_TIMEOUT)
+vector_db_client = build_vector_db_client()
+preclassifier = build_preclassifier(settings.PRECLASSIFIER, embeddings,
+                                    settings.PRECLASSIFIER_MARGIN,
+                                    settings.PRECLASSIFIER_EXAMPLES)
+local_grader = LocalGrader(dense_weight=settings.GRADER_LOCAL_DENSE_WEIGHT,
+                           accept=settings.GRADER_LOCAL_ACCEPT,
+                           reject=settings.GRADER_LOCAL_REJECT)
+
+logging.info("Registered LLM, embeddings, and web search tool.")
 
 
 # Model for relevance grading
@@ -35,9 +130,9 @@ class classify_query(BaseModel):
                               " 'related', 'illegal', or 'notrelated'.")
 
 
-structured_llm_classifier = llm.with_structured_output(classify_query)
-
-logging.info("Classify query model created.")
+structured_llm_classifier = Lazy(
+    lambda: _retrying(llm.with_structured_output(classify_query)),
+    "structured_llm_classifier")
 
 # Query classifier prompt
 query_classifier_prompt = ChatPromptTemplate.from_messages([
@@ -51,7 +146,9 @@ query_classifier_prompt = ChatPromptTemplate.from_messages([
 logging.info("Query classifier prompt created.")
 
 # Query classifier(Query types:Related, Non related, Illegal)
-query_classifier = query_classifier_prompt | structured_llm_classifier
+query_classifier = Lazy(
+    lambda: query_classifier_prompt | structured_llm_classifier.get(),
+    "query_classifier")
 
 
 class GradeDocuments(BaseModel):
@@ -61,9 +158,9 @@ class GradeDocuments(BaseModel):
                               " question, 'Yes' or 'No'")
 
 
-structured_llm_grader = llm.with_structured_output(GradeDocuments)
-
-logging.info("Grade documents model created.")
+structured_llm_grader = Lazy(
+    lambda: _retrying(llm.with_structured_output(GradeDocuments)),
+    "structured_llm_grader")
 
 # Prompt for grading the retrieved document
 grade_prompt = ChatPromptTemplate.from_messages([
@@ -75,7 +172,35 @@ grade_prompt = ChatPromptTemplate.from_messages([
     ("human", "Retrieved document: \n\n {document} \n\n "
         "User question: {question}")
 ])
-retrieval_grader = grade_prompt | structured_llm_grader
+retrieval_grader = Lazy(lambda: grade_prompt | structured_llm_grader.get(),
+                        "retrieval_grader")
+
+
+class GradeDocumentsBatch(BaseModel):
+    """Schema for grading several retrieved documents in a single call."""
+
+    binary_scores: List[str] = Field(description="One 'Yes' or 'No' per"
+                                     " document, in the order given")
+
+
+structured_llm_batch_grader = Lazy(
+    lambda: _retrying(llm.with_structured_output(GradeDocumentsBatch)),
+    "structured_llm_batch_grader")
+
+# Prompt for grading all retrieved documents at once
+batch_grade_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are a grader assessing relevance of retrieved documents
+                to a user question.
+                If a document contains keyword(s) or semantic meaning
+                related to the question, grade it as relevant.
+                Give a binary score 'Yes' or 'No' for every document,
+                in the same order as the documents are numbered."""),
+    ("human", "Retrieved documents: \n\n {documents} \n\n "
+        "User question: {question}")
+])
+batch_retrieval_grader = Lazy(
+    lambda: batch_grade_prompt | structured_llm_batch_grader.get(),
+    "batch_retrieval_grader")
 
 # Prompt for query rewrite for web search
 re_write_prompt = ChatPromptTemplate.from_messages([
@@ -88,7 +213,9 @@ re_write_prompt = ChatPromptTemplate.from_messages([
     ("human", "Here is the initial question: \n\n {question} \n Formulate an "
         "improved question.")
 ])
-question_rewriter = re_write_prompt | llm | StrOutputParser()
+question_rewriter = Lazy(
+    lambda: re_write_prompt | _retrying(llm.get()) | StrOutputParser(),
+    "question_rewriter")
 
 logging.info("Query rewrite prompt created.")
 
@@ -114,9 +241,9 @@ rag_prompt = ChatPromptTemplate.from_messages([
 ])
 
 # Define the chain
-rag_chain = rag_prompt | llm | StrOutputParser()
-
-logging.info("RAG chain created.")
+rag_chain = Lazy(
+    lambda: rag_prompt | _retrying(llm.get()) | StrOutputParser(),
+    "rag_chain")
 
 # Response for non tax related or illegal queries
 out_of_scope_response_prompt = re_write_prompt = ChatPromptTemplate.from_messages([
@@ -130,16 +257,26 @@ out_of_scope_response_prompt = re_write_prompt = ChatPromptTemplate.from_message
                     \n\n Question: {question}
                     """)
 ])
-out_of_scope_generation = out_of_scope_response_prompt | llm | StrOutputParser()
-
-logging.info("Out of scope response chain created.")
+out_of_scope_generation = Lazy(
+    lambda: (out_of_scope_response_prompt | _retrying(llm.get())
+             | StrOutputParser()),
+    "out_of_scope_generation")
 
 # Workflow Functions
 
 
+def _preclassified(state, label):
+    logging.debug(f"Query pre-classified as: {label}")
+    state["query_type"] = label
+    return {"query_type": label}
+
+
 def classify_user_query(state):
     """Classify the user's query type using an LLM classifier.
 
+    Obvious cases are settled by the local pre-classifier first, when one
+    is configured.
+
     Args:
         state (dict): Current state containing user's question.
 
@@ -147,16 +284,43 @@ def classify_user_query(state):
         dict: Updated state with query_type field.
     """
     logging.debug(f"Classifying query: {state['question']}")
+    if preclassifier is not None:
+        label = preclassifier.classify(state["question"])
+        if label is not None:
+            return _preclassified(state, label)
     try:
         type = query_classifier.invoke({"question": state["question"]})
+        if preclassifier is not None:
+            preclassifier.record("llm", type.binary_score)
         state["query_type"] = type.binary_score
         logging.debug(f"Query classified as: {state['query_type']}")
         return {"query_type": type.binary_score}
     except Exception as e:
         logging.error(f"Failed to classify query: {e}")
-        state["query_type"] = "notrelated" 
+        state["query_type"] = "notrelated"
         return {"query_type": "notrelated"}
 
+
+async def aclassify_user_query(state):
+    """Async version of `classify_user_query`."""
+    logging.debug(f"Classifying query: {state['question']}")
+    if preclassifier is not None:
+        label = await preclassifier.aclassify(state["question"])
+        if label is not None:
+            return _preclassified(state, label)
+    try:
+        type = await query_classifier.ainvoke({"question": state["question"]})
+        if preclassifier is not None:
+            preclassifier.record("llm", type.binary_score)
+        state["query_type"] = type.binary_score
+        logging.debug(f"Query classified as: {state['query_type']}")
+        return {"query_type": type.binary_score}
+    except Exception as e:
+        logging.error(f"Failed to classify query: {e}")
+        state["query_type"] = "notrelated"
+        return {"query_type": "notrelated"}
+
+
 def non_related_generation(state):
     """Generates response for non related and illegal queries based on the
      query type classification.
@@ -171,6 +335,20 @@ def non_related_generation(state):
         return "generate_response"
 
 
+def _to_documents(payload):
+    """Convert the vector-db payload into one Document per retrieved hit."""
+    if isinstance(payload, list):
+        documents = []
+        for hit in payload:
+            metadata = dict(hit.get("metadata") or {})
+            if hit.get("score") is not None:
+                metadata[SCORE_KEY] = hit["score"]
+            documents.append(Document(page_content=hit["page_content"],
+                                      metadata=metadata))
+        return documents
+    return [Document(page_content=payload)]
+
+
 def retrieve(state):
     """Fetch relevant documents using vector similarity search.
 
@@ -179,51 +357,155 @@ def retrieve(state):
     """
     logging.info(f"Retrieving documents for query: {state['question']}")
     try:
-        response = requests.post(
-            "http://3.109.157.165:5001/vector",
-
-            params={"question": state["question"]}
-        )
-        response.raise_for_status()
-        # Get the documents from the API response
-        response = response.json()
+        response = vector_db_client.query(state["question"])
 
         doc = response.get("document")
         logging.debug(f"Documents retrieved: {doc}")
         # Return in the same format as the initial method
-        return {"documents": [Document(page_content=doc)],
+        return {"documents": _to_documents(doc),
                 "question": state["question"]}
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, CircuitOpenError) as e:
         logging.error(f"Error retrieving documents: {e}")
         return {"generation": "Error: Unable to fetch the response."
                 " Please try again later."}
-    
+
     except Exception as e:
         logging.error(f"An unexpected error occured: {e}")
         return {"generation": "Error: Unable to fetch the response."
                 " Please try again later."}
 
 
+async def aretrieve(state):
+    """Async version of `retrieve` that does not block the event loop."""
+    logging.info(f"Retrieving documents for query: {state['question']}")
+    try:
+        response = await vector_db_client.aquery(state["question"])
+
+        doc = response.get("document")
+        logging.debug(f"Documents retrieved: {doc}")
+        return {"documents": _to_documents(doc),
+                "question": state["question"]}
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        logging.error(f"Error retrieving documents: {e}")
+        return {"generation": "Error: Unable to fetch the response."
+                " Please try again later."}
+
+    except Exception as e:
+        logging.error(f"An unexpected error occured: {e}")
+        return {"generation": "Error: Unable to fetch the response."
+                " Please try again later."}
+
+
+def _format_documents(documents):
+    """Number the documents for the single-call grader prompt."""
+    return "\n\n".join(f"Document {i}:\n{doc.page_content}"
+                        for i, doc in enumerate(documents, start=1))
+
+
+def _grader_inputs(state):
+    return [{"question": state["question"], "document": doc.page_content}
+            for doc in state["documents"]]
+
+
+def _graded_state(state, verdicts):
+    """Keep the documents graded 'Yes' and decide on web search."""
+    filtered_docs = [doc for doc, verdict in zip(state["documents"], verdicts)
+                     if verdict == "Yes"]
+    logging.info(f"Filtered documents: {len(filtered_docs)}")
+    return {
+        "documents": filtered_docs,
+        "question": state["question"],
+        "web_search": "Yes" if not filtered_docs else "No"
+    }
+
+
+def _single_call_verdicts(state, result):
+    """Validate the single-call grader output against the document count."""
+    if len(result.binary_scores) == len(state["documents"]):
+        return result.binary_scores
+    logging.warning(f"Single-call grader returned {len(result.binary_scores)}"
+                    f" verdicts for {len(state['documents'])} documents;"
+                    " falling back to per-document grading.")
+    return None
+
+
+def _local_verdicts(state):
+    """Grade locally; None marks the documents left for the LLM grader."""
+    verdicts = local_grader.verdicts(state["question"], state["documents"])
+    pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    logging.info(f"Local grader decided {len(verdicts) - len(pending)} of"
+                 f" {len(verdicts)} documents.")
+    return verdicts, pending
+
+
 def grade_documents(state):
     """Evaluate retrieved documents for relevance to the query.
 
+    Documents are graded concurrently through `retrieval_grader.batch`, or
+    with a single structured call when `GRADER_MODE` is "single_call". In
+    "local" mode only the documents the local grader is unsure of reach
+    the LLM.
+
     Returns:
         dict: State with filtered relevant documents and web search decision.
     """
     logging.debug("Grading retrieved documents.")
-    filtered_docs = []
     try:
-        for doc in state["documents"]:
-            score = retrieval_grader.invoke({"question": state["question"],
-                                            "document": doc.page_content})
-            if score.binary_score == "Yes":
-                filtered_docs.append(doc)
-        logging.info(f"Filtered documents: {len(filtered_docs)}")
+        verdicts = None
+        if settings.GRADER_MODE == "local" and state["documents"]:
+            verdicts, pending = _local_verdicts(state)
+            if pending:
+                inputs = _grader_inputs(state)
+                scores = retrieval_grader.batch(
+                    [inputs[i] for i in pending],
+                    config={"max_concurrency": settings.GRADER_MAX_CONCURRENCY})
+                for i, score in zip(pending, scores):
+                    verdicts[i] = score.binary_score
+        if settings.GRADER_MODE == "single_call" and state["documents"]:
+            result = batch_retrieval_grader.invoke({
+                "question": state["question"],
+                "documents": _format_documents(state["documents"])})
+            verdicts = _single_call_verdicts(state, result)
+        if verdicts is None:
+            scores = retrieval_grader.batch(
+                _grader_inputs(state),
+                config={"max_concurrency": settings.GRADER_MAX_CONCURRENCY})
+            verdicts = [score.binary_score for score in scores]
+        return _graded_state(state, verdicts)
+    except Exception as e:
+        logging.error(f"Error grading documents: {e}")
         return {
-            "documents": filtered_docs,
+            "documents": [],
             "question": state["question"],
-            "web_search": "Yes" if not filtered_docs else "No"
+            "web_search": "Yes"
         }
+
+
+async def agrade_documents(state):
+    """Async version of `grade_documents`."""
+    logging.debug("Grading retrieved documents.")
+    try:
+        verdicts = None
+        if settings.GRADER_MODE == "local" and state["documents"]:
+            verdicts, pending = _local_verdicts(state)
+            if pending:
+                inputs = _grader_inputs(state)
+                scores = await retrieval_grader.abatch(
+                    [inputs[i] for i in pending],
+                    config={"max_concurrency": settings.GRADER_MAX_CONCURRENCY})
+                for i, score in zip(pending, scores):
+                    verdicts[i] = score.binary_score
+        if settings.GRADER_MODE == "single_call" and state["documents"]:
+            result = await batch_retrieval_grader.ainvoke({
+                "question": state["question"],
+                "documents": _format_documents(state["documents"])})
+            verdicts = _single_call_verdicts(state, result)
+        if verdicts is None:
+            scores = await retrieval_grader.abatch(
+                _grader_inputs(state),
+                config={"max_concurrency": settings.GRADER_MAX_CONCURRENCY})
+            verdicts = [score.binary_score for score in scores]
+        return _graded_state(state, verdicts)
     except Exception as e:
         logging.error(f"Error grading documents: {e}")
         return {
@@ -233,6 +515,30 @@ def grade_documents(state):
         }
 
 
+rewrite_cache = LRUCache(max_entries=settings.REWRITE_CACHE_SIZE)
+_race_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def _rewrite(question):
+    """Rewrite the question, reusing an earlier rewrite of the same one."""
+    key = normalize_question(question)
+    better_question = rewrite_cache.get(key)
+    if better_question is None:
+        better_question = question_rewriter.invoke({"question": question})
+        rewrite_cache.set(key, better_question)
+    return better_question
+
+
+async def _arewrite(question):
+    key = normalize_question(question)
+    better_question = rewrite_cache.get(key)
+    if better_question is None:
+        better_question = await question_rewriter.ainvoke(
+            {"question": question})
+        rewrite_cache.set(key, better_question)
+    return better_question
+
+
 def transform_query(state):
     """Rewrite the query to improve semantic matching for web search.
 
@@ -241,31 +547,147 @@ def transform_query(state):
     """
     logging.debug(f"Rewriting query: {state['question']}")
     try:
-        better_question = question_rewriter.invoke({"question":
-                                                    state["question"]})
+        better_question = _rewrite(state["question"])
+        return {"documents": state["documents"], "question": better_question}
+    except Exception as e:
+        logging.error(f"Error rewriting query: {e}")
+        return {"documents": state["documents"], "question": state["question"]}
+
+
+async def atransform_query(state):
+    """Async version of `transform_query`."""
+    logging.debug(f"Rewriting query: {state['question']}")
+    try:
+        better_question = await _arewrite(state["question"])
         return {"documents": state["documents"], "question": better_question}
     except Exception as e:
         logging.error(f"Error rewriting query: {e}")
         return {"documents": state["documents"], "question": state["question"]}
 
 
+def _web_documents(docs):
+    web_results = "\n".join([d.get("content", "") for d in docs if
+                             "content" in d])
+    return [Document(page_content=web_results)]
+
+
+def _web_queries(state):
+    """The rewritten question, plus the original one if configured."""
+    queries = [state["question"]]
+    if settings.WEB_SEARCH_ORIGINAL_QUERY and state.get("original_question"):
+        queries.append(state["original_question"])
+    return queries
+
+
 def web_search(state):
     """Perform web search using the rewritten query.
 
+    Results are cached per query, and the search is bounded by
+    `WEB_SEARCH_TIMEOUT`.
+
     Returns:
         dict: Retrieved web content as documents.
     """
     try:
-        docs = web_search_tool.invoke({"query": state["question"]})
-        web_results = "\n".join([d.get("content", "") for d in docs if
-                                "content" in d])
-        return {"documents": [Document(page_content=web_results)],
+        docs = web_searcher.search(_web_queries(state))
+        return {"documents": _web_documents(docs),
+                "question": state["question"]}
+    except Exception as e:
+        logging.error(f"Web search failed: {e}")
+        return {"documents": [], "question": state["question"]}
+
+
+async def aweb_search(state):
+    """Async version of `web_search`."""
+    try:
+        docs = await web_searcher.asearch(_web_queries(state))
+        return {"documents": _web_documents(docs),
                 "question": state["question"]}
     except Exception as e:
         logging.error(f"Web search failed: {e}")
         return {"documents": [], "question": state["question"]}
 
 
+def _search_raw(question, searcher):
+    return question, searcher.search([question])
+
+
+def _search_rewritten(question, searcher):
+    better_question = _rewrite(question)
+    return better_question, searcher.search([better_question])
+
+
+def _raced_state(question, found_for, docs):
+    if docs:
+        logging.info(f"Fallback search answered by: {found_for}")
+        return {"documents": _web_documents(docs), "question": found_for}
+    return {"documents": [], "question": question}
+
+
+def rewrite_and_search(state):
+    """Search the web without waiting for the query rewrite first.
+
+    A cached rewrite is searched straight away. Otherwise a search on the
+    raw question races the rewrite followed by a search on the rewritten
+    question, and the first search to return results supplies the
+    documents.
+
+    Returns:
+        dict: Web content as documents and the question it was found for.
+    """
+    question = state["question"]
+    if rewrite_cache.get(normalize_question(question)) is not None:
+        return web_search({**state, **transform_query(state)})
+    pending = {_race_executor.submit(_search_raw, question, web_searcher),
+               _race_executor.submit(_search_rewritten, question,
+                                     web_searcher)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                found_for, docs = future.result()
+            except Exception as e:
+                logging.error(f"Fallback search failed: {e}")
+                continue
+            if docs:
+                # The other search keeps running and fills the caches.
+                return _raced_state(question, found_for, docs)
+    return _raced_state(question, question, [])
+
+
+async def arewrite_and_search(state):
+    """Async version of `rewrite_and_search`; the losing search is cancelled."""
+    question = state["question"]
+    if rewrite_cache.get(normalize_question(question)) is not None:
+        return await aweb_search({**state, **(await atransform_query(state))})
+
+    async def search_raw():
+        return question, await web_searcher.asearch([question])
+
+    async def search_rewritten():
+        better_question = await _arewrite(question)
+        return better_question, await web_searcher.asearch([better_question])
+
+    pending = {asyncio.ensure_future(search_raw()),
+               asyncio.ensure_future(search_rewritten())}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    found_for, docs = task.result()
+                except Exception as e:
+                    logging.error(f"Fallback search failed: {e}")
+                    continue
+                if docs:
+                    return _raced_state(question, found_for, docs)
+    finally:
+        for task in pending:
+            task.cancel()
+    return _raced_state(question, question, [])
+
+
 def generate_response(state):
     """Generate a final response based on query type and documents.
 
@@ -298,6 +720,35 @@ def generate_response(state):
         }
 
 
+async def agenerate_response(state):
+    """Async version of `generate_response`."""
+    logging.debug("Generating response")
+    try:
+        if state["query_type"] == "related":
+            response = await rag_chain.ainvoke({
+                "context": state["documents"],
+                "question": state["question"]
+            })
+            logging.debug(f"Generated response: {response}")
+        else:
+            response = await out_of_scope_generation.ainvoke(
+                {"question": state["question"]})
+            logging.debug(f"Out of scope response generated: {response}")
+        return {
+            "documents": state["documents"],
+            "question": state["question"],
+            "generation": response
+        }
+    except Exception as e:
+        logging.error(f"Failed to generate response: {e}")
+        return {
+            "documents": state.get("documents", []),
+            "question": state.get("question", ""),
+            "generation": "Error: Unable to generate response."
+            " Please try again later."
+        }
+
+
 def decide_to_generate(state):
     """Decide whether to use web search or generate response directly
       based on graded docs.
@@ -314,6 +765,38 @@ def decide_to_generate(state):
         return "generate_response"
 
 
+def speculative_retrieve(state):
+    """Run `retrieve` alongside classification.
+
+    Only the documents are written back: the classifier updates the state in
+    the same step, so the question must not be written twice, and a failed
+    lookup simply leaves nothing to grade.
+
+    Returns:
+        dict: Retrieved documents, empty on failure.
+    """
+    return {"documents": retrieve(state).get("documents", [])}
+
+
+async def aspeculative_retrieve(state):
+    """Async version of `speculative_retrieve`."""
+    return {"documents": (await aretrieve(state)).get("documents", [])}
+
+
+def join_speculation(state):
+    """Join the speculative branches once the query has been classified.
+
+    Returns:
+        dict: Empty update for related queries; otherwise the speculatively
+        retrieved documents are discarded.
+    """
+    if state.get("query_type") == "related":
+        return {}
+    logging.debug("Dropping speculative retrieval for"
+                  f" {state.get('query_type')} query.")
+    return {"documents": []}
+
+
 # Define StateGraph workflow logic
 class State(TypedDict):
     """Defines the structure and datatypes of the workflow state."""
@@ -322,30 +805,202 @@ class State(TypedDict):
     web_search: str
     query_type: str
     documents: List[Document]
+    original_question: str
+
+
+def _node(name, func, afunc=None):
+    """Graph node running `func` (or `afunc` when async), timed as `name`."""
+    if afunc is None:
+        return RunnableLambda(timed_node(name, func))
+    return RunnableLambda(timed_node(name, func),
+                          afunc=timed_node(name, afunc))
 
 
-workflow = StateGraph(State)
-workflow.add_node("classify_user_query", classify_user_query)
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("grade_documents", grade_documents)
-workflow.add_node("transform_query", transform_query)
-workflow.add_node("web_search_node", web_search)
-workflow.add_node("generate_response", generate_response)
-
-workflow.add_edge(START, "classify_user_query")
-workflow.add_conditional_edges("classify_user_query", non_related_generation, {
-    "retrieve": "retrieve",
-    "generate_response": "generate_response"
-})
-workflow.add_edge("retrieve", "grade_documents")
-workflow.add_conditional_edges("grade_documents", decide_to_generate, {
-    "transform_query": "transform_query",
-    "generate_response": "generate_response"
-})
-workflow.add_edge("transform_query", "web_search_node")
-workflow.add_edge("web_search_node", "generate_response")
-workflow.add_edge("generate_response", END)
-
-tax_app = workflow.compile()
-
-logging.info("Workflow compiled and ready.")
+def build_workflow(speculative=False, rewrite_mode="sequential"):
+    """Build the StateGraph for the tax assistant.
+
+    Args:
+        speculative (bool): Start `retrieve` in parallel with
+            `classify_user_query` instead of after it. Both branches join
+            in `join_speculation`, which drops the retrieved documents for
+            "notrelated"/"illegal" queries.
+        rewrite_mode (str): "sequential" rewrites the query and then
+            searches the web; "race" replaces both nodes with
+            `rewrite_and_search`.
+
+    Returns:
+        StateGraph: The uncompiled workflow.
+    """
+    # Each node carries a sync and an async implementation so the graph can
+    # be driven with both `invoke`/`stream` and `ainvoke`/`astream`, and
+    # is timed into the node latency histogram.
+    workflow = StateGraph(State)
+    classified = counted_branch("non_related_generation",
+                                non_related_generation)
+    workflow.add_node("classify_user_query",
+                      _node("classify_user_query", classify_user_query,
+                            aclassify_user_query))
+    workflow.add_node("grade_documents",
+                      _node("grade_documents", grade_documents,
+                            agrade_documents))
+    workflow.add_node("generate_response",
+                      _node("generate_response", generate_response,
+                            agenerate_response))
+
+    if speculative:
+        workflow.add_node("retrieve",
+                          _node("retrieve", speculative_retrieve,
+                                aspeculative_retrieve))
+        workflow.add_node("join_speculation",
+                          _node("join_speculation", join_speculation))
+        workflow.add_edge(START, "classify_user_query")
+        workflow.add_edge(START, "retrieve")
+        workflow.add_edge(["classify_user_query", "retrieve"],
+                          "join_speculation")
+        workflow.add_conditional_edges("join_speculation",
+                                       classified, {
+                                           "retrieve": "grade_documents",
+                                           "generate_response": "generate_response"
+                                       })
+    else:
+        workflow.add_node("retrieve",
+                          _node("retrieve", retrieve, aretrieve))
+        workflow.add_edge(START, "classify_user_query")
+        workflow.add_conditional_edges("classify_user_query",
+                                       classified, {
+                                           "retrieve": "retrieve",
+                                           "generate_response": "generate_response"
+                                       })
+        workflow.add_edge("retrieve", "grade_documents")
+
+    if rewrite_mode == "race":
+        workflow.add_node("rewrite_and_search",
+                          _node("rewrite_and_search", rewrite_and_search,
+                                arewrite_and_search))
+        workflow.add_edge("rewrite_and_search", "generate_response")
+        fallback = "rewrite_and_search"
+    else:
+        workflow.add_node("transform_query",
+                          _node("transform_query", transform_query,
+                                atransform_query))
+        workflow.add_node("web_search_node",
+                          _node("web_search_node", web_search, aweb_search))
+        workflow.add_edge("transform_query", "web_search_node")
+        workflow.add_edge("web_search_node", "generate_response")
+        fallback = "transform_query"
+    workflow.add_conditional_edges("grade_documents", counted_branch(
+        "decide_to_generate", decide_to_generate), {
+        "transform_query": fallback,
+        "generate_response": "generate_response"
+    })
+    workflow.add_edge("generate_response", END)
+    return workflow
+
+
+workflow = build_workflow(speculative=settings.SPECULATIVE_RETRIEVAL,
+                          rewrite_mode=settings.REWRITE_MODE)
+tax_app = Lazy(workflow.compile, "tax_app")
+
+answer_cache = build_answer_cache(embeddings)
+response_flight = (SingleFlight(counter=COALESCED)
+                   if settings.COALESCE_REQUESTS else None)
+# Caps the graph runs in flight; excess requests queue, then get 429/503.
+admission = build_admission_controller(settings.MAX_IN_FLIGHT,
+                                       settings.MAX_QUEUE,
+                                       settings.QUEUE_TIMEOUT)
+
+
+def initial_state(question):
+    """Build the graph input for a user question."""
+    return {
+        "question": question,
+        "original_question": question,
+        "generation": "",
+        "web_search": "No",
+        "documents": [],
+        "query_type": "",
+    }
+
+
+def _cacheable(generation):
+    """Only successful answers are cached, never error messages."""
+    return answer_cache is not None and not generation.startswith("Error:")
+
+
+def run_tax_app(question):
+    """Answer a question from the answer cache, or by running the graph.
+
+    Returns:
+        str: The generated (or cached) answer.
+    """
+    if answer_cache is not None:
+        cached = answer_cache.lookup(question)
+        if cached is not None:
+            logging.info("Answer cache hit, skipping the workflow.")
+            return cached
+    for output in tax_app.stream(initial_state(question)):
+        for key, value in output.items():
+            logging.info(f"Node '{key}' finished.")
+    if _cacheable(value["generation"]):
+        answer_cache.store(question, value["generation"])
+    return value["generation"]
+
+
+async def arun_tax_app(question):
+    """Async version of `run_tax_app`.
+
+    The graph run holds an admission slot, when admission control is on;
+    raises `Overloaded` if none is given. Cache hits need no slot.
+    """
+    if answer_cache is not None:
+        cached = await answer_cache.alookup(question)
+        if cached is not None:
+            logging.info("Answer cache hit, skipping the workflow.")
+            return cached
+    async with admission.slot() if admission else nullcontext():
+        async for output in tax_app.astream(initial_state(question)):
+            for key, value in output.items():
+                logging.info(f"Node '{key}' finished.")
+    if _cacheable(value["generation"]):
+        await answer_cache.astore(question, value["generation"])
+    return value["generation"]
+
+
+async def astream_tax_app(question):
+    """Answer a question, yielding progress events as the graph runs.
+
+    Yields dicts with an "event" key:
+        "node": a graph node finished (`node` holds its name).
+        "token": a chunk of the answer (`data` holds the text).
+        "end": the full answer (`generation`) and whether it was cached.
+    """
+    if answer_cache is not None:
+        cached = await answer_cache.alookup(question)
+        if cached is not None:
+            logging.info("Answer cache hit, skipping the workflow.")
+            yield {"event": "token", "data": cached}
+            yield {"event": "end", "generation": cached, "cached": True}
+            return
+    generation, streamed = "", False
+    async for mode, chunk in tax_app.astream(
+            initial_state(question), stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            # Only the final answer is streamed, not classifier or rewriter
+            # output produced by the other nodes.
+            if (metadata.get("langgraph_node") == "generate_response"
+                    and message.content):
+                streamed = True
+                yield {"event": "token", "data": message.content}
+            continue
+        for key, value in chunk.items():
+            logging.info(f"Node '{key}' finished.")
+            yield {"event": "node", "node": key}
+            if key == "generate_response":
+                generation = value["generation"]
+    if not streamed:
+        # Error messages and non-streaming chains arrive in one piece.
+        yield {"event": "token", "data": generation}
+    if _cacheable(generation):
+        await answer_cache.astore(question, generation)
+    yield {"event": "end", "generation": generation, "cached": False}
@@ -0,0 +1,74 @@
+"""Upstream LLM calls as the number of identical in-flight questions grows.
+
+Every LLM and vector-db call is a fake with a fixed latency. At each
+level, that many requests for the same question (with varying case and
+spacing) hit the `/response` handler at once, with and without request
+coalescing. Without it the LLM calls grow with the duplicates; with it
+they stay at one graph run's worth.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.coalescing --levels 1 2 4 8 16 32
+"""
+import argparse
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+
+from app.models.input_model import InputModel
+from app.routes.response import get_response
+from app.services import workflow
+from app.services.single_flight import SingleFlight
+from benchmarks.fakes import FakeChain, fake_vector_db_client
+
+VARIANTS = ["When is the ITR due date?", "when is the ITR due date",
+            "When is the  ITR due date ?", "WHEN IS THE ITR DUE DATE?"]
+
+
+async def burst(level):
+    started = time.perf_counter()
+    await asyncio.gather(*(get_response(InputModel(
+        question=VARIANTS[i % len(VARIANTS)])) for i in range(level)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Seconds added to every upstream call.")
+    parser.add_argument("--levels", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    llms = [FakeChain(workflow.classify_query(binary_score="related"),
+                      args.latency),
+            FakeChain(workflow.GradeDocuments(binary_score="Yes"),
+                      args.latency),
+            FakeChain("The due date is 31 July.", args.latency)]
+    upstreams = patch.multiple(
+        workflow, query_classifier=llms[0], retrieval_grader=llms[1],
+        rag_chain=llms[2], preclassifier=None, answer_cache=None,
+        vector_db_client=fake_vector_db_client(
+            "ITR must be filed by 31 July.", args.latency))
+
+    print(f"{'duplicates':>10} {'LLM calls off':>14} {'LLM calls on':>13}"
+          f" {'wall off':>9} {'wall on':>8}")
+    with upstreams:
+        # The first run builds the graph; keep it out of the table.
+        asyncio.run(burst(1))
+        for level in args.levels:
+            row = []
+            for flight in (None, SingleFlight()):
+                before = sum(llm.calls for llm in llms)
+                with patch.object(workflow, "response_flight", flight):
+                    wall = asyncio.run(burst(level))
+                row.append((sum(llm.calls for llm in llms) - before, wall))
+            (off_calls, off_wall), (on_calls, on_wall) = row
+            print(f"{level:>10} {off_calls:>14} {on_calls:>13}"
+                  f" {off_wall:>8.2f}s {on_wall:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Throughput of the `/response` handler as in-flight requests grow.
+
+Every upstream call is replaced by a fake with a fixed latency, so with the
+async graph throughput should scale with concurrency while the old blocking
+`tax_app.stream` loop stays flat at one question at a time.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.concurrency --latency 0.05 --levels 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+
+from app.models.input_model import InputModel
+from app.routes.response import get_response
+from app.services import workflow
+from benchmarks.fakes import FakeChain, fake_vector_db_client
+
+
+def stub_upstreams(latency):
+    """Patch every LLM, vector-db and search call in the workflow."""
+    return patch.multiple(
+        workflow,
+        query_classifier=FakeChain(
+            workflow.classify_query(binary_score="related"), latency),
+        retrieval_grader=FakeChain(
+            workflow.GradeDocuments(binary_score="Yes"), latency),
+        rag_chain=FakeChain("Generated answer", latency),
+        vector_db_client=fake_vector_db_client(
+            "Section 80C allows a deduction of up to Rs 1.5 lakh.", latency),
+        answer_cache=None,
+    )
+
+
+async def blocking_handler(question):
+    """The pre-async route body: a sync graph run inside the event loop."""
+    initial_state = {"question": question, "generation": "",
+                     "web_search": "No", "documents": [], "query_type": ""}
+    for output in workflow.tax_app.stream(initial_state):
+        for value in output.values():
+            pass
+    return {"generation": value["generation"]}
+
+
+async def async_handler(question):
+    return await get_response(InputModel(question=question))
+
+
+async def measure(handler, concurrency, total):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await handler(f"What is the 80C limit? #{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Seconds added to every upstream call.")
+    parser.add_argument("--requests", type=int, default=32,
+                        help="Questions sent per concurrency level.")
+    parser.add_argument("--levels", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    print(f"{'in-flight':>9} {'blocking q/s':>13} {'async q/s':>10}")
+    with stub_upstreams(args.latency):
+        for level in args.levels:
+            blocking = asyncio.run(
+                measure(blocking_handler, level, args.requests))
+            concurrent = asyncio.run(
+                measure(async_handler, level, args.requests))
+            print(f"{level:>9} {blocking:>13.1f} {concurrent:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
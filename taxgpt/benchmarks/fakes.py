@@ -0,0 +1,99 @@
+"""Deterministic stand-ins for the LLM, vector-db and web search calls.
+
+The fakes sleep for a configurable latency so the benchmarks measure how the
+workflow schedules slow upstream calls rather than the calls themselves.
+"""
+import asyncio
+import hashlib
+import re
+import time
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.runnables import Runnable
+
+from app.services.vector_client import VectorDBClient
+
+
+class FakeChain(Runnable):
+    """Runnable returning a fixed (or computed) output after a delay.
+
+    `latency` is a number of seconds, or a callable drawing one per call.
+
+    Subclassing `Runnable` gives the fakes the real `batch`/`abatch`
+    behaviour, including `max_concurrency`.
+    """
+
+    def __init__(self, output, latency=0.0):
+        self.output = output
+        self.latency = latency
+        self.calls = 0
+
+    def _result(self, inputs):
+        self.calls += 1
+        return self.output(inputs) if callable(self.output) else self.output
+
+    def _latency(self):
+        return self.latency() if callable(self.latency) else self.latency
+
+    def invoke(self, inputs, config=None, **kwargs):
+        time.sleep(self._latency())
+        return self._result(inputs)
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        await asyncio.sleep(self._latency())
+        return self._result(inputs)
+
+
+def fake_vector_db_client(document, latency=0.0):
+    """Build a `VectorDBClient` that answers like the vector-db service."""
+    def handler(request):
+        time.sleep(latency)
+        return httpx.Response(200, json={"document": document})
+
+    async def ahandler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"document": document})
+
+    return VectorDBClient("http://vector-db",
+                          transport=httpx.MockTransport(handler),
+                          async_transport=httpx.MockTransport(ahandler))
+
+
+def vector_db_stub(hits, latency=0.0):
+    """A FastAPI app serving `/vector` like vector-db, with fixed hits.
+
+    `latency` is a number of seconds, or a callable drawing one per request.
+    """
+    app = FastAPI()
+
+    @app.post("/vector")
+    async def vector():
+        await asyncio.sleep(latency() if callable(latency) else latency)
+        return {"document": hits}
+
+    return app
+
+
+class HashingEmbeddings:
+    """Bag-of-words embeddings hashed into `size` buckets.
+
+    Crude but local and deterministic: texts sharing words get similar
+    vectors, which is enough to exercise similarity-based stages offline.
+    """
+
+    def __init__(self, size=512):
+        self.size = size
+
+    def embed_query(self, text):
+        vector = [0.0] * self.size
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0
+        return vector
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
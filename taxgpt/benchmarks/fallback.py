@@ -0,0 +1,103 @@
+"""p50/p95 latency of the web search fallback path.
+
+Compares the ways the graph can get from "documents were not relevant" to
+web results:
+
+    sequential         rewrite the question (LLM), then search
+    sequential-cached  the same with the rewrite already memoised
+    race               search the raw question while rewriting, first
+                       search with results wins
+
+The rewriter and the search tool are fakes with log-normal latencies. A
+share of raw questions (--raw-miss-rate) finds nothing, so the race has to
+wait for the rewritten search.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.fallback --runs 500
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services import workflow
+from app.services.web_search import WebSearcher
+from benchmarks.fakes import FakeChain
+
+
+class FakeSearchTool:
+    """Search tool whose raw questions sometimes come back empty."""
+
+    def __init__(self, latency, raw_miss_rate, rng):
+        self.latency = latency
+        self.raw_miss_rate = raw_miss_rate
+        self.rng = rng
+
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(self.latency())
+        query = inputs["query"]
+        if query.startswith("raw") and self.rng.random() < self.raw_miss_rate:
+            return []
+        return [{"url": query, "content": f"Results for {query}"}]
+
+
+def lognormal(rng, median, sigma=0.5):
+    return lambda: rng.lognormvariate(np.log(median), sigma)
+
+
+async def fallback_once(mode, question):
+    state = {"question": question, "original_question": question,
+             "documents": []}
+    started = time.perf_counter()
+    if mode == "race":
+        await workflow.arewrite_and_search(state)
+    else:
+        state.update(await workflow.atransform_query(state))
+        await workflow.aweb_search(state)
+    return time.perf_counter() - started
+
+
+async def run(mode, runs):
+    workflow.rewrite_cache.clear()
+    questions = [f"raw question {i}" for i in range(runs)]
+    if mode == "sequential-cached":
+        for question in questions:
+            workflow.rewrite_cache.set(workflow.normalize_question(question),
+                                       f"rewritten {question}")
+    return await asyncio.gather(*(fallback_once(mode, question)
+                                  for question in questions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--rewrite-latency", type=float, default=0.8,
+                        help="Median seconds per rewrite LLM call.")
+    parser.add_argument("--search-latency", type=float, default=0.6,
+                        help="Median seconds per web search.")
+    parser.add_argument("--raw-miss-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(0)
+    rewriter = FakeChain(lambda inputs: f"rewritten {inputs['question']}",
+                         lognormal(rng, args.rewrite_latency))
+    tool = FakeSearchTool(lognormal(rng, args.search_latency),
+                          args.raw_miss_rate, rng)
+    print(f"{'mode':<18} {'p50':>7} {'p95':>7}")
+    with patch.object(workflow, "question_rewriter", rewriter):
+        for mode in ("sequential", "sequential-cached", "race"):
+            with patch.object(workflow, "web_searcher",
+                              WebSearcher(tool, timeout=30)):
+                latencies = asyncio.run(run(mode, args.runs))
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"{mode:<18} {p50:>6.2f}s {p95:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-question grading latency: sequential vs batched vs single-call.
+
+The grader LLM is replaced by a fake with a fixed per-call latency. The
+sequential row reproduces the old one-`invoke`-per-document loop.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.grading --latency 0.2 --documents 4 8
+"""
+import argparse
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+
+from langchain.schema import Document
+
+from app.services import workflow
+from benchmarks.fakes import FakeChain
+
+
+def sequential(state):
+    """The pre-batching grading loop."""
+    return [workflow.retrieval_grader.invoke(
+        {"question": state["question"], "document": doc.page_content})
+        for doc in state["documents"]]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Seconds per grader LLM call.")
+    parser.add_argument("--documents", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    grader = FakeChain(workflow.GradeDocuments(binary_score="Yes"),
+                       args.latency)
+    # A single call that grades every document takes a little longer.
+    batch_grader = FakeChain(
+        lambda inputs: workflow.GradeDocumentsBatch(
+            binary_scores=["Yes"] * inputs["documents"].count("Document ")),
+        args.latency * 1.5)
+
+    print(f"{'docs':>4} {'sequential':>11} {'batch':>8} {'abatch':>8}"
+          f" {'single':>8}")
+    with patch.multiple(workflow, retrieval_grader=grader,
+                        batch_retrieval_grader=batch_grader), \
+            patch.object(workflow.settings, "GRADER_MAX_CONCURRENCY",
+                         args.max_concurrency):
+        for n in args.documents:
+            state = {"question": "What is the 80C limit?",
+                     "documents": [Document(page_content=f"Chunk {i}")
+                                   for i in range(n)]}
+            with patch.object(workflow.settings, "GRADER_MODE", "batch"):
+                serial = timed(sequential, state)
+                batched = timed(workflow.grade_documents, state)
+                abatched = timed(asyncio.run, workflow.agrade_documents(state))
+            with patch.object(workflow.settings, "GRADER_MODE", "single_call"):
+                single = timed(workflow.grade_documents, state)
+            print(f"{n:>4} {serial:>10.2f}s {batched:>7.2f}s {abatched:>7.2f}s"
+                  f" {single:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Local grader vs the LLM grader: latency, LLM calls and agreement.
+
+The labelled set is a JSONL file of (question, document, dense score,
+label) rows, where the label is the LLM grader's verdict. The bundled
+sample is hand-labelled. Relabel a set with the real grader (this needs
+OPENAI_API_KEY1) before trusting the agreement figures:
+
+    python -m benchmarks.local_grading benchmarks/grading_sample.jsonl \\
+        --label-with-llm labelled.jsonl
+
+The LLM grader is otherwise replaced by a fake that answers with the
+label after `--latency` seconds, so the timings show what the local stage
+saves per question.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.local_grading benchmarks/grading_sample.jsonl
+"""
+import argparse
+import json
+import logging
+import time
+from unittest.mock import patch
+
+from langchain.schema import Document
+
+from app.services import workflow
+from app.services.reranker import SCORE_KEY
+from benchmarks.fakes import FakeChain
+
+
+def load_rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def label_with_llm(rows, output):
+    scores = workflow.retrieval_grader.batch(
+        [{"question": row["question"], "document": row["document"]}
+         for row in rows],
+        config={"max_concurrency": workflow.settings.GRADER_MAX_CONCURRENCY})
+    with open(output, "w", encoding="utf-8") as f:
+        for row, score in zip(rows, scores):
+            f.write(json.dumps({**row, "label": score.binary_score}) + "\n")
+
+
+def states(rows):
+    by_question = {}
+    for row in rows:
+        by_question.setdefault(row["question"], []).append(row)
+    for question, group in by_question.items():
+        yield question, group, {"question": question, "documents": [
+            Document(page_content=row["document"],
+                     metadata={SCORE_KEY: row["score"]}) for row in group]}
+
+
+def timed_grading(rows, mode, fake):
+    started, calls = time.perf_counter(), fake.calls
+    kept = []
+    with patch.object(workflow.settings, "GRADER_MODE", mode):
+        for _, _, state in states(rows):
+            kept.extend(doc.page_content
+                        for doc in workflow.grade_documents(state)["documents"])
+    return time.perf_counter() - started, fake.calls - calls, set(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", help="Labelled JSONL file.")
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Seconds per fake LLM grader call.")
+    parser.add_argument("--label-with-llm", metavar="OUTPUT",
+                        help="Label the rows with the real LLM grader and "
+                             "write them to OUTPUT.")
+    args = parser.parse_args()
+    rows = load_rows(args.rows)
+    if args.label_with_llm:
+        return label_with_llm(rows, args.label_with_llm)
+
+    logging.disable(logging.CRITICAL)
+    grader = workflow.local_grader
+    decided = agreed = 0
+    started = time.perf_counter()
+    for _, group, state in states(rows):
+        verdicts = grader.verdicts(state["question"], state["documents"])
+        for row, verdict in zip(group, verdicts):
+            if verdict is not None:
+                decided += 1
+                agreed += verdict == row["label"]
+    local_us = (time.perf_counter() - started) / len(rows) * 1e6
+
+    labels = {(row["question"], row["document"]): row["label"] for row in rows}
+    fake = FakeChain(
+        lambda inputs: workflow.GradeDocuments(
+            binary_score=labels[inputs["question"], inputs["document"]]),
+        args.latency)
+    relevant = {row["document"] for row in rows if row["label"] == "Yes"}
+    questions = len({row["question"] for row in rows})
+    print(f"{len(rows)} pairs over {questions} questions; local scoring "
+          f"{local_us:.1f} us/pair")
+    print(f"local grader decided {decided}/{len(rows)} pairs, agreeing with "
+          f"the labels on {agreed}/{decided or 1} "
+          f"({agreed / (decided or 1):.1%})")
+    with patch.object(workflow, "retrieval_grader", fake):
+        for mode in ("batch", "local"):
+            seconds, calls, kept = timed_grading(rows, mode, fake)
+            agreement = 1 - len(kept ^ relevant) / len(rows)
+            print(f"{mode:<6} {seconds / questions * 1000:8.1f} ms/question"
+                  f"  {calls:3d} LLM calls  agreement {agreement:.1%}")
+
+
+if __name__ == "__main__":
+    main()
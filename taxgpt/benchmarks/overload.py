@@ -0,0 +1,159 @@
+"""Latency and rejections of POST /response under overload, with and
+without admission control.
+
+The LLM stand-in behaves like a saturated provider: it serves
+`--provider-slots` calls at a time, queues the rest, and fails calls once
+more than `--provider-queue` are waiting (its rate-limit error). Requests
+are sent open-loop at `--qps`, above what the provider can sustain,
+through the ASGI transport to the FastAPI app.
+
+Without admission control every request enters the graph, the provider's
+queue grows for as long as the burst lasts, and late requests either wait
+behind it or come back as degraded "Error:" answers. With it, at most
+`--max-in-flight` graph runs hit the provider, a bounded queue absorbs
+short spikes, and the excess gets a fast 429/503 with Retry-After, so the
+requests that are served keep a stable p99.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.overload --qps 40 --requests 300
+"""
+import argparse
+import asyncio
+import logging
+from collections import Counter
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+
+from app.services import workflow
+from app.services.admission import AdmissionController
+from benchmarks.fakes import fake_vector_db_client
+
+ANSWER = "The due date is 31 July."
+
+
+class SaturatedProvider:
+    """An upstream with a fixed number of slots and a bounded queue."""
+
+    def __init__(self, slots, max_waiting, latency):
+        self.slots = asyncio.Semaphore(slots)
+        self.max_waiting = max_waiting
+        self.latency = latency
+        self.waiting = 0
+
+    async def call(self):
+        if self.waiting >= self.max_waiting:
+            raise RuntimeError("429 Too Many Requests")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.slots.release()
+
+
+class ProviderChain:
+    """Chain answering `output` through the shared provider."""
+
+    def __init__(self, provider, output):
+        self.provider = provider
+        self.output = output
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        await self.provider.call()
+        return self.output
+
+    async def abatch(self, inputs, config=None, **kwargs):
+        return await asyncio.gather(*(self.ainvoke(i) for i in inputs))
+
+
+async def overload(args, admission):
+    provider = SaturatedProvider(args.provider_slots, args.provider_queue,
+                                 args.llm_latency)
+    chains = dict(
+        query_classifier=ProviderChain(
+            provider, workflow.classify_query(binary_score="related")),
+        retrieval_grader=ProviderChain(
+            provider, workflow.GradeDocuments(binary_score="Yes")),
+        rag_chain=ProviderChain(provider, ANSWER))
+    from app.main import app
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def one(client, i):
+        due = started + i / args.qps
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        # Distinct questions, so neither the cache nor coalescing helps.
+        response = await client.post(
+            "/response", json={"question": f"When is ITR {i} due?"})
+        elapsed = loop.time() - due
+        if response.status_code != 200:
+            return str(response.status_code), elapsed
+        if response.json()["generation"] != ANSWER:
+            return "degraded", elapsed
+        return "ok", elapsed
+
+    with patch.multiple(workflow, admission=admission, answer_cache=None,
+                        response_flight=None, preclassifier=None,
+                        vector_db_client=fake_vector_db_client(
+                            "ITR must be filed by 31 July.", 0.01),
+                        **chains):
+        async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://taxgpt", timeout=None) as client:
+            return await asyncio.gather(*(one(client, i)
+                                          for i in range(args.requests)))
+
+
+def percentiles(values):
+    if not values:
+        return "-", "-"
+    p50, p99 = np.percentile(np.array(values) * 1000, [50, 99])
+    return f"{p50:.0f}", f"{p99:.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--qps", type=float, default=40.0)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--llm-latency", type=float, default=0.2,
+                        help="Seconds per LLM call once it has a slot.")
+    parser.add_argument("--provider-slots", type=int, default=16,
+                        help="LLM calls the provider serves at a time.")
+    parser.add_argument("--provider-queue", type=int, default=200,
+                        help="Waiting LLM calls before the provider fails.")
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    capacity = args.provider_slots / (3 * args.llm_latency)
+    print(f"{args.requests} requests at {args.qps:g} q/s; the provider "
+          f"sustains about {capacity:.0f} graph runs/s")
+    print(f"{'admission':<10} {'ok':>5} {'degraded':>9} {'429':>5} {'503':>5}"
+          f" {'ok p50 ms':>10} {'ok p99 ms':>10} {'reject p99 ms':>14}")
+    for label, admission in (
+            ("off", None),
+            ("on", AdmissionController(args.max_in_flight, args.max_queue,
+                                       args.queue_timeout))):
+        outcomes = asyncio.run(overload(args, admission))
+        counts = Counter(result for result, _ in outcomes)
+        ok = [elapsed for result, elapsed in outcomes if result == "ok"]
+        rejected = [elapsed for result, elapsed in outcomes
+                    if result in ("429", "503")]
+        ok_p50, ok_p99 = percentiles(ok)
+        _, reject_p99 = percentiles(rejected)
+        print(f"{label:<10} {counts['ok']:>5} {counts['degraded']:>9}"
+              f" {counts['429']:>5} {counts['503']:>5} {ok_p50:>10}"
+              f" {ok_p99:>10} {reject_p99:>14}")
+
+
+if __name__ == "__main__":
+    main()
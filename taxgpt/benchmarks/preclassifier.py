@@ -0,0 +1,77 @@
+"""Offline accuracy and latency of the query pre-classifier.
+
+Each line of the labelled file is {"question": ..., "label": ...} with
+"related", "notrelated" or "illegal". For each mode the report shows how
+many questions the local stages settle, how many of those they get right,
+and the time per question. Questions left undecided go to the LLM.
+
+The centroid stage uses the configured Google embeddings, or a local
+bag-of-words stand-in with --hashing-embeddings. In the service the
+question embedding is usually already cached by the answer-cache lookup,
+so only the local part of the timing applies there.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.preclassifier benchmarks/preclassifier_sample.jsonl \\
+        --hashing-embeddings
+"""
+import argparse
+import json
+import logging
+import time
+
+from app.services.preclassifier import EXAMPLES, PreClassifier
+
+
+def load_rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classifier, rows):
+    decided, wrong = 0, []
+    started = time.perf_counter()
+    labels = [classifier.classify(row["question"]) for row in rows]
+    elapsed = time.perf_counter() - started
+    for row, label in zip(rows, labels):
+        if label is None:
+            continue
+        decided += 1
+        if label != row["label"]:
+            wrong.append((row["question"], row["label"], label))
+    return decided, wrong, elapsed / len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", help="Labelled JSONL file.")
+    parser.add_argument("--margin", type=float, default=0.08)
+    parser.add_argument("--hashing-embeddings", action="store_true",
+                        help="Use local bag-of-words embeddings.")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    if args.hashing_embeddings:
+        from benchmarks.fakes import HashingEmbeddings
+        embeddings = HashingEmbeddings()
+    else:
+        from app.services.workflow import embeddings
+    rows = load_rows(args.rows)
+
+    for mode, classifier in (
+            ("rules", PreClassifier(None, args.margin, EXAMPLES)),
+            ("centroid", PreClassifier(embeddings, args.margin, EXAMPLES))):
+        if classifier.embeddings is not None:
+            classifier.centroids()
+        decided, wrong, seconds = evaluate(classifier, rows)
+        accuracy = (decided - len(wrong)) / decided if decided else 0.0
+        print(f"{mode:<9} decided {decided}/{len(rows)} "
+              f"({decided / len(rows):.0%}) locally, accuracy "
+              f"{accuracy:.1%}, {seconds * 1e6:.1f} us/question, "
+              f"LLM calls avoided {decided}")
+        for question, expected, label in wrong:
+            print(f"    wrong: {question!r} expected {expected}, got {label}")
+
+
+if __name__ == "__main__":
+    main()
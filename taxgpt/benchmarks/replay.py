@@ -0,0 +1,290 @@
+"""Replay a question log against the tax assistant at a target rate.
+
+Every upstream call (classifier, grader, rewriter and answer LLMs, web
+search, vector-db) is a deterministic stand-in with log-normal latency, so
+runs are repeatable and measure the workflow rather than the providers.
+Each line of the log is a JSON object:
+
+    {"question": "...", "type": "related", "relevant": true}
+
+`type` is what the classifier answers (default "related") and `relevant`
+whether the grader keeps the retrieved chunks (default true; false sends
+the question down the rewrite and web search path).
+
+Questions are sent open-loop at `--qps`, so latency includes any queueing
+behind earlier requests. The targets are:
+
+    graph    `arun_tax_app` in process
+    backend  POST /response on the FastAPI app, through the ASGI transport
+
+Both query a vector-db stub app with canned hits, or a running vector-db
+given with --vector-db-url. The report has p50/p95/p99 latency and a per
+node breakdown; --save-baseline stores it and --baseline compares against
+a stored report, exiting with status 1 on a regression.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.replay benchmarks/replay_sample.jsonl --qps 20
+    python -m benchmarks.replay benchmarks/replay_sample.jsonl \\
+        --target backend --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import sys
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+
+from app.services import metrics, workflow
+from app.services.vector_client import VectorDBClient
+from app.services.web_search import WebSearcher
+from benchmarks.fakes import FakeChain, vector_db_stub
+
+HITS = [
+    {"page_content": "Section 80C allows a deduction of up to Rs 1.5 lakh"
+                     " for PPF, ELSS and life insurance premiums.",
+     "metadata": {"source": "80c.pdf"}, "score": 0.82},
+    {"page_content": "ITR-2 is for individuals with capital gains and no"
+                     " business income.",
+     "metadata": {"source": "itr.pdf"}, "score": 0.74},
+]
+PERCENTILES = (50, 95, 99)
+
+
+def load_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def lognormal(rng, median, sigma=0.3):
+    """Latency sampler; a median of 0 means no delay."""
+    if median <= 0:
+        return 0.0
+    return lambda: rng.lognormvariate(math.log(median), sigma)
+
+
+class SearchStandIn:
+    """Web search tool returning one page per query after a delay."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, inputs):
+        time.sleep(self.latency())
+        return self._results(inputs)
+
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(self.latency())
+        return self._results(inputs)
+
+    @staticmethod
+    def _results(inputs):
+        return [{"url": f"https://example.org/search?q={inputs['query']}",
+                 "content": f"Web result for {inputs['query']}"}]
+
+
+def stand_ins(log, args):
+    """Patch every upstream call of the workflow with a seeded stand-in."""
+    rng = random.Random(args.seed)
+    llm = lognormal(rng, args.llm_latency)
+    types = {row["question"]: row.get("type", "related") for row in log}
+    relevant = {row["question"]: row.get("relevant", True) for row in log}
+    if args.vector_db_url:
+        client = VectorDBClient(args.vector_db_url)
+    else:
+        stub = vector_db_stub(HITS, lognormal(rng, args.vector_latency))
+        client = VectorDBClient("http://vector-db",
+                                async_transport=httpx.ASGITransport(app=stub))
+    stack = ExitStack()
+    stack.enter_context(patch.multiple(
+        workflow,
+        query_classifier=FakeChain(lambda inputs: workflow.classify_query(
+            binary_score=types.get(inputs["question"], "related")), llm),
+        retrieval_grader=FakeChain(lambda inputs: workflow.GradeDocuments(
+            binary_score="Yes" if relevant.get(inputs["question"], True)
+            else "No"), llm),
+        question_rewriter=FakeChain(
+            lambda inputs: f"Indian income tax: {inputs['question']}", llm),
+        rag_chain=FakeChain("Generated answer", llm),
+        out_of_scope_generation=FakeChain("I can only help with tax.", llm),
+        web_searcher=WebSearcher(
+            SearchStandIn(lognormal(rng, args.search_latency)), ttl=None),
+        vector_db_client=client,
+        preclassifier=None,
+        answer_cache=None,
+    ))
+    stack.enter_context(patch.object(workflow.settings, "GRADER_MODE",
+                                     "batch"))
+    stack.enter_context(patch.object(workflow.settings, "SERVER_TIMING", True))
+    workflow.rewrite_cache.clear()
+    return stack
+
+
+def parse_server_timing(header):
+    timings = []
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        timings.append((name, float(duration) / 1000))
+    return timings
+
+
+async def ask_graph(client, question):
+    timings = metrics.start_request()
+    await workflow.arun_tax_app(question)
+    return timings
+
+
+async def ask_backend(client, question):
+    response = await client.post("/response", json={"question": question})
+    response.raise_for_status()
+    return [(name, seconds) for name, seconds in
+            parse_server_timing(response.headers.get("Server-Timing", ""))
+            if name != "total"]
+
+
+async def replay(questions, qps, ask, client):
+    """Send the questions `1/qps` seconds apart, without waiting for replies.
+
+    Returns:
+        tuple: (latencies, per-request node timings, errors, wall seconds).
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def one(i, question):
+        due = started + i / qps
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        try:
+            timings = await ask(client, question)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Request failed: {e!r}")
+            return None
+        # Measured from the scheduled send time, so a backlog shows up.
+        return loop.time() - due, timings
+
+    outcomes = await asyncio.gather(*(one(i, question)
+                                      for i, question in enumerate(questions)))
+    done = [outcome for outcome in outcomes if outcome is not None]
+    return ([latency for latency, _ in done], [timings for _, timings in done],
+            len(outcomes) - len(done), loop.time() - started)
+
+
+def summarise(latencies, node_timings, errors, wall, sent):
+    report = {
+        "requests": sent,
+        "errors": errors,
+        "achieved_qps": (sent - errors) / wall if wall else 0.0,
+        "latency_ms": {},
+        "nodes": {},
+    }
+    if latencies:
+        values = np.percentile(np.array(latencies) * 1000, PERCENTILES)
+        report["latency_ms"] = {f"p{p}": round(float(v), 2)
+                                for p, v in zip(PERCENTILES, values)}
+    by_node = {}
+    for timings in node_timings:
+        for node, seconds in timings:
+            by_node.setdefault(node, []).append(seconds * 1000)
+    for node, values in by_node.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        report["nodes"][node] = {"runs": len(values),
+                                 "p50": round(float(p50), 2),
+                                 "p95": round(float(p95), 2)}
+    return report
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print(f"{report['requests']} requests, {report['errors']} errors, "
+          f"{report['achieved_qps']:.1f} q/s achieved")
+    print("latency " + "  ".join(f"{name} {value:.1f} ms"
+                                 for name, value in latency.items()))
+    print(f"{'node':<22} {'runs':>5} {'p50 ms':>8} {'p95 ms':>8}")
+    for node, row in report["nodes"].items():
+        print(f"{node:<22} {row['runs']:>5} {row['p50']:>8.1f} "
+              f"{row['p95']:>8.1f}")
+
+
+def regressions(report, baseline, tolerance, min_delta_ms):
+    """Figures more than `tolerance` (and `min_delta_ms`) above the baseline."""
+    pairs = [(f"latency {name}", baseline["latency_ms"].get(name), value)
+             for name, value in report["latency_ms"].items()]
+    pairs += [(f"{node} p95", baseline["nodes"].get(node, {}).get("p95"),
+               row["p95"]) for node, row in report["nodes"].items()]
+    return [(name, old, new) for name, old, new in pairs
+            if old is not None and new > old * (1 + tolerance)
+            and new - old > min_delta_ms]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", help="JSONL question log.")
+    parser.add_argument("--target", choices=["graph", "backend"],
+                        default="graph")
+    parser.add_argument("--qps", type=float, default=10.0)
+    parser.add_argument("--requests", type=int,
+                        help="Questions to send, cycling through the log; "
+                             "defaults to one pass.")
+    parser.add_argument("--llm-latency", type=float, default=0.3,
+                        help="Median seconds per LLM call.")
+    parser.add_argument("--vector-latency", type=float, default=0.03,
+                        help="Median seconds per vector-db stub query.")
+    parser.add_argument("--search-latency", type=float, default=0.5,
+                        help="Median seconds per web search.")
+    parser.add_argument("--vector-db-url",
+                        help="Query a running vector-db instead of the stub.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed relative slowdown against the baseline.")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="Slowdowns smaller than this are noise.")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    log = load_log(args.log)
+    count = args.requests or len(log)
+    questions = [log[i % len(log)]["question"] for i in range(count)]
+
+    async def run():
+        if args.target == "graph":
+            return await replay(questions, args.qps, ask_graph, None)
+        from app.main import app
+        async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://taxgpt", timeout=None) as client:
+            return await replay(questions, args.qps, ask_backend, client)
+
+    with stand_ins(log, args):
+        latencies, node_timings, errors, wall = asyncio.run(run())
+    report = summarise(latencies, node_timings, errors, wall, count)
+    report["config"] = {key: value for key, value in vars(args).items()
+                        if key not in ("save_baseline", "baseline")}
+    print(f"target={args.target} qps={args.qps}")
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.tolerance,
+                            args.min_delta_ms)
+        for name, old, new in found:
+            print(f"REGRESSION {name}: {old:.1f} -> {new:.1f} ms")
+        if not found:
+            print(f"No regressions against {args.baseline}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Latency of the serial graph vs speculative classify/retrieve fan-out.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.speculative --classify-latency 0.4 --retrieve-latency 0.3
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from unittest.mock import patch
+
+from app.services import workflow
+from benchmarks.fakes import FakeChain, fake_vector_db_client
+
+
+async def run(app, question, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await app.ainvoke(workflow.initial_state(question))
+        timings.append(time.perf_counter() - start)
+    return statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classify-latency", type=float, default=0.4)
+    parser.add_argument("--retrieve-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.2,
+                        help="Latency of the grader and generation calls.")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    apps = {
+        "serial": workflow.build_workflow(speculative=False).compile(),
+        "speculative": workflow.build_workflow(speculative=True).compile(),
+    }
+    queries = {"related": "What is the 80C limit?",
+               "notrelated": "Who won the IPL last year?"}
+    vector_db_client = fake_vector_db_client("Section 80C allows ...",
+                                             args.retrieve_latency)
+
+    print(f"{'query type':>11} {'serial':>8} {'speculative':>12} {'saved':>7}")
+    for query_type, question in queries.items():
+        with patch.multiple(
+                workflow,
+                query_classifier=FakeChain(
+                    workflow.classify_query(binary_score=query_type),
+                    args.classify_latency),
+                retrieval_grader=FakeChain(
+                    workflow.GradeDocuments(binary_score="Yes"),
+                    args.llm_latency),
+                rag_chain=FakeChain("Generated answer", args.llm_latency),
+                out_of_scope_generation=FakeChain("Tax questions only",
+                                                  args.llm_latency),
+                vector_db_client=vector_db_client):
+            serial = asyncio.run(run(apps["serial"], question, args.repeats))
+            speculative = asyncio.run(
+                run(apps["speculative"], question, args.repeats))
+        print(f"{query_type:>11} {serial:>7.2f}s {speculative:>11.2f}s"
+              f" {serial - speculative:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
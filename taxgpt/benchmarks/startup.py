@@ -0,0 +1,84 @@
+"""Cold start: import time of the app and the cost of prewarming it.
+
+Each run starts a fresh interpreter with `python -X importtime`, imports
+the module and then builds every lazy component with `prewarm`, the way
+the FastAPI lifespan does. Reported are the medians over the runs, and
+the packages with the largest import time in the last run.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| +(\S+)")
+
+SCRIPT = """
+import json, logging, time
+logging.disable(logging.CRITICAL)
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from app.services.lazy import prewarm
+components = prewarm()
+print(json.dumps({{"import": imported - started,
+                  "prewarm": time.perf_counter() - imported,
+                  "components": components}}))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, cumulative seconds) for each line of -X importtime."""
+    return [(module, int(cumulative) / 1e6)
+            for _, cumulative, module in IMPORTTIME_RE.findall(stderr)]
+
+
+def run_once(module):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         SCRIPT.format(module=module)],
+        capture_output=True, text=True, check=True)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10,
+                        help="Slowest top-level imports to list.")
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    imports = [timings["import"] for timings, _ in runs]
+    prewarms = [timings["prewarm"] for timings, _ in runs]
+    print(f"{args.module}: import {statistics.median(imports) * 1000:.0f} ms,"
+          f" prewarm {statistics.median(prewarms) * 1000:.0f} ms"
+          f" (median of {args.runs})")
+
+    timings, rows = runs[-1]
+    print("\nslowest components to build:")
+    for name, seconds in sorted(timings["components"].items(),
+                                key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+    # A package's first import includes everything below it, so its
+    # largest cumulative time is what it costs.
+    packages = {}
+    for module, seconds in rows:
+        package = module.split(".")[0]
+        if package != "app":
+            packages[package] = max(packages.get(package, 0), seconds)
+    print("\nslowest packages to import (including prewarm imports):")
+    for package, seconds in sorted(packages.items(),
+                                   key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {package}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Per-request latency of fresh connections vs the pooled vector-db client.
+
+Starts a local stub of the vector-db service and times the same `/vector`
+call made with a new connection per request (the old `requests.post`) and
+through the shared keep-alive `VectorDBClient`.
+
+Run from the `taxgpt` directory:
+
+    python -m benchmarks.vector_client --requests 500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import requests
+
+from app.services.vector_client import VectorDBClient
+
+PAYLOAD = json.dumps({"document": [
+    {"page_content": "Section 80C allows a deduction of up to Rs 1.5 lakh.",
+     "metadata": {}}]}).encode()
+
+
+class StubVectorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment so keep-alive connections are
+    # not held up by delayed ACKs.
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubVectorHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def per_request_ms(func, total):
+    start = time.perf_counter()
+    for i in range(total):
+        func(f"What is the 80C limit? #{i}")
+    return (time.perf_counter() - start) / total * 1000
+
+
+async def aper_request_ms(func, total):
+    start = time.perf_counter()
+    for i in range(total):
+        await func(f"What is the 80C limit? #{i}")
+    return (time.perf_counter() - start) / total * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    server = start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def fresh_sync(question):
+        requests.post(f"{base_url}/vector",
+                      json={"question": question}).raise_for_status()
+
+    async def fresh_async(question):
+        async with httpx.AsyncClient() as client:
+            response = await client.post(f"{base_url}/vector",
+                                         json={"question": question})
+            response.raise_for_status()
+
+    client = VectorDBClient(base_url)
+    rows = [
+        ("sync, new connection", per_request_ms(fresh_sync, args.requests)),
+        ("sync, pooled client", per_request_ms(client.query, args.requests)),
+        ("async, new connection",
+         asyncio.run(aper_request_ms(fresh_async, args.requests))),
+    ]
+
+    async def pooled_async():
+        try:
+            return await aper_request_ms(client.aquery, args.requests)
+        finally:
+            await client.aclose()
+
+    rows.append(("async, pooled client", asyncio.run(pooled_async())))
+    server.shutdown()
+
+    for name, ms in rows:
+        print(f"{name:<22} {ms:>7.3f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
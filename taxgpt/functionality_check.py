@@ -1,11 +1,52 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import httpx
+import openai
 from langchain.schema import Document
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.runnables import RunnableLambda
+import asyncio
 import logging
+import os
+import tempfile
+import time
+import uuid
+
+from app.services import metrics
+from app.services.admission import AdmissionController, Overloaded
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.lazy import Lazy
+from app.services.single_flight import SingleFlight
+from app.services.vector_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    VectorDBClient
+)
+from app.services.preclassifier import PreClassifier
+from app.services.rate_limit import TokenBucket, Throttled
+from app.services.web_search import WebSearcher
+from app.services.reranker import LocalGrader, terms
+from app.services.cache import (
+    AnswerCache,
+    InMemoryBackend,
+    SQLiteBackend,
+    build_answer_cache,
+    normalize_question,
+    references
+)
 
 
 # Import your workflow functions from the actual module
 from app.services.workflow import (
+    aclassify_user_query,
+    aretrieve,
+    arewrite_and_search,
+    build_workflow,
+    rewrite_and_search,
     classify_user_query,
     non_related_generation,
     retrieve,
@@ -54,6 +95,93 @@ class TestClassifyUserQuery(unittest.TestCase):
         self.assertEqual(state["query_type"], "notrelated")
 
 
+class TopicEmbeddings:
+    """Embeds text by which of two topic word lists it mentions."""
+    topics = [["tax", "return", "salary", "refund"],
+              ["weather", "movie", "cake", "joke"]]
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [float(sum(word in text for word in words))
+                for words in self.topics]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class TestPreClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.classifier = PreClassifier(TopicEmbeddings(), margin=0.1)
+
+    def test_rules_settle_tax_vocabulary(self):
+        self.assertEqual(self.classifier.classify("What is the 80C limit?"),
+                         "related")
+        self.assertEqual(self.classifier.classify("Who should file ITR-2"),
+                         "related")
+
+    def test_illegal_hints_go_to_the_llm(self):
+        self.assertIsNone(self.classifier.classify("How to evade income tax?"))
+
+    def test_evasion_wording_with_tax_terms_goes_to_the_llm(self):
+        for question in (
+                "How do I avoid paying tax by not declaring cash income?",
+                "Can I skip showing rental income in my ITR?",
+                "Best way to under-report turnover for GST",
+                "Is it fine to keep my capital gains undisclosed?",
+                "Can I claim HRA without paying rent?"):
+            with self.subTest(question=question):
+                self.assertIsNone(self.classifier.classify(question))
+
+    def test_nearest_centroid(self):
+        self.assertEqual(self.classifier.classify("Tell me a joke about cake"),
+                         "notrelated")
+        self.assertIsNone(self.classifier.classify("Hello there"))
+
+    def test_decision_counts(self):
+        self.classifier.classify("What is the 80C limit?")
+        self.classifier.classify("Recommend a movie")
+        self.classifier.record("llm", "illegal")
+
+        stats = self.classifier.stats()
+        self.assertEqual(stats["decisions"], {"centroid:notrelated": 1,
+                                              "llm:illegal": 1,
+                                              "rules:related": 1})
+        self.assertAlmostEqual(stats["llm_share"], 1 / 3)
+
+    def test_decisions_are_exported_as_metrics(self):
+        before = metrics.PRECLASSIFIER_DECISIONS.value(stage="centroid",
+                                                       label="notrelated")
+
+        self.classifier.classify("Recommend a movie")
+
+        self.assertEqual(metrics.PRECLASSIFIER_DECISIONS.value(
+            stage="centroid", label="notrelated"), before + 1)
+        self.assertIn('taxgpt_preclassifier_decisions_total{stage="centroid",'
+                      'label="notrelated"}', metrics.registry.render())
+
+    @patch("app.services.workflow.query_classifier")
+    def test_classify_user_query_skips_llm(self, mock_classifier):
+        with patch("app.services.workflow.preclassifier", self.classifier):
+            result = classify_user_query({"question": "What is TDS?"})
+
+        self.assertEqual(result["query_type"], "related")
+        mock_classifier.invoke.assert_not_called()
+
+    @patch("app.services.workflow.query_classifier")
+    def test_ambiguous_question_uses_llm(self, mock_classifier):
+        mock_classifier.invoke.return_value = MagicMock(binary_score="illegal")
+        with patch("app.services.workflow.preclassifier", self.classifier):
+            result = classify_user_query({"question": "How to evade tax?"})
+
+        self.assertEqual(result["query_type"], "illegal")
+        self.assertEqual(self.classifier.stats()["decisions"],
+                         {"llm:illegal": 1})
+
+
 class TestNonRelatedGeneration(unittest.TestCase):
 
     def test_related_query_type(self):
@@ -75,12 +203,9 @@ class TestNonRelatedGeneration(unittest.TestCase):
 
 class TestRetrieve(unittest.TestCase):
 
-    @patch("app.services.workflow.requests.post")
-    def test_successful_retrieve(self, mock_post):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"document": "Test content"}
-        mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
+    @patch("app.services.workflow.vector_db_client")
+    def test_successful_retrieve(self, mock_vector_db):
+        mock_vector_db.query.return_value = {"document": "Test content"}
 
         state = {"question": "What is income tax?"}
         result = retrieve(state)
@@ -89,9 +214,22 @@ class TestRetrieve(unittest.TestCase):
         self.assertEqual(result["documents"][0].page_content, "Test content")
         self.assertEqual(result["question"], state["question"])
 
-    @patch("app.services.workflow.requests.post")
-    def test_failed_request(self, mock_post):
-        mock_post.side_effect = Exception("API down")
+    @patch("app.services.workflow.vector_db_client")
+    def test_retrieve_one_document_per_hit(self, mock_vector_db):
+        mock_vector_db.query.return_value = {"document": [
+            {"page_content": "Section 80C", "metadata": {"source": "act"}},
+            {"page_content": "Section 80D", "metadata": {}},
+        ]}
+
+        result = retrieve({"question": "What are the deductions?"})
+
+        self.assertEqual([d.page_content for d in result["documents"]],
+                         ["Section 80C", "Section 80D"])
+        self.assertEqual(result["documents"][0].metadata, {"source": "act"})
+
+    @patch("app.services.workflow.vector_db_client")
+    def test_failed_request(self, mock_vector_db):
+        mock_vector_db.query.side_effect = Exception("API down")
 
         state = {"question": "What is GST?"}
         result = retrieve(state)
@@ -104,7 +242,7 @@ class TestGradeDocuments(unittest.TestCase):
 
     @patch("app.services.workflow.retrieval_grader")
     def test_grades_documents_relevant(self, mock_grader):
-        mock_grader.invoke.return_value = MagicMock(binary_score="Yes")
+        mock_grader.batch.return_value = [MagicMock(binary_score="Yes")]
         state = {
             "question": "What is income tax?",
             "documents": [Document(page_content="Income tax is a tax levied...")]
@@ -116,7 +254,7 @@ class TestGradeDocuments(unittest.TestCase):
 
     @patch("app.services.workflow.retrieval_grader")
     def test_grades_documents_not_relevant(self, mock_grader):
-        mock_grader.invoke.return_value = MagicMock(binary_score="No")
+        mock_grader.batch.return_value = [MagicMock(binary_score="No")]
         state = {
             "question": "What is income tax?",
             "documents": [Document(page_content="Unrelated content")]
@@ -128,7 +266,7 @@ class TestGradeDocuments(unittest.TestCase):
 
     @patch("app.services.workflow.retrieval_grader")
     def test_grades_documents_exception(self, mock_grader):
-        mock_grader.invoke.side_effect = Exception("Grader error")
+        mock_grader.batch.side_effect = Exception("Grader error")
         state = {
             "question": "What is income tax?",
             "documents": [Document(page_content="Income tax explanation")]
@@ -139,8 +277,107 @@ class TestGradeDocuments(unittest.TestCase):
         self.assertEqual(result["web_search"], "Yes")
 
 
+    @patch("app.services.workflow.retrieval_grader")
+    def test_grades_documents_keeps_order(self, mock_grader):
+        mock_grader.batch.return_value = [MagicMock(binary_score="Yes"),
+                                          MagicMock(binary_score="No"),
+                                          MagicMock(binary_score="Yes")]
+        docs = [Document(page_content=f"Doc {i}") for i in range(3)]
+        state = {"question": "What is income tax?", "documents": docs}
+
+        result = grade_documents(state)
+        self.assertEqual(result["documents"], [docs[0], docs[2]])
+        self.assertEqual(len(mock_grader.batch.call_args.args[0]), 3)
+
+    @patch("app.services.workflow.settings.GRADER_MODE", "single_call")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.batch_retrieval_grader")
+    def test_grades_documents_single_call(self, mock_batch_grader, mock_grader):
+        mock_batch_grader.invoke.return_value = MagicMock(
+            binary_scores=["No", "Yes"])
+        docs = [Document(page_content="Unrelated"),
+                Document(page_content="Income tax is a tax levied...")]
+        state = {"question": "What is income tax?", "documents": docs}
+
+        result = grade_documents(state)
+        self.assertEqual(result["documents"], [docs[1]])
+        self.assertEqual(result["web_search"], "No")
+        mock_grader.batch.assert_not_called()
+
+    @patch("app.services.workflow.settings.GRADER_MODE", "single_call")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.batch_retrieval_grader")
+    def test_single_call_count_mismatch_falls_back(self, mock_batch_grader,
+                                                   mock_grader):
+        mock_batch_grader.invoke.return_value = MagicMock(binary_scores=["Yes"])
+        mock_grader.batch.return_value = [MagicMock(binary_score="No"),
+                                          MagicMock(binary_score="No")]
+        docs = [Document(page_content="A"), Document(page_content="B")]
+        state = {"question": "What is income tax?", "documents": docs}
+
+        result = grade_documents(state)
+        self.assertEqual(result["documents"], [])
+        self.assertEqual(result["web_search"], "Yes")
+
+    @patch("app.services.workflow.settings.GRADER_MODE", "local")
+    @patch("app.services.workflow.retrieval_grader")
+    def test_local_grader_defers_only_uncertain(self, mock_grader):
+        mock_grader.batch.return_value = [MagicMock(binary_score="Yes")]
+        docs = [
+            Document(page_content="Section 80CCD(1B) allows an extra NPS"
+                     " deduction.", metadata={"relevance_score": 0.9}),
+            Document(page_content="Form 16 is issued by the employer.",
+                     metadata={"relevance_score": 0.1}),
+            Document(page_content="Deductions for NPS contributions.",
+                     metadata={"relevance_score": 0.6}),
+        ]
+        state = {"question": "NPS deduction under Section 80CCD(1B)",
+                 "documents": docs}
+
+        result = grade_documents(state)
+        self.assertEqual(result["documents"], [docs[0], docs[2]])
+        self.assertEqual(mock_grader.batch.call_args.args[0],
+                         [{"question": state["question"],
+                           "document": docs[2].page_content}])
+
+    @patch("app.services.workflow.settings.GRADER_MODE", "local")
+    @patch("app.services.workflow.retrieval_grader")
+    def test_local_grader_skips_llm_when_certain(self, mock_grader):
+        docs = [Document(page_content="ITR-2 is for capital gains.",
+                         metadata={"relevance_score": 0.85})]
+        state = {"question": "Who should file ITR-2?", "documents": docs}
+
+        result = grade_documents(state)
+        self.assertEqual(result["documents"], docs)
+        mock_grader.batch.assert_not_called()
+
+
+class TestLocalGrader(unittest.TestCase):
+
+    def test_identifiers_are_kept_whole(self):
+        self.assertTrue({"80ccd(1b)", "80ccd", "1b", "itr-2"}
+                        <= terms("Section 80CCD(1B) and ITR-2"))
+
+    def test_overlap_alone_without_dense_score(self):
+        grader = LocalGrader(accept=0.6, reject=0.35)
+        docs = [Document(page_content="Rule 114 covers PAN allotment."),
+                Document(page_content="Unrelated text.")]
+
+        scores = grader.scores("PAN under Rule 114", docs)
+        self.assertAlmostEqual(scores[0], 1.0)
+        self.assertEqual(grader.verdicts("PAN under Rule 114", docs),
+                         ["Yes", "No"])
+
+    def test_thresholds_must_be_ordered(self):
+        with self.assertRaises(ValueError):
+            LocalGrader(accept=0.3, reject=0.5)
+
+
 class TestTransformQuery(unittest.TestCase):
 
+    def setUp(self):
+        workflow.rewrite_cache.clear()
+
     @patch("app.services.workflow.question_rewriter")
     def test_successful_rewrite(self, mock_rewriter):
         mock_rewriter.invoke.return_value = "What is the tax rate for freelancers in India?"
@@ -166,42 +403,197 @@ class TestTransformQuery(unittest.TestCase):
         self.assertEqual(result["documents"], state["documents"])
 
 
+    @patch("app.services.workflow.question_rewriter")
+    def test_rewrites_are_memoised(self, mock_rewriter):
+        mock_rewriter.invoke.return_value = "What is the 80C limit?"
+
+        transform_query({"question": "80C limit", "documents": []})
+        result = transform_query({"question": "  80c LIMIT?", "documents": []})
+
+        self.assertEqual(result["question"], "What is the 80C limit?")
+        mock_rewriter.invoke.assert_called_once()
+
+
+class TestRewriteAndSearch(unittest.TestCase):
+
+    def setUp(self):
+        workflow.rewrite_cache.clear()
+
+    def rewriter(self, latency):
+        def rewrite(inputs):
+            time.sleep(latency)
+            return "rewritten"
+        return patch("app.services.workflow.question_rewriter",
+                     MagicMock(invoke=MagicMock(side_effect=rewrite)))
+
+    def test_raw_search_wins_over_slow_rewrite(self):
+        tool = StandInSearchTool({"raw": [{"content": "Raw result"}]})
+        with self.rewriter(0.3), patch("app.services.workflow.web_searcher",
+                                       WebSearcher(tool)):
+            started = time.monotonic()
+            result = rewrite_and_search({"question": "raw", "documents": []})
+
+        self.assertLess(time.monotonic() - started, 0.25)
+        self.assertEqual(result["documents"][0].page_content, "Raw result")
+        self.assertEqual(result["question"], "raw")
+
+    def test_rewritten_search_used_when_raw_finds_nothing(self):
+        tool = StandInSearchTool({"rewritten": [{"content": "Better"}]})
+        with self.rewriter(0.01), patch("app.services.workflow.web_searcher",
+                                        WebSearcher(tool)):
+            result = rewrite_and_search({"question": "raw", "documents": []})
+
+        self.assertEqual(result["documents"][0].page_content, "Better")
+        self.assertEqual(result["question"], "rewritten")
+
+    def test_cached_rewrite_is_searched_directly(self):
+        workflow.rewrite_cache.set("raw", "rewritten")
+        tool = StandInSearchTool({"rewritten": [{"content": "Better"}]})
+        with self.rewriter(0), patch("app.services.workflow.web_searcher",
+                                     WebSearcher(tool)):
+            result = rewrite_and_search({"question": "Raw?", "documents": []})
+            workflow.question_rewriter.invoke.assert_not_called()
+
+        self.assertEqual(tool.queries, ["rewritten"])
+        self.assertEqual(result["question"], "rewritten")
+
+    def test_async_race(self):
+        tool = StandInSearchTool({"raw": [{"content": "Raw result"}]})
+        rewriter = MagicMock(ainvoke=AsyncMock(return_value="rewritten"))
+        with patch("app.services.workflow.question_rewriter", rewriter), \
+                patch("app.services.workflow.web_searcher", WebSearcher(tool)):
+            result = asyncio.run(arewrite_and_search({"question": "raw",
+                                                      "documents": []}))
+
+        self.assertEqual(result["documents"][0].page_content, "Raw result")
+
+    def test_race_graph_replaces_rewrite_and_search_nodes(self):
+        graph = build_workflow(rewrite_mode="race").compile()
+        nodes = set(graph.get_graph().nodes)
+
+        self.assertIn("rewrite_and_search", nodes)
+        self.assertNotIn("transform_query", nodes)
+
+
+class StandInSearchTool:
+    """Local search tool answering from a dict, with optional latency."""
+
+    def __init__(self, results=None, latency=0.0, error=None):
+        self.results = results or {}
+        self.latency = latency
+        self.error = error
+        self.queries = []
+
+    def invoke(self, inputs):
+        self.queries.append(inputs["query"])
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return self.results.get(inputs["query"], [])
+
+    async def ainvoke(self, inputs):
+        self.queries.append(inputs["query"])
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return self.results.get(inputs["query"], [])
+
+
 class TestWebSearch(unittest.TestCase):
 
-    @patch("app.services.workflow.web_search_tool")
-    def test_successful_web_search(self, mock_search_tool):
-        # Mocking the web search tool's response
-        mock_search_tool.invoke.return_value = [
+    def searcher(self, tool, **kwargs):
+        return patch("app.services.workflow.web_searcher",
+                     WebSearcher(tool, **kwargs))
+
+    def test_successful_web_search(self):
+        tool = StandInSearchTool({"taxation on freelancers": [
             {"content": "Document 1 content."},
             {"content": "Document 2 content."}
-        ]
+        ]})
         state = {
             "question": "taxation on freelancers",
             "documents": [Document(page_content="Some tax info")]
         }
 
-        result = web_search(state)
-        
+        with self.searcher(tool):
+            result = web_search(state)
+
         self.assertEqual(len(result["documents"]), 1)
         self.assertIn("Document 1 content.", result["documents"][0].page_content)
         self.assertIn("Document 2 content.", result["documents"][0].page_content)
         self.assertEqual(result["question"], "taxation on freelancers")
 
-    @patch("app.services.workflow.web_search_tool")
-    def test_web_search_exception(self, mock_search_tool):
+    def test_web_search_exception(self):
         # Simulating an exception during the web search
-        mock_search_tool.invoke.side_effect = Exception("Web search failed")
+        tool = StandInSearchTool(error=Exception("Web search failed"))
         state = {
             "question": "taxation on freelancers",
             "documents": [Document(page_content="Some tax info")]
         }
 
-        result = web_search(state)
-        
+        with self.searcher(tool):
+            result = web_search(state)
+
         # Verifying the returned documents are empty
         self.assertEqual(len(result["documents"]), 0)
         self.assertEqual(result["question"], "taxation on freelancers")
 
+    def test_results_are_cached_per_query(self):
+        tool = StandInSearchTool({"GST rates?": [{"content": "GST is 18%"}]})
+        searcher = WebSearcher(tool)
+
+        searcher.search(["GST rates?"])
+        results = searcher.search(["gst  rates"])
+
+        self.assertEqual(results, [{"content": "GST is 18%"}])
+        self.assertEqual(tool.queries, ["GST rates?"])
+        self.assertEqual(searcher.stats()["hits"], 1)
+
+    def test_expired_results_are_fetched_again(self):
+        tool = StandInSearchTool({"gst rates": [{"content": "GST is 18%"}]})
+        searcher = WebSearcher(tool, ttl=0)
+
+        searcher.search(["gst rates"])
+        time.sleep(0.01)
+        searcher.search(["gst rates"])
+
+        self.assertEqual(len(tool.queries), 2)
+
+    @patch("app.services.workflow.settings.WEB_SEARCH_ORIGINAL_QUERY", True)
+    def test_original_and_rewritten_queries_are_merged(self):
+        tool = StandInSearchTool({
+            "rewritten": [{"url": "a", "content": "A"},
+                          {"url": "b", "content": "B"}],
+            "original": [{"url": "b", "content": "B"},
+                         {"url": "c", "content": "C"}],
+        })
+        state = {"question": "rewritten", "original_question": "original",
+                 "documents": []}
+
+        with self.searcher(tool):
+            result = web_search(state)
+
+        self.assertEqual(result["documents"][0].page_content, "A\nB\nC")
+        self.assertCountEqual(tool.queries, ["rewritten", "original"])
+
+    def test_slow_query_is_dropped_at_the_budget(self):
+        slow = StandInSearchTool({"q": [{"content": "late"}]}, latency=0.5)
+        searcher = WebSearcher(slow, timeout=0.05)
+        searcher.cache.set("cached", [{"content": "cached"}])
+
+        started = time.monotonic()
+        results = searcher.search(["cached", "q"])
+
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(results, [{"content": "cached"}])
+        self.assertEqual(searcher.stats()["timeouts"], 1)
+
+    def test_async_budget_without_results_fails(self):
+        searcher = WebSearcher(StandInSearchTool(latency=0.5), timeout=0.05)
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(searcher.asearch(["q"]))
+
 
 class TestGenerateResponse(unittest.TestCase):
 
@@ -264,11 +656,13 @@ class TestDecideToGenerate(unittest.TestCase):
         result = decide_to_generate(state)
         self.assertEqual(result, "generate_response")
 
+from app.services import workflow
 from app.services.workflow import tax_app
 
 class TestTaxAppWorkflow(unittest.TestCase):
-    @patch("app.services.workflow.requests.post")
-    @patch("app.services.workflow.web_search_tool")
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.web_searcher",
+           WebSearcher(StandInSearchTool()))
     @patch("app.services.workflow.query_classifier")
     @patch("app.services.workflow.retrieval_grader")
     @patch("app.services.workflow.rag_chain")
@@ -277,21 +671,16 @@ class TestTaxAppWorkflow(unittest.TestCase):
         mock_rag_chain,
         mock_retrieval_grader,
         mock_query_classifier,
-        mock_web_search_tool,
-        mock_post
+        mock_vector_db
     ):
         # Mock classifier
         mock_query_classifier.invoke.return_value = MagicMock(binary_score="related")
         # Mock vector search
-        mock_post.return_value.json.return_value = {"document": "Tax info"}
-        mock_post.return_value.raise_for_status.return_value = None
+        mock_vector_db.query.return_value = {"document": "Tax info"}
         # Mock document grader
-        mock_retrieval_grader.invoke.return_value = MagicMock(binary_score="Yes")
+        mock_retrieval_grader.batch.return_value = [MagicMock(binary_score="Yes")]
         # Mock RAG chain
         mock_rag_chain.invoke.return_value = "Tax response"
-        # Mock web search (not needed for relevant documents)
-        mock_web_search_tool.invoke.return_value = []
-
         state = {"question": "What is income tax in India?"}
         result = tax_app.invoke(state)
 
@@ -301,6 +690,867 @@ class TestTaxAppWorkflow(unittest.TestCase):
         self.assertEqual(len(result["documents"]), 1)
         self.assertEqual(result["documents"][0].page_content, "Tax info")
 
+
+class TestAsyncWorkflow(unittest.IsolatedAsyncioTestCase):
+
+    @patch("app.services.workflow.query_classifier")
+    async def test_aclassify_user_query(self, mock_classifier):
+        mock_classifier.ainvoke = AsyncMock(
+            return_value=MagicMock(binary_score="related"))
+
+        state = {"question": "How can I file income tax in India?"}
+        result = await aclassify_user_query(state)
+
+        self.assertEqual(result["query_type"], "related")
+        mock_classifier.invoke.assert_not_called()
+
+    async def test_aretrieve(self):
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"document": "Test content"}))
+        client = VectorDBClient("http://vector-db", async_transport=transport)
+
+        with patch("app.services.workflow.vector_db_client", client):
+            result = await aretrieve({"question": "What is income tax?"})
+
+        self.assertEqual(result["documents"][0].page_content, "Test content")
+        self.assertEqual(result["question"], "What is income tax?")
+
+    async def test_aretrieve_failure(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(500))
+        client = VectorDBClient("http://vector-db", async_transport=transport,
+                                max_retries=0)
+
+        with patch("app.services.workflow.vector_db_client", client):
+            result = await aretrieve({"question": "What is GST?"})
+
+        self.assertTrue(result["generation"].startswith("Error:"))
+
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.rag_chain")
+    async def test_full_workflow_astream(
+        self,
+        mock_rag_chain,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.ainvoke = AsyncMock(
+            return_value=MagicMock(binary_score="related"))
+        mock_vector_db.aquery = AsyncMock(return_value={"document": "Tax info"})
+        mock_retrieval_grader.abatch = AsyncMock(
+            return_value=[MagicMock(binary_score="Yes")])
+        mock_rag_chain.ainvoke = AsyncMock(return_value="Tax response")
+
+        nodes = []
+        async for output in tax_app.astream({"question": "What is income tax?"}):
+            nodes.extend(output)
+
+        self.assertEqual(nodes, ["classify_user_query", "retrieve",
+                                 "grade_documents", "generate_response"])
+        self.assertEqual(output["generate_response"]["generation"], "Tax response")
+        mock_rag_chain.invoke.assert_not_called()
+
+
+class FlakyChatModel(GenericFakeChatModel):
+    """Fake chat model that is rate limited on its first `failures` calls."""
+
+    failures: int = 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise openai.RateLimitError(
+                "rate limited", body=None, response=httpx.Response(
+                    429, request=httpx.Request(
+                        "POST", "https://api.openai.com/v1/chat/completions")))
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("t_seconds", "Test.", ["node"],
+                                      buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, node="retrieve")
+
+        lines = histogram.render()
+        self.assertIn('t_seconds_bucket{node="retrieve",le="0.1"} 1', lines)
+        self.assertIn('t_seconds_bucket{node="retrieve",le="1.0"} 3', lines)
+        self.assertIn('t_seconds_bucket{node="retrieve",le="+Inf"} 4', lines)
+        self.assertIn('t_seconds_count{node="retrieve"} 4', lines)
+
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.rag_chain")
+    def test_nodes_and_branches_are_recorded(
+        self,
+        mock_rag_chain,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.invoke.return_value = MagicMock(binary_score="related")
+        mock_vector_db.query.return_value = {"document": "Tax info"}
+        mock_retrieval_grader.batch.return_value = [MagicMock(binary_score="Yes")]
+        mock_rag_chain.invoke.return_value = "Tax response"
+        retrieves = metrics.NODE_SECONDS.count(node="retrieve")
+        direct = metrics.BRANCHES.value(decision="decide_to_generate",
+                                        branch="generate_response")
+
+        tax_app.invoke({"question": "What is income tax in India?"})
+
+        self.assertEqual(metrics.NODE_SECONDS.count(node="retrieve"),
+                         retrieves + 1)
+        self.assertEqual(metrics.BRANCHES.value(decision="decide_to_generate",
+                                                branch="generate_response"),
+                         direct + 1)
+
+    def test_llm_tokens_are_attributed_to_the_node(self):
+        handler = metrics.LLMMetrics()
+        before = metrics.LLM_TOKENS.value(node="generate_response",
+                                          type="completion")
+        run_id = uuid.uuid4()
+
+        handler.on_chat_model_start({}, [[]], run_id=run_id, metadata={
+            "langgraph_node": "generate_response"})
+        handler.on_llm_end(LLMResult(generations=[[ChatGeneration(
+            message=AIMessage(content="Rs 1.5 lakh", usage_metadata={
+                "input_tokens": 120, "output_tokens": 7,
+                "total_tokens": 127}))]]), run_id=run_id)
+
+        self.assertEqual(metrics.LLM_TOKENS.value(node="generate_response",
+                                                  type="completion"),
+                         before + 7)
+
+    def test_with_retry_tags_the_runs_of_retried_attempts(self):
+        # LLMMetrics counts retries from these tags; langchain-core's
+        # RunnableRetry does not call `on_retry` itself.
+        starts = []
+        attempts = []
+
+        class Recorder(BaseCallbackHandler):
+            def on_chain_start(self, serialized, inputs, *, tags=None,
+                               **kwargs):
+                starts.append([tag for tag in tags or ()
+                               if tag.startswith(metrics.RETRY_TAG)])
+
+        def flaky(question):
+            attempts.append(question)
+            if len(attempts) < 3:
+                raise ValueError("transient")
+            return question
+
+        RunnableLambda(flaky).with_retry(
+            wait_exponential_jitter=False, stop_after_attempt=3).invoke(
+                "Limit?", {"callbacks": [Recorder()]})
+
+        self.assertEqual(starts, [[], [], ["retry:attempt:2"],
+                                  ["retry:attempt:3"]])
+
+    @patch.object(workflow.settings, "LLM_RETRY_BACKOFF", 0.0)
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    def test_llm_retries_are_counted_per_node(
+        self,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.invoke.return_value = MagicMock(binary_score="related")
+        mock_vector_db.query.return_value = {"document": "Tax info"}
+        mock_retrieval_grader.batch.return_value = [MagicMock(binary_score="Yes")]
+        model = FlakyChatModel(messages=iter(["Rs 1.5 lakh"]),
+                               callbacks=[metrics.llm_metrics])
+        node = "generate_response"
+        retries = metrics.RETRIES.value(service="llm", node=node)
+        errors = metrics.LLM_ERRORS.value(node=node)
+        calls = metrics.LLM_SECONDS.count(node=node, model="unknown")
+
+        with patch.object(workflow, "rag_chain", workflow.rag_prompt
+                          | workflow._retrying(model) | StrOutputParser()):
+            result = tax_app.invoke({"question": "What is the 80C limit?"})
+
+        self.assertEqual(result["generation"], "Rs 1.5 lakh")
+        self.assertEqual(metrics.RETRIES.value(service="llm", node=node),
+                         retries + 1)
+        self.assertEqual(metrics.LLM_ERRORS.value(node=node), errors + 1)
+        self.assertEqual(metrics.LLM_SECONDS.count(node=node, model="unknown"),
+                         calls + 1)
+
+    @patch.object(workflow.settings, "LLM_RETRY_BACKOFF", 0.0)
+    def test_llm_retries_stop_after_max_retries(self):
+        model = FlakyChatModel(messages=iter(["unused"]), failures=5)
+        chain = workflow._retrying(model | StrOutputParser())
+        retries = metrics.RETRIES.value(service="llm", node="none")
+
+        with patch.object(workflow.settings, "LLM_MAX_RETRIES", 2):
+            with self.assertRaises(openai.RateLimitError):
+                asyncio.run(chain.ainvoke("Limit?"))
+
+        self.assertEqual(model.failures, 2)
+        self.assertEqual(metrics.RETRIES.value(service="llm", node="none"),
+                         retries + 2)
+
+    @patch("app.services.workflow.answer_cache", None)
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.rag_chain")
+    def test_server_timing_header_and_metrics_endpoint(
+        self,
+        mock_rag_chain,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        mock_query_classifier.ainvoke = AsyncMock(
+            return_value=MagicMock(binary_score="related"))
+        mock_vector_db.aquery = AsyncMock(return_value={"document": "Tax info"})
+        mock_retrieval_grader.abatch = AsyncMock(
+            return_value=[MagicMock(binary_score="Yes")])
+        mock_rag_chain.ainvoke = AsyncMock(return_value="Tax response")
+
+        with patch.object(workflow.settings, "SERVER_TIMING", True):
+            response = TestClient(app).post(
+                "/response", json={"question": "What is income tax?"})
+        exported = TestClient(app).get("/metrics").text
+
+        self.assertEqual(response.json(), {"generation": "Tax response"})
+        timing = response.headers["Server-Timing"]
+        for name in ("classify_user_query", "retrieve", "grade_documents",
+                     "generate_response", "total"):
+            self.assertIn(f"{name};dur=", timing)
+        self.assertIn('taxgpt_http_request_seconds_count{method="POST",'
+                      'path="/response",status="200"}', exported)
+
+
+class TestLazy(unittest.TestCase):
+
+    def test_builds_once_on_first_use(self):
+        built = []
+        component = Lazy(lambda: built.append(1) or "tax", "component")
+
+        self.assertFalse(component.built)
+        self.assertEqual(component.upper(), "TAX")
+        self.assertEqual(component.title(), "Tax")
+        self.assertEqual(len(built), 1)
+
+    def test_dunder_lookups_do_not_build(self):
+        component = Lazy(lambda: self.fail("built"), "component")
+
+        self.assertFalse(hasattr(component, "__deepcopy__"))
+        self.assertIn("not built", repr(component))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_execution(self):
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "Rs 1.5 lakh"
+
+        results = await asyncio.gather(*(flight.run("80c", work)
+                                         for _ in range(5)))
+
+        self.assertEqual(results, ["Rs 1.5 lakh"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()["coalesced"], 4)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    async def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            *(flight.run("gst", work) for _ in range(3)),
+            return_exceptions=True)
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    async def test_finished_calls_are_not_reused(self):
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(await flight.run("tds", work), 1)
+        self.assertEqual(await flight.run("tds", work), 2)
+
+    async def test_cancelled_caller_leaves_the_run_to_others(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.ensure_future(flight.run("itr", work))
+        follower = asyncio.ensure_future(flight.run("itr", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, "done")
+
+    async def test_duplicate_requests_run_the_graph_once(self):
+        from app.models.input_model import InputModel
+        from app.routes.response import get_response
+
+        async def answer(question):
+            await asyncio.sleep(0.01)
+            return "31 July"
+
+        arun = AsyncMock(side_effect=answer)
+        with patch.object(workflow, "arun_tax_app", arun), \
+                patch.object(workflow, "response_flight", SingleFlight()):
+            responses = await asyncio.gather(
+                *(get_response(InputModel(question=question)) for question in
+                  ["ITR due date?", "itr due date", "ITR  due date"]))
+
+        self.assertEqual(responses, [{"generation": "31 July"}] * 3)
+        arun.assert_awaited_once()
+
+
+class KeywordEmbeddings:
+    """Embeds text as a bag of known keywords so similarity is predictable."""
+    vocabulary = ["80c", "limit", "deduction", "slab", "rates", "ipl"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(word in text) for word in self.vocabulary]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+
+    async def test_admits_up_to_the_limit_then_queues(self):
+        admission = AdmissionController(max_in_flight=2, max_queue=2,
+                                        queue_timeout=1)
+        await admission.acquire()
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+
+        self.assertEqual(admission.stats()["waiting"], 1)
+        admission.release()
+        await waiter
+        self.assertEqual(admission.in_flight, 2)
+        self.assertEqual(admission.waiting, 0)
+
+    async def test_full_queue_is_rejected_with_429(self):
+        admission = AdmissionController(max_in_flight=1, max_queue=1,
+                                        queue_timeout=1)
+        await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+
+        with self.assertRaises(Overloaded) as rejected:
+            await admission.acquire()
+        self.assertEqual(rejected.exception.status_code, 429)
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        waiter.cancel()
+
+    async def test_expired_wait_is_rejected_with_503(self):
+        admission = AdmissionController(max_in_flight=1, max_queue=4,
+                                        queue_timeout=0.01)
+        await admission.acquire()
+
+        with self.assertRaises(Overloaded) as rejected:
+            await admission.acquire()
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertEqual(admission.waiting, 0)
+
+    async def test_slots_are_handed_over_in_arrival_order(self):
+        admission = AdmissionController(max_in_flight=1, max_queue=4,
+                                        queue_timeout=1)
+        order = []
+
+        async def run(name):
+            async with admission.slot():
+                order.append(name)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(run(name) for name in "abcd"))
+
+        self.assertEqual(order, list("abcd"))
+        self.assertEqual(admission.in_flight, 0)
+
+    async def test_cancelled_waiter_does_not_leak_its_slot(self):
+        admission = AdmissionController(max_in_flight=1, max_queue=4,
+                                        queue_timeout=1)
+        await admission.acquire()
+        cancelled = asyncio.ensure_future(admission.acquire())
+        second = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+        admission.release()
+        await second
+        admission.release()
+        self.assertEqual(admission.in_flight, 0)
+
+    async def test_stream_slot_is_released_when_body_is_never_sent(self):
+        from app.models.input_model import InputModel
+        from app.routes.response import stream_response
+
+        admission = AdmissionController(max_in_flight=1, max_queue=0)
+        with patch.object(workflow, "admission", admission):
+            response = await stream_response(
+                InputModel(question="What is income tax?"))
+        self.assertEqual(admission.in_flight, 1)
+
+        await response.background()
+        await response.background()
+
+        self.assertEqual(admission.in_flight, 0)
+
+    def test_streamed_response_releases_its_slot_once(self):
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        async def events(question):
+            yield {"event": "end", "generation": "Tax response",
+                   "cached": False}
+
+        admission = AdmissionController(max_in_flight=1, max_queue=0)
+        with patch.object(workflow, "admission", admission), \
+                patch("app.routes.response.astream_tax_app", events):
+            response = TestClient(app).post(
+                "/response/stream", json={"question": "What is income tax?"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Tax response", response.text)
+        self.assertEqual(admission.in_flight, 0)
+
+    def test_overloaded_response_carries_retry_after(self):
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        full = AdmissionController(max_in_flight=1, max_queue=0)
+        full.in_flight = 1
+        with patch.object(workflow, "admission", full), \
+                patch.object(workflow, "answer_cache", None):
+            response = TestClient(app).post(
+                "/response", json={"question": "What is income tax?"})
+            stream = TestClient(app).post(
+                "/response/stream", json={"question": "What is income tax?"})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(stream.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_paced_at_the_rate(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+
+        self.assertTrue(bucket.acquire(blocking=False))
+        self.assertTrue(bucket.acquire(blocking=False))
+        self.assertFalse(bucket.acquire(blocking=False))
+        now[0] = 0.5
+        self.assertTrue(bucket.acquire(blocking=False))
+        self.assertFalse(bucket.acquire(blocking=False))
+
+    def test_waiting_callers_reserve_successive_tokens(self):
+        bucket = TokenBucket(rate=10, burst=1, clock=lambda: 0.0)
+
+        waits = [bucket._reserve(blocking=True) for _ in range(3)]
+
+        self.assertEqual(waits, [0.0, 0.1, 0.2])
+
+    def test_throttled_client_takes_a_token_per_call(self):
+        bucket = MagicMock(aacquire=AsyncMock())
+        client = Throttled(KeywordEmbeddings(), bucket,
+                           ("embed_query", "aembed_query"))
+
+        client.embed_query("80c limit")
+        asyncio.run(client.aembed_query("slab rates"))
+
+        bucket.acquire.assert_called_once()
+        bucket.aacquire.assert_awaited_once()
+        self.assertEqual(client.vocabulary, KeywordEmbeddings.vocabulary)
+
+
+class TestAnswerCache(unittest.TestCase):
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question("  What is  the 80C LIMIT? "),
+                         "what is the 80c limit")
+
+    def test_exact_hit_after_normalisation(self):
+        cache = AnswerCache(InMemoryBackend())
+        self.assertIsNone(cache.lookup("What is the 80C limit?"))
+        cache.store("What is the 80C limit?", "Rs 1.5 lakh")
+
+        self.assertEqual(cache.lookup("what is the 80c limit"), "Rs 1.5 lakh")
+        self.assertEqual(cache.stats()["exact_hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_semantic_hit_reuses_lookup_embedding(self):
+        embeddings = KeywordEmbeddings()
+        cache = AnswerCache(InMemoryBackend(), embeddings=embeddings,
+                            similarity_threshold=0.9)
+        self.assertIsNone(cache.lookup("80C deduction limit"))
+        cache.store("80C deduction limit", "Rs 1.5 lakh")
+        self.assertEqual(embeddings.calls, 1)
+
+        self.assertEqual(cache.lookup("limit of deduction under 80C"),
+                         "Rs 1.5 lakh")
+        self.assertIsNone(cache.lookup("IPL slab rates"))
+        self.assertEqual(cache.stats()["semantic_hits"], 1)
+
+    def test_semantic_hit_needs_the_same_years_and_sections(self):
+        cache = AnswerCache(InMemoryBackend(), embeddings=KeywordEmbeddings(),
+                            similarity_threshold=0.9)
+        cache.store("80C limit for AY 2023-24", "Rs 1.5 lakh")
+        cache.store("Deduction limit under 80CCD(1)", "10% of salary")
+
+        self.assertIsNone(cache.lookup("80C limit for AY 2024-25"))
+        self.assertIsNone(cache.lookup("Deduction limit under 80CCD(1B)?"))
+        self.assertEqual(cache.lookup("limit of 80C, AY 2023-24"),
+                         "Rs 1.5 lakh")
+        self.assertEqual(references("Section 80CCD(1B) for AY 2024-25?"),
+                         {"80ccd(1b)", "2024-25"})
+
+    def test_semantic_matching_is_off_by_default(self):
+        with patch.object(workflow.settings, "ANSWER_CACHE_BACKEND",
+                          "memory"):
+            cache = build_answer_cache(KeywordEmbeddings())
+
+        self.assertFalse(cache.semantic)
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = AnswerCache(InMemoryBackend(ttl=10, clock=lambda: now[0]))
+        cache.store("ITR due date", "31 July")
+        now[0] = 11.0
+        self.assertIsNone(cache.lookup("ITR due date"))
+
+    def test_lru_eviction(self):
+        cache = AnswerCache(InMemoryBackend(max_entries=2))
+        cache.store("a", "1")
+        cache.store("b", "2")
+        cache.lookup("a")
+        cache.store("c", "3")
+
+        self.assertEqual(cache.lookup("a"), "1")
+        self.assertIsNone(cache.lookup("b"))
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "answers.sqlite3")
+            cache = AnswerCache(SQLiteBackend(path, max_entries=2),
+                                embeddings=KeywordEmbeddings(),
+                                similarity_threshold=0.9)
+            cache.store("80C deduction limit", "Rs 1.5 lakh")
+            cache.store("IPL winner", "Not tax related")
+            cache.lookup("80C deduction limit")
+            cache.store("slab rates", "5%, 10%, ...")
+
+            reopened = AnswerCache(SQLiteBackend(path),
+                                   embeddings=KeywordEmbeddings(),
+                                   similarity_threshold=0.9)
+            self.assertEqual(reopened.lookup("limit of 80C deduction"),
+                             "Rs 1.5 lakh")
+            self.assertIsNone(reopened.lookup("IPL winner"))
+
+
+class TestRunTaxApp(unittest.IsolatedAsyncioTestCase):
+
+    @patch("app.services.workflow.tax_app")
+    @patch("app.services.workflow.answer_cache",
+           AnswerCache(InMemoryBackend()))
+    async def test_cache_hit_skips_graph(self, mock_tax_app):
+        workflow.answer_cache.store("What is the 80C limit?", "Rs 1.5 lakh")
+
+        self.assertEqual(await workflow.arun_tax_app("what is the 80c limit"),
+                         "Rs 1.5 lakh")
+        mock_tax_app.astream.assert_not_called()
+
+    @patch("app.services.workflow.tax_app")
+    @patch("app.services.workflow.answer_cache",
+           AnswerCache(InMemoryBackend()))
+    async def test_errors_are_not_cached(self, mock_tax_app):
+        async def astream(state):
+            yield {"generate_response": {"generation": "Error: try later"}}
+        mock_tax_app.astream = astream
+
+        await workflow.arun_tax_app("What is the 80C limit?")
+        self.assertEqual(workflow.answer_cache.stats()["size"], 0)
+
+    @patch("app.services.workflow.answer_cache", None)
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.rag_chain",
+           workflow.rag_prompt | GenericFakeChatModel(
+               messages=iter([AIMessage(content="Rs 1.5 lakh")]))
+           | StrOutputParser())
+    async def test_stream_emits_nodes_then_tokens(
+        self,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.ainvoke = AsyncMock(
+            return_value=MagicMock(binary_score="related"))
+        mock_vector_db.aquery = AsyncMock(return_value={"document": "Tax info"})
+        mock_retrieval_grader.abatch = AsyncMock(
+            return_value=[MagicMock(binary_score="Yes")])
+
+        events = [event async for event in
+                  workflow.astream_tax_app("What is the 80C limit?")]
+
+        nodes = [e["node"] for e in events if e["event"] == "node"]
+        tokens = [e["data"] for e in events if e["event"] == "token"]
+        self.assertEqual(nodes, ["classify_user_query", "retrieve",
+                                 "grade_documents", "generate_response"])
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "Rs 1.5 lakh")
+        self.assertEqual(events[-1], {"event": "end",
+                                      "generation": "Rs 1.5 lakh",
+                                      "cached": False})
+
+    @patch("app.services.workflow.tax_app")
+    @patch("app.services.workflow.answer_cache",
+           AnswerCache(InMemoryBackend()))
+    async def test_stream_cache_hit(self, mock_tax_app):
+        workflow.answer_cache.store("ITR due date", "31 July")
+
+        events = [event async for event in
+                  workflow.astream_tax_app("ITR due date?")]
+
+        self.assertEqual(events, [
+            {"event": "token", "data": "31 July"},
+            {"event": "end", "generation": "31 July", "cached": True}])
+        mock_tax_app.astream.assert_not_called()
+
+
+class TestSpeculativeWorkflow(unittest.TestCase):
+
+    def setUp(self):
+        self.app = workflow.build_workflow(speculative=True).compile()
+
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.rag_chain")
+    def test_related_query_uses_speculative_documents(
+        self,
+        mock_rag_chain,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.invoke.return_value = MagicMock(binary_score="related")
+        mock_vector_db.query.return_value = {"document": "Tax info"}
+        mock_retrieval_grader.batch.return_value = [MagicMock(binary_score="Yes")]
+        mock_rag_chain.invoke.return_value = "Tax response"
+
+        result = self.app.invoke(workflow.initial_state("What is income tax?"))
+
+        self.assertEqual(result["generation"], "Tax response")
+        self.assertEqual(result["documents"][0].page_content, "Tax info")
+        mock_vector_db.query.assert_called_once()
+
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.out_of_scope_generation")
+    def test_notrelated_query_drops_documents(
+        self,
+        mock_out_of_scope,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.invoke.return_value = MagicMock(binary_score="notrelated")
+        mock_vector_db.query.return_value = {"document": "Tax info"}
+        mock_out_of_scope.invoke.return_value = "Tax questions only"
+
+        result = self.app.invoke(workflow.initial_state("Who won the IPL?"))
+
+        self.assertEqual(result["generation"], "Tax questions only")
+        self.assertEqual(result["documents"], [])
+        mock_retrieval_grader.batch.assert_not_called()
+
+    @patch("app.services.workflow.vector_db_client")
+    @patch("app.services.workflow.query_classifier")
+    @patch("app.services.workflow.retrieval_grader")
+    @patch("app.services.workflow.question_rewriter")
+    @patch("app.services.workflow.web_searcher", WebSearcher(
+        StandInSearchTool({"What is income tax?": [{"content": "Web info"}]})))
+    @patch("app.services.workflow.rag_chain")
+    def test_failed_speculative_retrieval(
+        self,
+        mock_rag_chain,
+        mock_question_rewriter,
+        mock_retrieval_grader,
+        mock_query_classifier,
+        mock_vector_db
+    ):
+        mock_query_classifier.invoke.return_value = MagicMock(binary_score="related")
+        mock_vector_db.query.side_effect = Exception("API down")
+        mock_retrieval_grader.batch.return_value = []
+        mock_question_rewriter.invoke.return_value = "What is income tax?"
+        mock_rag_chain.invoke.return_value = "Tax response"
+
+        result = self.app.invoke(workflow.initial_state("What is income tax?"))
+
+        self.assertEqual(result["web_search"], "Yes")
+        self.assertEqual(result["documents"][0].page_content, "Web info")
+        self.assertEqual(result["generation"], "Tax response")
+
+
+class TestVectorDBClient(unittest.TestCase):
+
+    def make_client(self, handler, **kwargs):
+        kwargs.setdefault("backoff", 0)
+        return VectorDBClient("http://vector-db",
+                              transport=httpx.MockTransport(handler), **kwargs)
+
+    def test_sends_question_as_json(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"document": "Tax info"})
+
+        client = self.make_client(handler)
+        self.assertEqual(client.query("What is GST?"), {"document": "Tax info"})
+        self.assertEqual(requests[0].url.path, "/vector")
+        self.assertEqual(requests[0].read(), b'{"question":"What is GST?"}')
+
+    def test_retries_server_errors(self):
+        responses = iter([httpx.Response(503), httpx.Response(502),
+                          httpx.Response(200, json={"document": "Tax info"})])
+        client = self.make_client(lambda request: next(responses), max_retries=2)
+
+        self.assertEqual(client.query("What is GST?"), {"document": "Tax info"})
+
+    def test_retries_are_counted_for_the_node(self):
+        responses = iter([httpx.Response(503),
+                          httpx.Response(200, json={"document": "Tax info"})])
+        client = self.make_client(lambda request: next(responses))
+        retries = metrics.RETRIES.value(service="vector_db", node="retrieve")
+
+        metrics.timed_node("retrieve",
+                           lambda state: client.query("What is GST?"))({})
+
+        self.assertEqual(metrics.RETRIES.value(service="vector_db",
+                                               node="retrieve"), retries + 1)
+
+    def test_client_errors_are_not_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(422)
+
+        client = self.make_client(handler, max_retries=2)
+        with self.assertRaises(httpx.HTTPStatusError):
+            client.query("What is GST?")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_breaker_opens_and_recovers(self):
+        now = [0.0]
+        healthy = [False]
+
+        def handler(request):
+            if healthy[0]:
+                return httpx.Response(200, json={"document": "Tax info"})
+            raise httpx.ConnectError("refused", request=request)
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10,
+                                 clock=lambda: now[0])
+        client = self.make_client(handler, max_retries=0, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(httpx.ConnectError):
+                client.query("What is GST?")
+        with self.assertRaises(CircuitOpenError):
+            client.query("What is GST?")
+
+        now[0] = 11.0
+        healthy[0] = True
+        self.assertEqual(client.query("What is GST?"), {"document": "Tax info"})
+        self.assertEqual(breaker.state, "closed")
+
+
+class CountingEmbeddings:
+    """Deterministic embeddings model that records what it was asked."""
+    model = "models/fake"
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts, task_type=None):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+class TestCachedEmbeddings(unittest.TestCase):
+
+    def test_only_misses_reach_the_model(self):
+        model = CountingEmbeddings()
+        embeddings = CachedEmbeddings(model)
+        embeddings.embed_documents(["80C", "80D"])
+        vectors = embeddings.embed_documents(["80D", "80C ", "80CCD(1B)"])
+
+        self.assertEqual(model.batches, [["80C", "80D"], ["80CCD(1B)"]])
+        self.assertEqual(vectors, [[3.0, 1.0], [3.0, 1.0], [9.0, 1.0]])
+        self.assertEqual(embeddings.stats()["memory_hits"], 2)
+        self.assertEqual(embeddings.stats()["misses"], 3)
+
+    def test_queries_and_documents_are_cached_separately(self):
+        model = CountingEmbeddings()
+        embeddings = CachedEmbeddings(model)
+        embeddings.embed_documents(["ITR-2"])
+        embeddings.embed_query("ITR-2")
+        embeddings.embed_query("ITR-2")
+
+        self.assertEqual(len(model.batches), 2)
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.sqlite3")
+            CachedEmbeddings(CountingEmbeddings(),
+                             sqlite_path=path).embed_query("Rule 114")
+
+            model = CountingEmbeddings()
+            embeddings = CachedEmbeddings(model, sqlite_path=path)
+            self.assertEqual(embeddings.embed_query("Rule 114"), [8.0, 1.0])
+            self.assertEqual(model.batches, [])
+            self.assertEqual(embeddings.stats()["disk_hits"], 1)
+
 if __name__ == "__main__":
     logging.disable(logging.CRITICAL)  # to suppress logging output in test results
     unittest.main()
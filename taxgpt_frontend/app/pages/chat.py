@@ -1,25 +1,58 @@
+import json
 import requests
 import streamlit as st
 
+BACKEND_URL = "http://3.109.157.165:8000"
 
-def get_response(input_text):
+# Status shown once each workflow node finishes on the backend
+NODE_PROGRESS = {
+    "classify_user_query": "Understood your question",
+    "retrieve": "Searched the tax knowledge base",
+    "join_speculation": "Searched the tax knowledge base",
+    "grade_documents": "Checked the relevance of the results",
+    "transform_query": "Rewrote the question for web search",
+    "web_search_node": "Searched the web",
+    "rewrite_and_search": "Searched the web",
+    "generate_response": "Answer ready",
+}
+
+
+def stream_response(input_text, status):
+    """Yield answer tokens from the streaming endpoint as they arrive.
+
+    The status ends as "complete", or as "error" when the request fails,
+    the stream stops before its "end" event, or the backend answers with an
+    error message.
+    """
+    failed = True
     try:
-        response = requests.post(
-            "http://3.109.157.165:8000/response",
-
-            json={"question": input_text}
-        )
-        response.raise_for_status()
-        response_data = response.json()
-        print("API response:", response_data)
-        return {"generation": response_data.get
-                ("generation", "No answer received.")}
+        with requests.post(
+            f"{BACKEND_URL}/response/stream",
+            json={"question": input_text},
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "node":
+                    status.update(label=NODE_PROGRESS.get(
+                        event["node"], "Fetching your answer..."))
+                elif event["event"] == "token":
+                    yield event["data"]
+                elif event["event"] == "end":
+                    failed = event["generation"].startswith("Error:")
     except requests.exceptions.HTTPError as e:
-        return {"generation": f"HTTP Error: {str(e)}"}
+        yield f"HTTP Error: {str(e)}"
     except requests.exceptions.RequestException as e:
-        return {"generation": f"Error: Unable to fetch the response. {str(e)}"}
+        yield f"Error: Unable to fetch the response. {str(e)}"
     except ValueError as e:
-        return {"generation": f"Error: Invalid response format. {str(e)}"}
+        yield f"Error: Invalid response format. {str(e)}"
+    if failed:
+        status.update(label="Could not answer your question", state="error")
+    else:
+        status.update(label="Answer ready", state="complete")
 
 # Set up Streamlit UI
 
@@ -55,7 +88,6 @@ query = st.text_input(
 
 # Submit buttonz
 if st.button("Get Answer") and query:
-    with st.spinner("Fetching your answer..."):
-        response = get_response(query)
-        answer = response.get("generation", "Sorry, no answer available.")
-    st.markdown(f"### Answer:\n{answer}")
+    status = st.status("Understanding your question...")
+    st.markdown("### Answer:")
+    st.write_stream(stream_response(query, status))
@@ -7,5 +7,50 @@ class Settings:
     TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+    # Query embedding cache; the SQLite tier is off unless a path is set.
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+    MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "256"))
+    # Splitting of documents upserted through the admin API.
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # The admin routes require this value in X-Admin-Token, and are
+    # refused (403) while it is unset.
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    # Seconds between checks of vector_store for a new index; 0 disables.
+    INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "5"))
+    # "pickle" loads index.pkl into each worker. "mmap" (SQLite docstore)
+    # and "columnar" (chunk store) memory-map the store so workers share it.
+    STORE_FORMAT = os.getenv("STORE_FORMAT", "pickle")
+    # FAISS factory string used by the ingest CLI, e.g. "IVF256,Flat",
+    # "HNSW32" or "IVF256,PQ64"; unset keeps the exact flat index.
+    INDEX_FACTORY = os.getenv("INDEX_FACTORY")
+    INDEX_TRAIN_SIZE = (int(os.getenv("INDEX_TRAIN_SIZE"))
+                        if os.getenv("INDEX_TRAIN_SIZE") else None)
+    # Query-time accuracy/speed knobs for IVF and HNSW indexes.
+    NPROBE = int(os.getenv("NPROBE")) if os.getenv("NPROBE") else None
+    EF_SEARCH = int(os.getenv("EF_SEARCH")) if os.getenv("EF_SEARCH") else None
+    # Threads searching the shards of a sharded store; defaults to one per
+    # shard.
+    SHARD_SEARCH_WORKERS = (int(os.getenv("SHARD_SEARCH_WORKERS"))
+                            if os.getenv("SHARD_SEARCH_WORKERS") else None)
+    # Comma-separated shard service URLs. When set, this process is a
+    # scatter-gather coordinator and serves no store of its own.
+    SHARD_URLS = [url for url in os.getenv("SHARD_URLS", "").split(",") if url]
+    SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "5"))
+    # Load the stores and build the embeddings client at startup; when
+    # false each is loaded on its first use.
+    PREWARM = os.getenv("PREWARM", "true").lower() == "true"
+    # Concurrent /vector requests for the same question and mode share one
+    # search.
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+    # Add a Server-Timing header with per-stage durations to responses.
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+    # Default /vector mode: "dense", or "hybrid" to fuse BM25 and dense
+    # rankings with reciprocal rank fusion.
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+    # Candidates taken from each ranking before fusion, and the RRF constant.
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
 
 settings = Settings()
\ No newline at end of file
@@ -1,18 +1,57 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from .core.config import settings
 from .routes.response  import router
+from .routes import admin
+from .services import metrics, storage
 import uvicorn
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.PREWARM:
+        await asyncio.to_thread(storage.prewarm)
+    storage.start_watching()
+    yield
+    storage.stop_watching()
+    if storage.coordinator is not None:
+        await storage.coordinator.aclose()
+
+
 app = FastAPI(
     title="Vector database api",
     version="1.0",
-    description="API for tax-related question answering"
+    description="API for tax-related question answering",
+    lifespan=lifespan
 )
 
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Time each request and, if enabled, report search stage timings."""
+    timings = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(
+        elapsed, method=request.method,
+        path=route.path if route else "unmatched",
+        status=response.status_code)
+    if settings.SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics.server_timing(timings,
+                                                                  elapsed)
+    return response
+
+
 # Include routes
 app.include_router(router)
+if storage.coordinator is None:
+    app.include_router(admin.router)
 
@@ -0,0 +1,34 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class AdminDocument(BaseModel):
+    source: str
+    text: str
+    metadata: dict = {}
+
+
+class UpsertModel(BaseModel):
+    documents: List[AdminDocument] = Field(min_length=1)
+
+
+class DeleteModel(BaseModel):
+    sources: List[str] = Field(min_length=1)
+
+
+class ChangeModel(BaseModel):
+    added: int
+    removed: int
+    total: int
+
+
+class IndexStatsModel(BaseModel):
+    shard: str
+    generation: int
+    loaded_at: float
+    index_type: str
+    store_format: str
+    vectors: int
+    reloads: int
+    reload_failures: int
+    last_reload_seconds: Optional[float]
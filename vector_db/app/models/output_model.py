@@ -1,4 +1,17 @@
+from typing import List, Optional
 from pydantic import BaseModel
 
 class OutputModel(BaseModel):
     generation: str
+
+
+class Hit(BaseModel):
+    page_content: str
+    metadata: dict
+    # Dense relevance score; None for a hybrid hit found only by BM25.
+    score: Optional[float]
+    fused_score: Optional[float] = None
+
+
+class BatchOutputModel(BaseModel):
+    results: List[List[Hit]]
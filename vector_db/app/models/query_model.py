@@ -1,4 +1,23 @@
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+from ..core.config import settings
 
 class QueryModel(BaseModel):
-    question: str
\ No newline at end of file
+    question: str
+    mode: Literal["dense", "hybrid"] = settings.RETRIEVAL_MODE
+
+
+class BatchQueryModel(BaseModel):
+    questions: List[str] = Field(min_length=1,
+                                 max_length=settings.MAX_BATCH_QUESTIONS)
+    k: int = Field(default=4, ge=1, le=100)
+    score_threshold: Optional[float] = 0.5
+    # Query embeddings computed by a coordinator, one per question.
+    vectors: Optional[List[List[float]]] = None
+    mode: Literal["dense", "hybrid"] = settings.RETRIEVAL_MODE
+
+    @model_validator(mode="after")
+    def check_vectors(self):
+        if self.vectors is not None and len(self.vectors) != len(self.questions):
+            raise ValueError("vectors must have one entry per question")
+        return self
@@ -0,0 +1,46 @@
+import hmac
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from starlette.concurrency import run_in_threadpool
+from ..core.config import settings
+from ..services import storage
+from ..models.admin_model import (UpsertModel, DeleteModel, ChangeModel,
+                                  IndexStatsModel)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """Require X-Admin-Token to match ADMIN_TOKEN; refuse all if it is unset."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403,
+                            detail="Admin API disabled; set ADMIN_TOKEN")
+    if x_admin_token is None or not hmac.compare_digest(
+            x_admin_token.encode("utf-8"),
+            settings.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+@router.post("/documents", response_model=ChangeModel)
+async def upsert_documents(body: UpsertModel):
+    documents = [document.model_dump() for document in body.documents]
+    return await run_in_threadpool(storage.upsert_documents, documents)
+
+
+@router.post("/documents/delete", response_model=ChangeModel)
+async def delete_documents(body: DeleteModel):
+    return await run_in_threadpool(storage.delete_sources, body.sources)
+
+
+@router.post("/reload", response_model=List[IndexStatsModel])
+async def reload_index():
+    try:
+        return await run_in_threadpool(storage.reload)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=f"Reload failed: {e}")
+
+
+@router.get("/index", response_model=List[IndexStatsModel])
+async def index_stats():
+    return storage.stats()
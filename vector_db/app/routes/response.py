@@ -1,11 +1,50 @@
 from fastapi import APIRouter
-from ..services.storage import retriever
-from ..models.query_model import QueryModel
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from ..core.config import settings
+from ..services import storage
+from ..services.embedding_cache import normalize_text
+from ..services.metrics import COALESCED, registry
+from ..services.single_flight import SingleFlight
+from ..models.query_model import QueryModel, BatchQueryModel
+from ..models.output_model import BatchOutputModel
 
 router = APIRouter()
+vector_flight = (SingleFlight(counter=COALESCED)
+                 if settings.COALESCE_REQUESTS else None)
+
+
+async def search(questions, k=4, score_threshold=0.5, vectors=None,
+                 mode="dense"):
+    """Search the local shards, or every remote shard on a coordinator."""
+    if storage.coordinator is not None:
+        return await storage.coordinator.search(questions, k, score_threshold,
+                                                vectors, mode)
+    return await run_in_threadpool(storage.batch_search, questions, k,
+                                   score_threshold, vectors, mode)
 
 
 @router.post("/vector")
 async def get_data(query: QueryModel):
-    documents = retriever.get_relevant_documents(query.question)
-    return {"document": documents}
+    # Identical questions arriving together share one search.
+    if vector_flight is None:
+        results = await search([query.question], mode=query.mode)
+    else:
+        results = await vector_flight.run(
+            (normalize_text(query.question), query.mode),
+            lambda: search([query.question], mode=query.mode))
+    return {"document": results[0]}
+
+
+@router.post("/vector/batch", response_model=BatchOutputModel)
+async def get_batch_data(query: BatchQueryModel):
+    results = await search(query.questions, query.k, query.score_threshold,
+                           query.vectors, query.mode)
+    return {"results": results}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request and search stage metrics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(),
+                             media_type="text/plain; version=0.0.4")
@@ -0,0 +1,121 @@
+"""Approximate nearest-neighbour index types for the FAISS store.
+
+Stores are always built with an exact flat index first; `convert_store`
+then trains an index described by a FAISS factory string (for example
+"IVF256,Flat", "HNSW32" or "IVF256,PQ64") on the stored vectors and
+re-adds them in the same order, so the store's position -> docstore id
+mapping stays valid.
+
+A converted store keeps the original vectors in an exact flat index
+(`EXACT_INDEX_FILE`), so later conversions are trained on them rather than
+on a quantised index's approximations, whose error would compound.
+"""
+import faiss
+import numpy as np
+
+EXACT_INDEX_FILE = "vectors.faiss"
+
+
+def is_flat(index):
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def reconstruct_all(index):
+    """Return every stored vector, in insertion order, as a float32 matrix.
+
+    Product-quantised indexes return their approximations of the vectors.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_index(vectors, factory, train_size=None):
+    """Create, train and fill an index from a FAISS factory string.
+
+    Args:
+        vectors (np.ndarray): float32 matrix of vectors to add.
+        factory (str): FAISS index factory string.
+        train_size (int | None): Train on a random sample of this many
+            vectors instead of all of them.
+    """
+    index = faiss.index_factory(vectors.shape[1], factory)
+    if not index.is_trained:
+        sample = vectors
+        if train_size is not None and train_size < len(vectors):
+            rows = np.random.default_rng(0).choice(len(vectors), train_size,
+                                                   replace=False)
+            sample = vectors[rows]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def matches_factory(index, factory):
+    """Whether `index` is of the type `factory` builds."""
+    return describe(index) == describe(faiss.index_factory(index.d, factory))
+
+
+def convert_store(vector_store, factory, train_size=None):
+    """Replace the store's flat index with one built from `factory`."""
+    if not is_flat(vector_store.index):
+        raise ValueError("convert_store needs the exact vectors; got a "
+                         f"{describe(vector_store.index)}")
+    vectors = reconstruct_all(vector_store.index)
+    vector_store.index = build_index(vectors, factory, train_size)
+    return vector_store
+
+
+def remove_vectors(vector_store, ids):
+    """Delete docstore ids from a store whose index is not flat.
+
+    IVF indexes keep the labels of the remaining vectors when entries are
+    removed and HNSW cannot remove entries at all, so the positional
+    mapping LangChain relies on is kept by re-adding the retained vectors
+    to an emptied copy of the trained index.
+    """
+    ids = set(ids)
+    vectors = reconstruct_all(vector_store.index)
+    keep = [position for position, docstore_id
+            in sorted(vector_store.index_to_docstore_id.items())
+            if docstore_id not in ids]
+    index = faiss.clone_index(vector_store.index)
+    index.reset()
+    if keep:
+        index.add(vectors[keep])
+    vector_store.index_to_docstore_id = {
+        new: vector_store.index_to_docstore_id[old]
+        for new, old in enumerate(keep)}
+    vector_store.docstore.delete(list(ids))
+    vector_store.index = index
+    return vector_store
+
+
+def hnsw_of(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Set the query-time knobs that apply to this index type.
+
+    Args:
+        nprobe (int | None): Inverted lists visited per query (IVF).
+        ef_search (int | None): Candidate list size per query (HNSW).
+    """
+    params = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and hasattr(hnsw_of(index), "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+
+def describe(index):
+    """Short human-readable description of an index, for logs and stats."""
+    return type(faiss.downcast_index(index)).__name__
@@ -0,0 +1,195 @@
+"""BM25 inverted index over the chunks of a FAISS store.
+
+Dense embeddings blur exact identifiers such as "Section 80CCD(1B)",
+"ITR-2" or "Rule 114". This index scores the same chunks lexically, keyed
+by FAISS position, so its hits can be fused with the dense ones.
+
+Postings are held in CSR form in a few flat arrays, memory-mapped when
+loaded:
+
+    bm25.indptr.npy      int64[terms + 1]; postings of term t are
+                         [indptr[t], indptr[t + 1])
+    bm25.positions.npy   int32[postings]; FAISS position of each posting
+    bm25.tfs.npy         float32[postings]; term frequency of each posting
+    bm25.lengths.npy     float32[max position + 1]; tokens per chunk
+    bm25.json            term -> term number, and the BM25 parameters
+
+Add the index to an existing store in place, from the `vector_db`
+directory:
+
+    python -m app.services.bm25 vector_store
+"""
+import argparse
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+BM25_FILES = ["bm25.indptr.npy", "bm25.positions.npy", "bm25.tfs.npy",
+              "bm25.lengths.npy", "bm25.json"]
+
+# A word, optionally followed by parenthesised parts and joined to more
+# words by "-", "/" or "." - so 80ccd(1b), itr-2, 10(23c) and u/s stay whole.
+_PART = r"[a-z0-9]+(?:\([a-z0-9]+\))*"
+TOKEN_RE = re.compile(rf"{_PART}(?:[-/.]{_PART})*")
+PIECE_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or "
+    "that the this to under was what when where which who will with".split())
+
+
+def tokenize(text):
+    """Lowercased terms of `text`.
+
+    A compound token such as "80ccd(1b)" is kept whole and also split into
+    its pieces ("80ccd", "1b"), so an exact match ranks highest while a
+    query for "80CCD" still finds it.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        pieces = PIECE_RE.findall(token)
+        if len(pieces) > 1:
+            terms.append(token)
+        terms.extend(piece for piece in pieces if piece not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over chunks keyed by FAISS position.
+
+    Args:
+        terms (dict): Term -> term number, the row of its postings.
+        indptr, positions, tfs, lengths (np.ndarray): See the module docstring.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalisation.
+    """
+
+    def __init__(self, terms, indptr, positions, tfs, lengths, k1=1.2, b=0.75):
+        self.terms = terms
+        self.indptr = indptr
+        self.positions = positions
+        self.tfs = tfs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.count = int(np.count_nonzero(lengths))
+        self.average_length = (float(lengths.sum()) / self.count
+                               if self.count else 0.0)
+
+    @classmethod
+    def build(cls, texts, k1=1.2, b=0.75):
+        """Index `texts`, a dict of FAISS position -> chunk text."""
+        postings = {}
+        size = max(texts, default=-1) + 1
+        lengths = np.zeros(size, dtype=np.float32)
+        for position, text in texts.items():
+            counts = Counter(tokenize(text))
+            lengths[position] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((position, tf))
+
+        terms = {term: number
+                 for number, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[term]) for term in terms])
+        positions = np.empty(indptr[-1], dtype=np.int32)
+        tfs = np.empty(indptr[-1], dtype=np.float32)
+        for term, number in terms.items():
+            rows = sorted(postings[term])
+            start, end = indptr[number], indptr[number + 1]
+            positions[start:end] = [position for position, _ in rows]
+            tfs[start:end] = [tf for _, tf in rows]
+        return cls(terms, indptr, positions, tfs, lengths, k1, b)
+
+    @classmethod
+    def from_store(cls, vector_store):
+        texts = {}
+        for position, doc_id in vector_store.index_to_docstore_id.items():
+            texts[int(position)] = vector_store.docstore.search(
+                doc_id).page_content
+        return cls.build(texts)
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map the index saved in `directory`, or None if absent."""
+        if not os.path.exists(os.path.join(directory, BM25_FILES[-1])):
+            return None
+        with open(os.path.join(directory, "bm25.json"),
+                  encoding="utf-8") as f:
+            table = json.load(f)
+        arrays = [np.load(os.path.join(directory, name), mmap_mode="r")
+                  for name in BM25_FILES[:-1]]
+        return cls(table["terms"], *arrays, k1=table["k1"], b=table["b"])
+
+    def write(self, directory):
+        for name, array in zip(BM25_FILES, [self.indptr, self.positions,
+                                            self.tfs, self.lengths]):
+            np.save(os.path.join(directory, name), array)
+        with open(os.path.join(directory, "bm25.json"), "w",
+                  encoding="utf-8") as f:
+            json.dump({"terms": self.terms, "k1": self.k1, "b": self.b}, f)
+
+    def scores(self, query):
+        """BM25 score of every position for `query`."""
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            number = self.terms.get(term)
+            if number is None:
+                continue
+            start, end = self.indptr[number], self.indptr[number + 1]
+            positions = self.positions[start:end]
+            tfs = self.tfs[start:end]
+            df = end - start
+            idf = np.log(1 + (self.count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[positions]
+                              / self.average_length)
+            scores[positions] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, queries, k):
+        """Top-k positions per query, as FAISS-style (scores, positions).
+
+        Rows are padded with position -1 when fewer than k chunks match.
+        """
+        k = min(k, len(self.lengths))
+        if k == 0:
+            return (np.zeros((len(queries), 0), dtype=np.float32),
+                    np.zeros((len(queries), 0), dtype=np.int64))
+        found = np.zeros((len(queries), k), dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, query in enumerate(queries):
+            scores = self.scores(query)
+            matched = np.flatnonzero(scores)
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = matched[np.argsort(-scores[matched], kind="stable")]
+            found[row, :len(top)] = scores[top]
+            ids[row, :len(top)] = top
+        return found, ids
+
+
+def write_bm25(vector_store, directory):
+    BM25Index.from_store(vector_store).write(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the BM25 index next to a saved store.")
+    parser.add_argument("store", help="Directory of the saved store.")
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import FakeEmbeddings
+    from .store_io import load_store, replace_files
+
+    vector_store = load_store(args.store, FakeEmbeddings(size=1))
+    replace_files(args.store, BM25_FILES,
+                  lambda staging: write_bm25(vector_store, staging))
+    print(f"Indexed {len(vector_store.index_to_docstore_id)} chunks for BM25 "
+          f"in {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Size-bounded mapping with optional per-entry TTL and LRU eviction.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used one
+            is evicted.
+        ttl (float | None): Seconds an entry stays valid, or None to keep
+            entries until they are evicted.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at):
+        return self.ttl is not None and self._clock() - created_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, created_at = entry
+            if self._expired(created_at):
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def items(self):
+        """Return the live (key, value) pairs, dropping expired ones."""
+        with self._lock:
+            for key in [key for key, (_, created_at) in self._data.items()
+                        if self._expired(created_at)]:
+                del self._data[key]
+            return [(key, value) for key, (value, _) in self._data.items()]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,184 @@
+"""Compact columnar chunk store, an alternative to the pickled docstore.
+
+Chunks are stored by FAISS position in a handful of flat files:
+
+    chunks.text          all chunk texts as one UTF-8 blob
+    chunks.offsets.npy   int64[n + 1]; chunk i is text[offsets[i]:offsets[i + 1]]
+    chunks.ids.npy       fixed-width bytes[n]; docstore id of chunk i
+    chunks.codes.npy     int32[n, columns]; per-column index into the
+                         distinct values in chunks.json, -1 when missing
+    chunks.json          metadata column names and their distinct values
+
+Everything but chunks.json is memory-mapped, nothing is un-pickled, and a
+`Document` is built only when a hit is returned.
+
+Convert an existing store in place, from the `vector_db` directory:
+
+    python -m app.services.chunk_store vector_store
+"""
+import argparse
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+CHUNK_FILES = ["chunks.text", "chunks.offsets.npy", "chunks.ids.npy",
+               "chunks.codes.npy", "chunks.json"]
+
+
+def write_chunk_store(vector_store, directory):
+    """Write the store's chunks in columnar form to `directory`."""
+    positions = sorted(vector_store.index_to_docstore_id)
+    if positions != list(range(len(positions))):
+        raise ValueError("FAISS positions must be contiguous from 0")
+    ids, texts, metadatas = [], [], []
+    for position in positions:
+        doc_id = vector_store.index_to_docstore_id[position]
+        doc = vector_store.docstore.search(doc_id)
+        ids.append(doc_id.encode("utf-8"))
+        texts.append(doc.page_content.encode("utf-8"))
+        metadatas.append(doc.metadata)
+
+    columns = sorted({key for metadata in metadatas for key in metadata})
+    values = {column: [] for column in columns}
+    lookup = {column: {} for column in columns}
+    codes = np.full((len(positions), len(columns)), -1, dtype=np.int32)
+    for row, metadata in enumerate(metadatas):
+        for col, column in enumerate(columns):
+            if column not in metadata:
+                continue
+            key = json.dumps(metadata[column], sort_keys=True)
+            if key not in lookup[column]:
+                lookup[column][key] = len(values[column])
+                values[column].append(metadata[column])
+            codes[row, col] = lookup[column][key]
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in texts])
+    with open(os.path.join(directory, "chunks.text"), "wb") as f:
+        for text in texts:
+            f.write(text)
+    np.save(os.path.join(directory, "chunks.offsets.npy"), offsets)
+    np.save(os.path.join(directory, "chunks.ids.npy"),
+            np.array(ids, dtype=f"S{max(map(len, ids), default=1)}"))
+    np.save(os.path.join(directory, "chunks.codes.npy"), codes)
+    with open(os.path.join(directory, "chunks.json"), "w",
+              encoding="utf-8") as f:
+        json.dump({"columns": columns,
+                   "values": [values[column] for column in columns]}, f)
+
+
+def _map_bytes(path):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class ChunkId(str):
+    """A docstore id that remembers the FAISS position it was read from."""
+
+    def __new__(cls, value, position):
+        chunk_id = super().__new__(cls, value)
+        chunk_id.position = position
+        return chunk_id
+
+
+class ChunkStore(Docstore):
+    """Read-only chunk store over the memory-mapped columnar files.
+
+    `document_at(position)` is O(1) by FAISS position. LangChain's FAISS
+    wrapper looks documents up by the id it got from `index_to_docstore_id`;
+    `ChunkIdMap` hands out `ChunkId`s, so that path is O(1) as well. Other
+    ids go through an id -> position map built on first use.
+    """
+
+    def __init__(self, directory):
+        self.text = _map_bytes(os.path.join(directory, "chunks.text"))
+        self.offsets = np.load(os.path.join(directory, "chunks.offsets.npy"),
+                               mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, "chunks.ids.npy"),
+                           mmap_mode="r")
+        self.codes = np.load(os.path.join(directory, "chunks.codes.npy"),
+                             mmap_mode="r")
+        with open(os.path.join(directory, "chunks.json"),
+                  encoding="utf-8") as f:
+            table = json.load(f)
+        self.columns = table["columns"]
+        self.values = table["values"]
+        self._positions = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def id_at(self, position):
+        return self.ids[position].decode("utf-8")
+
+    def document_at(self, position):
+        start, end = self.offsets[position], self.offsets[position + 1]
+        metadata = {column: self.values[col][code]
+                    for col, (column, code) in enumerate(
+                        zip(self.columns, self.codes[position]))
+                    if code >= 0}
+        return Document(id=self.id_at(position),
+                        page_content=bytes(self.text[start:end]).decode("utf-8"),
+                        metadata=metadata)
+
+    def search(self, search):
+        if isinstance(search, ChunkId):
+            return self.document_at(search.position)
+        if self._positions is None:
+            self._positions = {self.id_at(i): i for i in range(len(self))}
+        position = self._positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        return self.document_at(position)
+
+    def to_dict(self):
+        return {self.id_at(i): self.document_at(i) for i in range(len(self))}
+
+
+class ChunkIdMap(Mapping):
+    """FAISS position -> docstore id, read from the ids column."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.chunks):
+            raise KeyError(position)
+        return ChunkId(self.chunks.id_at(position), int(position))
+
+    def __iter__(self):
+        return iter(range(len(self.chunks)))
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def items(self):
+        return [(i, self.chunks.id_at(i)) for i in range(len(self.chunks))]
+
+    def values(self):
+        return [self.chunks.id_at(i) for i in range(len(self.chunks))]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write the columnar chunk store next to a saved store.")
+    parser.add_argument("store", help="Directory of the saved store.")
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import FakeEmbeddings
+    from .store_io import load_store, replace_files
+
+    vector_store = load_store(args.store, FakeEmbeddings(size=1))
+    replace_files(args.store, CHUNK_FILES,
+                  lambda staging: write_chunk_store(vector_store, staging))
+    print(f"Wrote {len(vector_store.index_to_docstore_id)} chunks to "
+          f"{args.store}")
+
+
+if __name__ == "__main__":
+    main()
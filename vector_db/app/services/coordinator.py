@@ -0,0 +1,68 @@
+import asyncio
+import heapq
+import logging
+
+import httpx
+
+from .metrics import timed_stage
+
+
+class ShardCoordinator:
+    """Scatter-gather search over vector-db processes that each serve shards.
+
+    The coordinator embeds the questions once and sends the vectors to
+    every shard's `/vector/batch`, so shards do not each pay for an
+    embeddings call. Hits are merged into one top-k by score. A shard that
+    fails or times out is left out of the answer; the search fails only if
+    every shard does. Hybrid hits are merged by their fused score, which
+    each shard computes over its own rankings.
+
+    Args:
+        urls (list): Base URLs of the shard processes.
+        embeddings (CachedEmbeddings): Embeds questions for all shards.
+        timeout (float): Seconds to wait for each shard.
+        transport (httpx.AsyncBaseTransport | None): Custom transport.
+    """
+
+    def __init__(self, urls, embeddings, timeout=5.0, transport=None):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.embeddings = embeddings
+        self.client = httpx.AsyncClient(
+            timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_connections=20 * len(self.urls)))
+
+    async def _query(self, url, payload):
+        response = await self.client.post(f"{url}/vector/batch", json=payload)
+        response.raise_for_status()
+        return response.json()["results"]
+
+    async def search(self, questions, k=4, score_threshold=0.5,
+                     vectors=None, mode="dense"):
+        if vectors is None:
+            with timed_stage("embed"):
+                vectors = await asyncio.to_thread(
+                    self.embeddings.embed_queries, questions)
+        payload = {"questions": questions, "vectors": vectors, "k": k,
+                   "score_threshold": score_threshold, "mode": mode}
+        with timed_stage("shards"):
+            responses = await asyncio.gather(
+                *(self._query(url, payload) for url in self.urls),
+                return_exceptions=True)
+
+        shard_results = []
+        for url, response in zip(self.urls, responses):
+            if isinstance(response, Exception):
+                logging.error(f"Shard {url} failed: {response!r}")
+            else:
+                shard_results.append(response)
+        if not shard_results:
+            raise RuntimeError("Every shard failed")
+
+        key = "fused_score" if mode == "hybrid" else "score"
+        return [heapq.nlargest(k, (hit for results in shard_results
+                                   for hit in results[row]),
+                               key=lambda hit: hit[key])
+                for row in range(len(questions))]
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,131 @@
+"""SQLite-backed docstore for read-only, memory-mapped serving.
+
+`index.pkl` is un-pickled into every worker's heap. `docstore.sqlite` holds
+the same documents and position -> id mapping in a file that all workers
+read through the shared OS page cache instead.
+
+Convert an existing store in place, from the `vector_db` directory:
+
+    python -m app.services.docstore vector_store
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+
+def write_sqlite_docstore(vector_store, path):
+    """Write the store's documents and id mapping to a new SQLite file."""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE docs (position INTEGER PRIMARY KEY,"
+                " id TEXT NOT NULL UNIQUE, page_content TEXT NOT NULL,"
+                " metadata TEXT NOT NULL)")
+            rows = []
+            for position, doc_id in sorted(
+                    vector_store.index_to_docstore_id.items()):
+                doc = vector_store.docstore.search(doc_id)
+                rows.append((position, doc_id, doc.page_content,
+                             json.dumps(doc.metadata)))
+            conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows)
+    finally:
+        conn.close()
+
+
+class SQLiteDocs:
+    """Read-only connection to a docstore.sqlite file, shared by threads."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True,
+                                     check_same_thread=False)
+
+    def one(self, query, args=()):
+        with self._lock:
+            return self._conn.execute(query, args).fetchone()
+
+    def all(self, query, args=()):
+        with self._lock:
+            return self._conn.execute(query, args).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteDocstore(Docstore):
+    """Looks documents up by docstore id, one row per call."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def search(self, search):
+        row = self.docs.one(
+            "SELECT page_content, metadata FROM docs WHERE id = ?", (search,))
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0],
+                        metadata=json.loads(row[1]))
+
+    def to_dict(self):
+        return {doc_id: Document(id=doc_id, page_content=text,
+                                 metadata=json.loads(metadata))
+                for doc_id, text, metadata in self.docs.all(
+                    "SELECT id, page_content, metadata FROM docs")}
+
+
+class SQLiteIdMap(Mapping):
+    """FAISS position -> docstore id, read from the docs table."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __getitem__(self, position):
+        row = self.docs.one("SELECT id FROM docs WHERE position = ?",
+                            (int(position),))
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __iter__(self):
+        for (position,) in self.docs.all(
+                "SELECT position FROM docs ORDER BY position"):
+            yield position
+
+    def __len__(self):
+        return self.docs.one("SELECT COUNT(*) FROM docs")[0]
+
+    def items(self):
+        return self.docs.all("SELECT position, id FROM docs ORDER BY position")
+
+    def values(self):
+        return [doc_id for _, doc_id in self.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write docstore.sqlite next to a saved FAISS store.")
+    parser.add_argument("store", help="Directory of the saved store.")
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import FakeEmbeddings
+    from .store_io import load_store, replace_files
+
+    vector_store = load_store(args.store, FakeEmbeddings(size=1))
+    replace_files(args.store, [DOCSTORE_FILE],
+                  lambda staging: write_sqlite_docstore(
+                      vector_store, os.path.join(staging, DOCSTORE_FILE)))
+    print(f"Wrote {len(vector_store.index_to_docstore_id)} documents to "
+          f"{os.path.join(args.store, DOCSTORE_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
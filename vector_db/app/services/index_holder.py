@@ -0,0 +1,212 @@
+import logging
+import os
+import threading
+import time
+from functools import cached_property
+
+import faiss
+
+from .ann import configure_search, describe
+from .bm25 import BM25_FILES, BM25Index
+from .chunk_store import CHUNK_FILES
+from .docstore import DOCSTORE_FILE
+from .manifest import MANIFEST_FILE, Manifest
+from .metrics import (INDEX_GENERATION, INDEX_PUBLISHES, INDEX_RELOADS,
+                      INDEX_RELOAD_SECONDS)
+from .store_io import STORE_FILES, load_store
+
+
+class IndexSnapshot:
+    """An immutable view of one loaded index.
+
+    A request reads `IndexHolder.current` once and uses that snapshot
+    throughout, so it finishes on the index it started with even if a new
+    one is swapped in meanwhile.
+    """
+
+    def __init__(self, store, manifest, generation, path):
+        self.store = store
+        self.manifest = manifest
+        self.generation = generation
+        self.path = path
+        self.loaded_at = time.time()
+
+    @cached_property
+    def lexical(self):
+        """The BM25 index, loaded on first hybrid search.
+
+        Stores saved before BM25 was added get one built in memory.
+        """
+        lexical = BM25Index.load(self.path)
+        if lexical is None:
+            logging.info(f"No BM25 index in {self.path}; building one.")
+            lexical = BM25Index.from_store(self.store)
+        return lexical
+
+
+class IndexHolder:
+    """Read-copy-update reference to the index being served.
+
+    Readers take `current` without locking. Writers (reloads and admin
+    updates) build a complete new snapshot off to the side and publish it
+    with a single reference assignment. `write_lock` serialises writers.
+    The store is only loaded on the first read of `current`. Generations,
+    reloads and reload times are exported on /metrics, labelled by `path`.
+
+    Args:
+        path (str): Directory holding the saved store.
+        embeddings (Embeddings): Embeddings used by loaded stores.
+        nprobe (int | None): IVF lists searched per query.
+        ef_search (int | None): HNSW candidate list size per query.
+        store_format (str): How to load the store; see `load_store`.
+    """
+
+    def __init__(self, path, embeddings, nprobe=None, ef_search=None,
+                 store_format="pickle"):
+        if not os.path.exists(path):
+            raise ValueError(f"Vector database not found at {path}")
+        self.path = path
+        self.embeddings = embeddings
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.store_format = store_format
+        self.write_lock = threading.RLock()
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_reload_seconds = None
+        self._stop = threading.Event()
+        self._watcher = None
+        self._signature = self.signature()
+        self._current = None
+
+    @property
+    def current(self):
+        snapshot = self._current
+        if snapshot is None:
+            with self.write_lock:
+                if self._current is None:
+                    store = load_store(self.path, self.embeddings,
+                                       self.store_format)
+                    self.current = self._snapshot(
+                        store, Manifest.load(self.path), generation=1)
+                snapshot = self._current
+        return snapshot
+
+    @current.setter
+    def current(self, snapshot):
+        self._current = snapshot
+        INDEX_GENERATION.set(snapshot.generation, index=self.path)
+
+    def _snapshot(self, store, manifest, generation):
+        # Hits from several shards are merged by raw distance, smallest
+        # first, which only ranks correctly for L2 indexes.
+        if store.index.metric_type != faiss.METRIC_L2:
+            raise ValueError(f"{self.path} has a {describe(store.index)} with "
+                             f"metric {store.index.metric_type}; only L2 "
+                             f"indexes can be served")
+        configure_search(store.index, self.nprobe, self.ef_search)
+        return IndexSnapshot(store, manifest, generation, self.path)
+
+    def _next_generation(self):
+        return (self._current.generation if self._current else 0) + 1
+
+    def signature(self):
+        """Size and mtime of the store files, used to notice new saves."""
+        signature = []
+        names = (STORE_FILES + CHUNK_FILES + BM25_FILES
+                 + [DOCSTORE_FILE, MANIFEST_FILE])
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def publish(self, store, manifest):
+        """Swap in a store the caller has already saved to `path`."""
+        self._signature = self.signature()
+        self.current = self._snapshot(store, manifest,
+                                      self._next_generation())
+        INDEX_PUBLISHES.inc(index=self.path)
+        return self.current
+
+    def reload(self):
+        """Load the store from disk in full and swap it in.
+
+        Returns:
+            IndexSnapshot: The snapshot now being served.
+        """
+        with self.write_lock:
+            started = time.perf_counter()
+            signature = self.signature()
+            try:
+                store = load_store(self.path, self.embeddings,
+                                   self.store_format)
+                if store.index.ntotal != len(store.index_to_docstore_id):
+                    raise ValueError("index and docstore sizes differ; "
+                                     "the store is still being written")
+                manifest = Manifest.load(self.path)
+                snapshot = self._snapshot(store, manifest,
+                                          self._next_generation())
+            except Exception:
+                self.reload_failures += 1
+                INDEX_RELOADS.inc(index=self.path, result="failed")
+                raise
+            self._signature = signature
+            self.current = snapshot
+            self.reloads += 1
+            self.last_reload_seconds = time.perf_counter() - started
+            INDEX_RELOADS.inc(index=self.path, result="ok")
+            INDEX_RELOAD_SECONDS.observe(self.last_reload_seconds,
+                                         index=self.path)
+        logging.info(f"Loaded index generation {self.current.generation} "
+                     f"({store.index.ntotal} vectors) in "
+                     f"{self.last_reload_seconds:.3f}s.")
+        return self.current
+
+    def _watch(self, interval):
+        pending = None
+        while not self._stop.wait(interval):
+            signature = self.signature()
+            if signature == self._signature:
+                pending = None
+                continue
+            # Reload only once the files have stopped changing between two
+            # polls, so a save in progress is not picked up half-written.
+            if signature != pending:
+                pending = signature
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                logging.error(f"Index reload failed: {e}")
+            pending = None
+
+    def start_watching(self, interval):
+        """Poll the store directory and reload it when it changes."""
+        if self._watcher is None and interval > 0:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch,
+                                             args=(interval,), daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def stats(self):
+        snapshot = self.current
+        return {
+            "generation": snapshot.generation,
+            "loaded_at": snapshot.loaded_at,
+            "index_type": describe(snapshot.store.index),
+            "store_format": self.store_format,
+            "vectors": snapshot.store.index.ntotal,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "last_reload_seconds": self.last_reload_seconds,
+        }
@@ -0,0 +1,414 @@
+"""Build the FAISS vector store from a directory of PDFs and text files.
+
+The corpus is streamed: files are read one at a time, split into chunks by
+a generator pipeline, embedded in bounded-size batches on a thread pool and
+added to the index batch by batch, so the raw corpus is never held in
+memory at once.
+
+Runs are incremental. The store's `manifest.json` records the hash of every
+ingested file and the ids of its chunks; unchanged files are skipped, only
+chunks that are not indexed yet are embedded, and chunks of changed or
+deleted files are removed from the index. Pass `--rebuild` to start over;
+it is also needed the first time a store saved without a manifest (such as
+the pre-built `vector_store`) is replaced.
+
+Run from the `vector_db` directory:
+
+    python -m app.services.ingest corpus/ --output vector_store
+    python -m app.services.ingest corpus/ --output /tmp/store --fake-embeddings
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from pypdf import PdfReader
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ..core.config import settings
+from .ann import (convert_store, describe, is_flat, matches_factory,
+                  remove_vectors)
+from .manifest import MANIFEST_FILE, Manifest, file_hash
+from .shards import ShardLayout, shard_path
+from .store_io import (STORE_FILES, STORE_FORMATS, load_exact_index,
+                       load_store, save_store)
+
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".md"}
+
+
+class RateLimiter:
+    """Spaces calls at least `1 / rate` seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class IngestStats:
+    """Counters reported at the end of a run."""
+
+    def __init__(self):
+        self.files = 0
+        self.unchanged_files = 0
+        self.documents = 0
+        self.chunks = 0
+        self.removed_chunks = 0
+        self.started = time.perf_counter()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        seconds = self.seconds
+        return {
+            "files": self.files,
+            "unchanged_files": self.unchanged_files,
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "removed_chunks": self.removed_chunks,
+            "seconds": round(seconds, 3),
+            "docs_per_sec": round(self.documents / seconds, 2) if seconds else 0,
+            "chunks_per_sec": round(self.chunks / seconds, 2) if seconds else 0,
+        }
+
+
+def iter_files(source_dir):
+    """Yield the supported files under `source_dir` in a stable order."""
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(root, name)
+
+
+def load_file(path, source_dir):
+    """Yield one Document per PDF page, or one for a whole text file."""
+    source = os.path.relpath(path, source_dir)
+    if path.lower().endswith(".pdf"):
+        for page, pdf_page in enumerate(PdfReader(path).pages):
+            text = pdf_page.extract_text() or ""
+            if text.strip():
+                yield Document(page_content=text,
+                               metadata={"source": source, "page": page})
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield Document(page_content=f.read(), metadata={"source": source})
+
+
+def iter_changed_chunks(source_dir, manifest, splitter, stats, stale,
+                        select=None):
+    """Yield the chunks of new and changed files that are not indexed yet.
+
+    Files whose hash matches the manifest are skipped, as are sources for
+    which `select(source)` is false. The manifest is updated as files are
+    read, and the ids of chunks that changed or deleted files no longer
+    produce are appended to `stale`.
+    """
+    seen = set()
+    for path in iter_files(source_dir):
+        source = os.path.relpath(path, source_dir)
+        if select is not None and not select(source):
+            continue
+        seen.add(source)
+        stats.files += 1
+        digest = file_hash(path)
+        if manifest.unchanged(source, digest):
+            stats.unchanged_files += 1
+            continue
+        documents = list(load_file(path, source_dir))
+        stats.documents += len(documents)
+        new_chunks, removed = manifest.update(
+            source, digest, splitter.split_documents(documents))
+        stale.extend(removed)
+        for chunk in new_chunks:
+            stats.chunks += 1
+            yield chunk
+    deleted = [source for source in manifest.sources if source not in seen]
+    stale.extend(manifest.remove(deleted))
+
+
+def batched(items, size):
+    """Group an iterable into lists of at most `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(batches, embeddings, workers=4, rate_limiter=None):
+    """Embed batches on a thread pool, yielding (batch, vectors) in order.
+
+    At most `2 * workers` batches are in flight, which bounds memory no
+    matter how large the corpus is.
+    """
+    def embed(batch):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return embeddings.embed_documents([c.page_content for c in batch])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(embed, batch)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+
+def empty_store(embeddings, dimension):
+    """Create an empty FAISS store with an exact L2 index."""
+    return FAISS(embedding_function=embeddings,
+                 index=faiss.IndexFlatL2(dimension),
+                 docstore=InMemoryDocstore(),
+                 index_to_docstore_id={})
+
+
+def build_store(embedded_batches, embeddings, vector_store=None):
+    """Add embedded batches to the store one batch at a time."""
+    for batch, vectors in embedded_batches:
+        if vector_store is None:
+            vector_store = empty_store(embeddings, len(vectors[0]))
+        vector_store.add_embeddings(
+            zip([chunk.page_content for chunk in batch], vectors),
+            metadatas=[chunk.metadata for chunk in batch],
+            ids=[chunk.id for chunk in batch])
+        logging.info(f"Indexed {vector_store.index.ntotal} chunks.")
+    return vector_store
+
+
+def apply_changes(vector_store, embeddings, chunks, stale_ids, batch_size=64,
+                  workers=4, rate_limiter=None):
+    """Embed and add `chunks`, then delete `stale_ids` from the store.
+
+    Returns:
+        FAISS | None: The updated store, or a new one if `vector_store` was
+        None and there was something to add.
+    """
+    embedded = embed_batches(batched(chunks, batch_size), embeddings,
+                             workers=workers, rate_limiter=rate_limiter)
+    vector_store = build_store(embedded, embeddings, vector_store)
+    if vector_store is not None and stale_ids:
+        indexed = set(vector_store.index_to_docstore_id.values())
+        stale_ids = [i for i in stale_ids if i in indexed]
+        if stale_ids and is_flat(vector_store.index):
+            vector_store.delete(stale_ids)
+        elif stale_ids:
+            remove_vectors(vector_store, stale_ids)
+    return vector_store
+
+
+def exact_index(vector_store, directory, embeddings, batch_size=64, workers=4,
+                rate_limiter=None):
+    """Flat index of the original vectors of a converted store.
+
+    Read from the exact copy saved with the store. Stores saved without
+    one (or whose copy an admin update invalidated) have their chunks
+    embedded again, since a quantised index only holds approximations.
+    """
+    exact = load_exact_index(directory)
+    if exact is not None and exact.ntotal == vector_store.index.ntotal:
+        return exact, False
+    logging.warning(f"No exact vectors saved in {directory}; embedding the "
+                    f"{vector_store.index.ntotal} stored chunks again.")
+    exact = faiss.IndexFlatL2(vector_store.index.d)
+    documents = (vector_store.docstore.search(docstore_id) for _, docstore_id
+                 in sorted(vector_store.index_to_docstore_id.items()))
+    for _, vectors in embed_batches(batched(documents, batch_size),
+                                    embeddings, workers=workers,
+                                    rate_limiter=rate_limiter):
+        exact.add(np.asarray(vectors, dtype=np.float32))
+    return exact, True
+
+
+def unmanaged_store(directory):
+    """Whether `directory` holds a store saved without a manifest."""
+    return (os.path.exists(os.path.join(directory, STORE_FILES[0]))
+            and not os.path.exists(os.path.join(directory, MANIFEST_FILE)))
+
+
+def ingest(source_dir, output, embeddings, chunk_size=1000, chunk_overlap=200,
+           batch_size=64, workers=4, requests_per_second=None, rebuild=False,
+           index_factory=None, train_size=None, store_format="pickle",
+           select=None):
+    """Bring the vector store in `output` up to date with `source_dir`.
+
+    New chunks are added to the existing index, whatever its type. With
+    `index_factory`, changes are applied to the store's exact vectors, and
+    the index is rebuilt and retrained as that FAISS index type from them
+    when sources changed or the index is of another type. A run that
+    changes nothing leaves the store untouched. The docstore files needed
+    to serve the store as `store_format` are written as well. `select`
+    restricts the run to the sources it returns true for.
+
+    Returns:
+        dict: Files, documents and chunks processed, with throughput.
+
+    Raises:
+        ValueError: If `output` holds a store without a manifest, whose
+            chunks cannot be matched to source files, and `rebuild` is not
+            set; ingesting would replace its content.
+    """
+    if not rebuild and unmanaged_store(output):
+        raise ValueError(f"{output} holds a store without {MANIFEST_FILE}; "
+                         f"use --rebuild to replace it with {source_dir}")
+    stats = IngestStats()
+    manifest = Manifest() if rebuild else Manifest.load(output)
+    vector_store = load_store(output, embeddings) if manifest.sources else None
+    before = dict(manifest.sources)
+    rate_limiter = RateLimiter(requests_per_second)
+    loaded_index = vector_store.index if vector_store is not None else None
+    reembedded = False
+    if (index_factory and loaded_index is not None
+            and not is_flat(loaded_index)):
+        vector_store.index, reembedded = exact_index(
+            vector_store, output, embeddings, batch_size=batch_size,
+            workers=workers, rate_limiter=rate_limiter)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size,
+                                              chunk_overlap=chunk_overlap)
+    stale = []
+    chunks = iter_changed_chunks(source_dir, manifest, splitter, stats, stale,
+                                 select)
+    vector_store = apply_changes(vector_store, embeddings, chunks, stale,
+                                 batch_size=batch_size, workers=workers,
+                                 rate_limiter=rate_limiter)
+    if vector_store is None:
+        raise ValueError(f"No documents found in {source_dir}")
+    stats.removed_chunks = len(stale)
+
+    changed = manifest.sources != before
+    if index_factory and (changed or reembedded or loaded_index is None
+                          or not matches_factory(loaded_index, index_factory)):
+        exact = vector_store.index
+        convert_store(vector_store, index_factory, train_size)
+        logging.info(f"Built {describe(vector_store.index)} "
+                     f"from '{index_factory}'.")
+        save_store(vector_store, output, manifest, store_format=store_format,
+                   exact_index=exact)
+    elif changed:
+        save_store(vector_store, output, manifest, store_format=store_format)
+    else:
+        logging.info(f"{output} is already up to date.")
+    return stats.report()
+
+
+def ingest_sharded(source_dir, output, embeddings, layout, rebuild=False,
+                   **options):
+    """Ingest `source_dir` into one store per shard under `output`.
+
+    Each shard is an ordinary incremental store restricted to the sources
+    the layout assigns to it. shards.json is written once every shard is
+    saved.
+
+    Returns:
+        dict: The ingest report of each shard.
+    """
+    existing = ShardLayout.load(output)
+    if (existing is not None and not rebuild
+            and not existing.same_partitioning(layout)):
+        raise ValueError(f"{output} is sharded differently; use --rebuild "
+                         f"to re-partition it")
+    names = {layout.shard_for(os.path.relpath(path, source_dir))
+             for path in iter_files(source_dir)}
+    if existing is not None and not rebuild:
+        # Shards whose sources were all deleted still need updating.
+        names |= set(existing.names)
+
+    reports = {}
+    for name in sorted(names):
+        reports[name] = ingest(
+            source_dir, shard_path(output, name), embeddings,
+            rebuild=rebuild,
+            select=lambda source, name=name: layout.shard_for(source) == name,
+            **options)
+    layout.names = sorted(names)
+    layout.dump(output)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the FAISS vector store from a document directory.")
+    parser.add_argument("source", help="Directory of .pdf, .txt and .md files.")
+    parser.add_argument("--output", default="vector_store")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="Chunks sent per embeddings call.")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Embedding calls made in parallel.")
+    parser.add_argument("--requests-per-second", type=float, default=None,
+                        help="Upper bound on embeddings calls per second.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Ignore the existing store and manifest.")
+    parser.add_argument("--index-factory", default=settings.INDEX_FACTORY,
+                        help='FAISS index factory string, e.g. "IVF256,Flat", '
+                             '"HNSW32" or "IVF256,PQ64".')
+    parser.add_argument("--train-size", type=int,
+                        default=settings.INDEX_TRAIN_SIZE,
+                        help="Vectors sampled to train IVF/PQ indexes.")
+    parser.add_argument("--store-format", choices=STORE_FORMATS,
+                        default=settings.STORE_FORMAT,
+                        help="Also write the docstore files this format "
+                             "serves from.")
+    parser.add_argument("--shard-by", choices=["source", "hash"],
+                        help="Write one store per top-level source "
+                             "directory, or per hash bucket.")
+    parser.add_argument("--shards", type=int,
+                        help="Number of shards for --shard-by hash.")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Use deterministic local embeddings (no API).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.fake_embeddings:
+        embeddings = DeterministicFakeEmbedding(size=768)
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model="models/embedding-001",
+            google_api_key=settings.GOOGLE_API_KEY)
+    options = dict(chunk_size=args.chunk_size,
+                   chunk_overlap=args.chunk_overlap,
+                   batch_size=args.batch_size, workers=args.workers,
+                   requests_per_second=args.requests_per_second,
+                   rebuild=args.rebuild, index_factory=args.index_factory,
+                   train_size=args.train_size,
+                   store_format=args.store_format)
+    if args.shard_by:
+        layout = ShardLayout(args.shard_by, args.shards)
+        report = ingest_sharded(args.source, args.output, embeddings, layout,
+                                **options)
+    else:
+        report = ingest(args.source, args.output, embeddings, **options)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
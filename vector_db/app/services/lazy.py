@@ -0,0 +1,76 @@
+"""Deferred construction of clients, chains and the compiled graph.
+
+Module-level components are wrapped in `Lazy` so importing the service
+does not import the provider SDKs or talk to the network. Each component
+is built on first use, or up front by `prewarm` in the FastAPI lifespan.
+"""
+import logging
+import threading
+import time
+
+_registry = []
+
+
+class Lazy:
+    """Stand-in that builds the real object on first use.
+
+    Attribute access is forwarded to the built object, so `lazy.invoke(...)`
+    works wherever the object itself would, and a module attribute holding
+    a Lazy can still be replaced with `unittest.mock.patch`.
+
+    Args:
+        factory (callable): Builds the object; called once.
+        name (str): Name used in logs and by `prewarm`.
+    """
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self._name = name
+        self._value = None
+        self._built = False
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def built(self):
+        return self._built
+
+    def get(self):
+        """The built object, building it if this is the first use."""
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    start = time.perf_counter()
+                    self._value = self._factory()
+                    self._built = True
+                    logging.info(f"Built {self._name} in"
+                                 f" {time.perf_counter() - start:.3f}s.")
+        return self._value
+
+    def __getattr__(self, name):
+        # Dunder lookups (copy, pickle, inspect) must not trigger a build.
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        state = "built" if self._built else "not built"
+        return f"<Lazy {self._name} ({state})>"
+
+
+def prewarm():
+    """Build every registered component now.
+
+    Returns:
+        dict: Seconds spent building each component, by name.
+    """
+    timings = {}
+    for component in list(_registry):
+        start = time.perf_counter()
+        component.get()
+        timings[component.name] = time.perf_counter() - start
+    return timings
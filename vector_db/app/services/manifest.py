@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "manifest.json"
+
+
+def file_hash(path):
+    """SHA-256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(text, metadata=None):
+    """SHA-256 of a document submitted through the admin API."""
+    payload = json.dumps({"text": text, "metadata": metadata or {}},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(source, chunks):
+    """Content-addressed ids for a source's chunks.
+
+    The id hashes the source, the chunk text, its metadata and how many
+    identical chunks came before it in the same source, so unchanged chunks
+    keep their id when the rest of the document is edited, and a chunk
+    whose metadata changed is indexed again.
+    """
+    seen = {}
+    ids = []
+    for chunk in chunks:
+        occurrence = seen.get(chunk.page_content, 0)
+        seen[chunk.page_content] = occurrence + 1
+        metadata = json.dumps(chunk.metadata, sort_keys=True, default=str)
+        payload = "\0".join([source, chunk.page_content, metadata,
+                             str(occurrence)])
+        ids.append(hashlib.sha256(payload.encode("utf-8")).hexdigest())
+    return ids
+
+
+class Manifest:
+    """Records which chunk ids every ingested source produced.
+
+    `sources` maps a source name to {"hash": ..., "chunks": [...]}, where
+    the hash identifies the content the chunks were built from. The chunk
+    ids are the FAISS docstore ids, so stale chunks can be deleted from the
+    index when a source changes or disappears.
+    """
+
+    def __init__(self, sources=None):
+        self.sources = sources or {}
+
+    @classmethod
+    def load(cls, directory):
+        path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["sources"])
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources}, f)
+
+    def unchanged(self, source, digest):
+        entry = self.sources.get(source)
+        return entry is not None and entry["hash"] == digest
+
+    def update(self, source, digest, chunks):
+        """Record a source's new chunks.
+
+        Returns:
+            tuple: The chunks that are not indexed yet, and the ids of the
+            source's previous chunks that are no longer produced.
+        """
+        ids = chunk_ids(source, chunks)
+        for chunk, chunk_id in zip(chunks, ids):
+            chunk.id = chunk_id
+        old = set(self.sources.get(source, {}).get("chunks", []))
+        self.sources[source] = {"hash": digest, "chunks": ids}
+        new_chunks = [chunk for chunk in chunks if chunk.id not in old]
+        return new_chunks, sorted(old - set(ids))
+
+    def remove(self, sources):
+        """Forget sources, returning the ids of their chunks."""
+        stale = []
+        for source in sources:
+            entry = self.sources.pop(source, None)
+            if entry is not None:
+                stale.extend(entry["chunks"])
+        return stale
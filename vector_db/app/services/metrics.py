@@ -0,0 +1,211 @@
+"""In-process Prometheus-style metrics and per-request timings.
+
+Counters, gauges and histograms are kept in memory and rendered in the Prometheus
+text format by GET /metrics. Durations recorded while a request is being
+served are also collected per request, for the Server-Timing header.
+"""
+import contextvars
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", r"\\").replace('"', r"\"")
+               .replace("\n", r"\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class Counter:
+    """Monotonic count per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labels, key)} {_number(value)}"
+                for key, value in values]
+
+
+class Gauge(Counter):
+    """Current value per combination of label values."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * len(self.buckets), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([], 0.0))
+        return sum(counts)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total))
+                            for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _label_text(self.labels, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics exported by this process."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, labels=()):
+        metric = Gauge(name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "vectordb_http_request_seconds", "HTTP request latency.",
+    ["method", "path", "status"])
+STAGE_SECONDS = registry.histogram(
+    "vectordb_stage_seconds", "Time spent in each stage of a search.",
+    ["stage"])
+COALESCED = registry.counter(
+    "vectordb_coalesced_requests_total",
+    "/vector requests that ran a search or shared a search in flight.",
+    ["result"])
+INDEX_GENERATION = registry.gauge(
+    "vectordb_index_generation", "Generation of the index being served.",
+    ["index"])
+INDEX_RELOAD_SECONDS = registry.histogram(
+    "vectordb_index_reload_seconds",
+    "Time to load a store from disk and swap it in.", ["index"])
+INDEX_RELOADS = registry.counter(
+    "vectordb_index_reloads_total",
+    "Reloads of a store from disk, by whether they succeeded.",
+    ["index", "result"])
+INDEX_PUBLISHES = registry.counter(
+    "vectordb_index_publishes_total",
+    "Stores updated by the admin API and swapped in without a reload.",
+    ["index"])
+
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def start_request():
+    """Start collecting timings for the current request."""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+def record_timing(name, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def server_timing(timings, total=None):
+    """Server-Timing header value for the collected timings, in ms."""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+@contextmanager
+def timed_stage(stage):
+    """Record the time spent in the block as a search stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        record_timing(stage, seconds)
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+SHARDS_FILE = "shards.json"
+
+
+class ShardLayout:
+    """How sources are partitioned into shard stores.
+
+    A sharded `vector_store` directory holds one complete store per shard
+    in `shard-<name>` subdirectories, described by `shards.json`.
+
+    Args:
+        shard_by (str): "source" puts each top-level corpus directory
+            (act/, circulars/, faq/, ...) in its own shard; "hash" spreads
+            sources evenly over `shards` shards.
+        shards (int | None): Number of shards for "hash".
+        names (list | None): Shards that exist on disk.
+    """
+
+    def __init__(self, shard_by="source", shards=None, names=None):
+        if shard_by not in ("source", "hash"):
+            raise ValueError(f"Unknown shard_by: {shard_by}")
+        if shard_by == "hash" and not shards:
+            raise ValueError("shard_by='hash' needs the number of shards")
+        self.shard_by = shard_by
+        self.shards = shards
+        self.names = sorted(names or [])
+
+    @classmethod
+    def load(cls, directory):
+        """Return the layout of a sharded store, or None if it is not one."""
+        path = os.path.join(directory, SHARDS_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def dump(self, directory):
+        path = os.path.join(directory, SHARDS_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"shard_by": self.shard_by, "shards": self.shards,
+                       "names": self.names}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def shard_for(self, source):
+        if self.shard_by == "source":
+            head, sep, _ = source.replace(os.sep, "/").partition("/")
+            return head if sep else "default"
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        return f"{int(digest[:8], 16) % self.shards:02d}"
+
+    def same_partitioning(self, other):
+        return (self.shard_by, self.shards) == (other.shard_by, other.shards)
+
+
+def shard_path(directory, name):
+    return os.path.join(directory, f"shard-{name}")
@@ -1,27 +1,333 @@
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from ..core.config import settings
-import os
+from .chunk_store import ChunkStore
+from .coordinator import ShardCoordinator
+from .embedding_cache import CachedEmbeddings
+from .index_holder import IndexHolder
+from .lazy import Lazy, prewarm as build_components
+from .ingest import apply_changes, empty_store
+from .manifest import Manifest, content_hash
+from .metrics import timed_stage
+from .shards import ShardLayout, shard_path
+from .store_io import copy_store, save_store
+import faiss
+import heapq
+import numpy as np
+import threading
 
 
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001",
-                                          google_api_key=settings.GOOGLE_API_KEY)
+def _build_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model="models/embedding-001",
+                                        google_api_key=settings.GOOGLE_API_KEY)
 
-vector_db_path = "vector_store"
 
-if os.path.exists(vector_db_path):
-    vector_store = FAISS.load_local(vector_db_path,
-                                    embeddings=embeddings,
-                                    allow_dangerous_deserialization=True)
-    retriever = vector_store.as_retriever(
-        search_type="similarity_score_threshold",
-        search_kwargs={"score_threshold": 0.5}
-    )
-else:
-    raise ValueError(f"Vector database not found at {vector_db_path}")
-
-
-retriever = vector_store.as_retriever(
-    search_type="similarity_score_threshold",
-    search_kwargs={"score_threshold": 0.5}
+# The embeddings client is built on first use, and each holder loads its
+# store on first use, unless `prewarm` runs at startup.
+embeddings = CachedEmbeddings(
+    Lazy(_build_embeddings, "embeddings"),
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    sqlite_path=settings.EMBEDDING_CACHE_PATH,
+    query_task_type="RETRIEVAL_QUERY",
+    model_name="models/embedding-001"
 )
+
+vector_db_path = "vector_store"
+
+
+def _holder(path):
+    return IndexHolder(path, embeddings, nprobe=settings.NPROBE,
+                       ef_search=settings.EF_SEARCH,
+                       store_format=settings.STORE_FORMAT)
+
+
+def load_holders():
+    """One IndexHolder per shard, or a single unnamed one if not sharded."""
+    if layout is None:
+        return {"": _holder(vector_db_path)}
+    return {name: _holder(shard_path(vector_db_path, name))
+            for name in layout.names}
+
+
+# A coordinator (SHARD_URLS set) searches remote shards and has no store.
+coordinator = (ShardCoordinator(settings.SHARD_URLS, embeddings,
+                                timeout=settings.SHARD_TIMEOUT)
+               if settings.SHARD_URLS else None)
+layout = ShardLayout.load(vector_db_path)
+holders = {} if coordinator is not None else load_holders()
+_shard_lock = threading.Lock()
+_watching = False
+_search_pool = ThreadPoolExecutor(
+    max_workers=settings.SHARD_SEARCH_WORKERS or max(len(holders), 1))
+
+splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE,
+                                          chunk_overlap=settings.CHUNK_OVERLAP)
+
+
+def prewarm():
+    """Build the embeddings client and load every shard's store now.
+
+    The BM25 indexes are loaded too when hybrid retrieval is the default.
+    """
+    build_components()
+    for holder in holders.values():
+        snapshot = holder.current
+        if settings.RETRIEVAL_MODE == "hybrid":
+            snapshot.lexical
+
+
+def start_watching():
+    global _watching
+    _watching = True
+    for holder in holders.values():
+        holder.start_watching(settings.INDEX_WATCH_INTERVAL)
+
+
+def stop_watching():
+    global _watching
+    _watching = False
+    for holder in holders.values():
+        holder.stop_watching()
+
+
+def _add_holder(name):
+    """Start serving shard `name`; the caller holds `_shard_lock`."""
+    global holders
+    holder = _holder(shard_path(vector_db_path, name))
+    if _watching:
+        holder.start_watching(settings.INDEX_WATCH_INTERVAL)
+    holders = {**holders, name: holder}
+    return holder
+
+
+def reload():
+    """Reload every shard from disk, including shards the CLI has added.
+
+    Switching between a sharded and an unsharded store needs a restart.
+    """
+    global layout
+    with _shard_lock:
+        if layout is not None:
+            layout = ShardLayout.load(vector_db_path)
+            for name in layout.names:
+                if name not in holders:
+                    _add_holder(name)
+    for holder in holders.values():
+        holder.reload()
+    return stats()
+
+
+def stats():
+    return [{"shard": name, **holder.stats()}
+            for name, holder in holders.items()]
+
+
+def total_vectors():
+    return sum(h.current.store.index.ntotal for h in holders.values())
+
+
+def _publish(holder, store, new_manifest):
+    """Persist an updated copy of a shard's store and start serving it.
+
+    Searches already running keep the store they started with. A
+    memory-mapped deployment reloads what was saved, so this worker keeps
+    sharing the page cache with the others.
+    """
+    save_store(store, holder.path, new_manifest,
+               store_format=holder.store_format)
+    if holder.store_format != "pickle":
+        return holder.reload()
+    return holder.publish(store, new_manifest)
+
+
+def _shard_holder(name):
+    """The holder of shard `name`, creating an empty shard if needed."""
+    with _shard_lock:
+        if name in holders:
+            return holders[name]
+        dimension = next(iter(holders.values())).current.store.index.d
+        save_store(empty_store(embeddings, dimension),
+                   shard_path(vector_db_path, name), Manifest(),
+                   store_format=settings.STORE_FORMAT)
+        _add_holder(name)
+        layout.names = sorted(holders)
+        layout.dump(vector_db_path)
+        return holders[name]
+
+
+def _shard_of(source):
+    return "" if layout is None else layout.shard_for(source)
+
+
+def _upsert(holder, documents):
+    with holder.write_lock:
+        snapshot = holder.current
+        updated = Manifest(dict(snapshot.manifest.sources))
+        new_chunks, stale = [], []
+        for document in documents:
+            source = document["source"]
+            digest = content_hash(document["text"], document["metadata"])
+            if updated.unchanged(source, digest):
+                continue
+            chunks = splitter.split_documents([Document(
+                page_content=document["text"],
+                metadata={**document["metadata"], "source": source})])
+            added, removed = updated.update(source, digest, chunks)
+            new_chunks.extend(added)
+            stale.extend(removed)
+        if (not new_chunks and not stale
+                and updated.sources == snapshot.manifest.sources):
+            return 0, 0
+        store = apply_changes(copy_store(snapshot.store), embeddings,
+                              new_chunks, stale)
+        _publish(holder, store, updated)
+        return len(new_chunks), len(stale)
+
+
+def upsert_documents(documents):
+    """Replace the indexed content of each document's source.
+
+    Args:
+        documents (list): Dicts with source, text and metadata. A source
+            that is already indexed is replaced; unchanged chunks are kept
+            without being embedded again. Each source goes to the shard
+            the layout assigns it to.
+
+    Returns:
+        dict: Chunks added and removed, and the size of the index.
+    """
+    by_shard = {}
+    for document in documents:
+        by_shard.setdefault(_shard_of(document["source"]), []).append(document)
+    added = removed = 0
+    for name, shard_documents in by_shard.items():
+        shard_added, shard_removed = _upsert(_shard_holder(name),
+                                             shard_documents)
+        added, removed = added + shard_added, removed + shard_removed
+    return {"added": added, "removed": removed, "total": total_vectors()}
+
+
+def delete_sources(sources):
+    """Remove every chunk of the given sources from the index.
+
+    Returns:
+        dict: Chunks removed and the size of the index.
+    """
+    removed = 0
+    for holder in holders.values():
+        with holder.write_lock:
+            snapshot = holder.current
+            updated = Manifest(dict(snapshot.manifest.sources))
+            stale = updated.remove(sources)
+            if not stale:
+                continue
+            store = apply_changes(copy_store(snapshot.store), embeddings, [],
+                                  stale)
+            _publish(holder, store, updated)
+            removed += len(stale)
+    return {"added": 0, "removed": removed, "total": total_vectors()}
+
+
+def document_at(store, position):
+    """The document at a FAISS position; O(1) for the columnar chunk store."""
+    if isinstance(store.docstore, ChunkStore):
+        return store.docstore.document_at(position)
+    return store.docstore.search(store.index_to_docstore_id[position])
+
+
+def _search_shard(snapshot, vectors, questions, depth, mode):
+    store = snapshot.store
+    if store.index.ntotal == 0:
+        return None
+    if store._normalize_L2:
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    dense = store.index.search(vectors, depth)
+    lexical = (snapshot.lexical.search(questions, depth)
+               if mode == "hybrid" else None)
+    return dense, lexical
+
+
+def _hit(store, position, score, fused_score=None):
+    doc = document_at(store, position)
+    return {"page_content": doc.page_content, "metadata": doc.metadata,
+            "score": score, "fused_score": fused_score}
+
+
+def _fuse(dense, lexical, k):
+    """Reciprocal rank fusion of two rankings of (shard, position) keys."""
+    fused = {}
+    for ranking in (dense, lexical):
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (settings.RRF_K + rank)
+    return heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+
+
+def batch_search(questions, k=4, score_threshold=0.5, vectors=None,
+                 mode="dense"):
+    """Search the index for several questions at once.
+
+    All questions are embedded in one call (unless `vectors` are given)
+    and searched with a single `index.search` per shard over the stacked
+    query matrix. Shards are searched in parallel on a thread pool, since
+    FAISS releases the GIL, and their hits merged into one top-k by
+    distance, smallest first; `IndexHolder` only serves L2 indexes, for
+    which that is the right order.
+
+    In "hybrid" mode the top HYBRID_CANDIDATES dense hits above the score
+    threshold and the top BM25 hits are fused with reciprocal rank fusion,
+    so a chunk that matches an exact term like "80CCD(1B)" is returned
+    even when its embedding is not close.
+
+    Returns:
+        list: One list of hits per question, each hit a dict with
+        page_content, metadata, relevance score and, in hybrid mode, the
+        fused score.
+    """
+    if vectors is None:
+        with timed_stage("embed"):
+            vectors = embeddings.embed_queries(questions)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    snapshots = [holder.current for holder in holders.values()]
+    stores = [snapshot.store for snapshot in snapshots]
+    depth = max(k, settings.HYBRID_CANDIDATES) if mode == "hybrid" else k
+
+    def search(snapshot):
+        return _search_shard(snapshot, vectors, questions, depth, mode)
+
+    with timed_stage("search"):
+        if len(snapshots) == 1:
+            found = [search(snapshots[0])]
+        else:
+            found = list(_search_pool.map(search, snapshots))
+
+    results = []
+    for row in range(len(vectors)):
+        candidates, lexical = [], []
+        for shard, result in enumerate(found):
+            if result is None:
+                continue
+            (distances, ids), shard_lexical = result
+            candidates.extend((float(distance), shard, int(i))
+                              for distance, i in zip(distances[row], ids[row])
+                              if i != -1)
+            if shard_lexical is not None:
+                bm25, positions = shard_lexical
+                lexical.extend((-float(score), shard, int(i))
+                               for score, i in zip(bm25[row], positions[row])
+                               if i != -1)
+        scores = {}
+        for distance, shard, i in heapq.nsmallest(depth, candidates):
+            score = stores[shard]._select_relevance_score_fn()(distance)
+            if score_threshold is None or score >= score_threshold:
+                scores[shard, i] = score
+        if mode != "hybrid":
+            results.append([_hit(stores[shard], i, score)
+                            for (shard, i), score in scores.items()])
+            continue
+        ranked = [(shard, i) for _, shard, i in heapq.nsmallest(depth, lexical)]
+        results.append([_hit(stores[shard], i, scores.get((shard, i)), fused)
+                        for (shard, i), fused in _fuse(list(scores), ranked, k)])
+    return results
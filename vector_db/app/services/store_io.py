@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .ann import EXACT_INDEX_FILE
+from .bm25 import BM25_FILES, write_bm25
+from .chunk_store import CHUNK_FILES, ChunkIdMap, ChunkStore, write_chunk_store
+from .docstore import (DOCSTORE_FILE, SQLiteDocs, SQLiteDocstore, SQLiteIdMap,
+                       write_sqlite_docstore)
+from .manifest import MANIFEST_FILE
+
+STORE_FILES = ["index.faiss", "index.pkl"]
+
+# IO_FLAG_MMAP alone still copies flat codes into the heap; the IFC variant
+# (faiss >= 1.10) maps them in place.
+MMAP_FLAGS = (getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+              | faiss.IO_FLAG_READ_ONLY)
+
+
+def _write_sqlite(vector_store, directory):
+    write_sqlite_docstore(vector_store, os.path.join(directory, DOCSTORE_FILE))
+
+
+# Docstore files written next to index.pkl for the non-pickle formats.
+DOCSTORE_FORMATS = {
+    "mmap": ([DOCSTORE_FILE], _write_sqlite),
+    "columnar": (CHUNK_FILES, write_chunk_store),
+}
+STORE_FORMATS = ["pickle"] + list(DOCSTORE_FORMATS)
+
+
+def load_store(directory, embeddings, store_format="pickle"):
+    """Load the FAISS store saved in `directory`.
+
+    Args:
+        store_format (str): "pickle" un-pickles index.pkl into memory.
+            "mmap" and "columnar" memory-map the index read-only and read
+            documents on demand from docstore.sqlite or the columnar chunk
+            store, so processes serving the same store share one
+            page-cache copy instead of each holding its own.
+    """
+    if store_format == "pickle":
+        return FAISS.load_local(directory, embeddings=embeddings,
+                                allow_dangerous_deserialization=True)
+    if store_format not in DOCSTORE_FORMATS:
+        raise ValueError(f"Unknown store format: {store_format}")
+    index = faiss.read_index(os.path.join(directory, "index.faiss"),
+                             MMAP_FLAGS)
+    if store_format == "mmap":
+        docs = SQLiteDocs(os.path.join(directory, DOCSTORE_FILE))
+        docstore, index_to_docstore_id = SQLiteDocstore(docs), SQLiteIdMap(docs)
+    else:
+        docstore = ChunkStore(directory)
+        index_to_docstore_id = ChunkIdMap(docstore)
+    return FAISS(embedding_function=embeddings, index=index,
+                 docstore=docstore, index_to_docstore_id=index_to_docstore_id)
+
+
+def load_exact_index(directory):
+    """The exact copy of a converted store's vectors, or None."""
+    path = os.path.join(directory, EXACT_INDEX_FILE)
+    return faiss.read_index(path) if os.path.exists(path) else None
+
+
+def copy_store(vector_store):
+    """Copy a store so it can be modified while the original serves reads.
+
+    The FAISS index is cloned into memory; documents are shared, since they
+    are replaced rather than mutated. A memory-mapped store is read in
+    full: clones of a mapped index still point at the read-only mapping, so
+    its index is copied through a serialize round trip instead.
+    """
+    if isinstance(vector_store.docstore, (SQLiteDocstore, ChunkStore)):
+        documents = vector_store.docstore.to_dict()
+        index = faiss.deserialize_index(
+            faiss.serialize_index(vector_store.index))
+    else:
+        documents = dict(vector_store.docstore._dict)
+        index = faiss.clone_index(vector_store.index)
+    return FAISS(embedding_function=vector_store.embedding_function,
+                 index=index,
+                 docstore=InMemoryDocstore(documents),
+                 index_to_docstore_id=dict(vector_store.index_to_docstore_id),
+                 relevance_score_fn=vector_store.override_relevance_score_fn,
+                 normalize_L2=vector_store._normalize_L2,
+                 distance_strategy=vector_store.distance_strategy)
+
+
+def replace_files(directory, names, write):
+    """Have `write(staging)` create `names`, then move them into `directory`.
+
+    The files are written to a temporary directory next to the target and
+    moved into place one by one, in order, with `os.replace`, which is
+    atomic on the same filesystem.
+    """
+    os.makedirs(directory, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=directory)
+    try:
+        write(staging)
+        for name in names:
+            os.replace(os.path.join(staging, name),
+                       os.path.join(directory, name))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def save_store(vector_store, directory, manifest=None, store_format="pickle",
+               exact_index=None):
+    """Persist the store (and manifest) without exposing partial files.
+
+    The manifest is replaced last, so a reader that sees a new manifest
+    also sees the index it describes. The docstore files of `store_format`
+    are written too, as are those of any format the directory already
+    has, so they never fall behind the index, and the BM25 index used
+    by hybrid search.
+
+    Args:
+        exact_index (faiss.Index | None): Flat index of the original
+            vectors of a converted store, in the same order. Without one,
+            an exact copy left by an earlier save is removed, since it no
+            longer matches the index.
+    """
+    formats = [name for name, (files, _) in DOCSTORE_FORMATS.items()
+               if name == store_format
+               or os.path.exists(os.path.join(directory, files[-1]))]
+    names = list(STORE_FILES)
+    for name in formats:
+        names.extend(DOCSTORE_FORMATS[name][0])
+    names.extend(BM25_FILES)
+    if exact_index is not None:
+        names.append(EXACT_INDEX_FILE)
+    if manifest is not None:
+        names.append(MANIFEST_FILE)
+
+    def write(staging):
+        vector_store.save_local(staging)
+        for name in formats:
+            DOCSTORE_FORMATS[name][1](vector_store, staging)
+        write_bm25(vector_store, staging)
+        if exact_index is not None:
+            faiss.write_index(exact_index,
+                              os.path.join(staging, EXACT_INDEX_FILE))
+        if manifest is not None:
+            manifest.dump(os.path.join(staging, MANIFEST_FILE))
+
+    replace_files(directory, names, write)
+    if exact_index is None:
+        try:
+            os.remove(os.path.join(directory, EXACT_INDEX_FILE))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,114 @@
+"""Recall@k vs latency of FAISS index types over held-out queries.
+
+Vectors come from an existing store (`--store`) or from a synthetic
+clustered corpus. A held-out set of query vectors is removed from the base
+set; exact neighbours from a flat index are the ground truth. Each index
+spec is a factory string with an optional sweep of one search parameter:
+
+    "IVF256,Flat:nprobe=1,8,32"   "HNSW32:efSearch=16,64"   "IVF256,PQ64"
+
+Run from the `vector_db` directory:
+
+    python -m benchmarks.ann --vectors 50000 --queries 500
+    python -m benchmarks.ann --store vector_store --queries 10 --k 4 \\
+        --index "IVF4,Flat:nprobe=1,2,4" --index "HNSW16:efSearch=8,32"
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.services.ann import build_index, reconstruct_all
+
+DEFAULT_INDEXES = [
+    "Flat",
+    "IVF256,Flat:nprobe=1,8,32",
+    "HNSW32:efSearch=16,64,128",
+    "IVF256,PQ64:nprobe=8,32",
+]
+
+
+def synthetic_vectors(count, dim, clusters=200, seed=0):
+    """Gaussian clusters, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    noise = rng.normal(scale=0.4, size=(count, dim)).astype(np.float32)
+    return centres[labels] + noise
+
+
+def store_vectors(path):
+    index = faiss.read_index(f"{path}/index.faiss")
+    return reconstruct_all(index)
+
+
+def split_queries(vectors, count, seed=1):
+    rows = np.random.default_rng(seed).permutation(len(vectors))
+    return vectors[rows[count:]], vectors[rows[:count]]
+
+
+def parse_spec(spec):
+    factory, _, sweep = spec.partition(":")
+    if not sweep:
+        return factory, None, [None]
+    name, _, values = sweep.partition("=")
+    return factory, name, [int(v) for v in values.split(",")]
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def ms_per_query(index, queries, k):
+    """Latency of one-query searches, the way the service issues them."""
+    index.search(queries[:1], k)
+    start = time.perf_counter()
+    for row in range(len(queries)):
+        index.search(queries[row:row + 1], k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", help="Use the vectors of a saved store.")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--train-size", type=int, default=None)
+    parser.add_argument("--index", action="append", dest="indexes",
+                        help="Index spec; repeat to compare several.")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = store_vectors(args.store)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim)
+    base, queries = split_queries(vectors, args.queries)
+    _, truth = build_index(base, "Flat").search(queries, args.k)
+    print(f"{len(base)} vectors, {len(queries)} held-out queries, "
+          f"k={args.k}")
+
+    print(f"{'index':<22} {'param':<14} {'recall@k':>8} {'ms/query':>9} "
+          f"{'build s':>8} {'MB':>8}")
+    for spec in args.indexes or DEFAULT_INDEXES:
+        factory, name, values = parse_spec(spec)
+        start = time.perf_counter()
+        index = build_index(base, factory, args.train_size)
+        build_seconds = time.perf_counter() - start
+        megabytes = faiss.serialize_index(index).nbytes / 1e6
+        for value in values:
+            if name is not None:
+                faiss.ParameterSpace().set_index_parameter(index, name, value)
+            _, found = index.search(queries, args.k)
+            param = f"{name}={value}" if name else "-"
+            print(f"{factory:<22} {param:<14} "
+                  f"{recall_at_k(found, truth):>8.3f} "
+                  f"{ms_per_query(index, queries, args.k):>9.3f} "
+                  f"{build_seconds:>8.2f} {megabytes:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Cold-start time and per-worker memory of each store format.
+
+Builds a synthetic store with every docstore format, then starts several
+worker processes per mode, the way uvicorn workers would load it. Each
+worker loads the store, runs a few searches, and reports load time,
+document lookup time, RSS and PSS while all workers of the mode are alive. PSS splits shared pages
+between the processes that map them, so its sum is the real footprint.
+
+Run from the `vector_db` directory (Linux, for /proc):
+
+    python -m benchmarks.cold_start --vectors 100000 --workers 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.services.store_io import STORE_FORMATS, load_store, save_store
+
+
+def build_synthetic_store(directory, count, dim, text_bytes):
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.random((count, dim), dtype=np.float32))
+    filler = "x" * text_bytes
+    docs = {str(i): Document(id=str(i), page_content=f"chunk {i} {filler}",
+                             metadata={"source": f"doc{i // 10}.pdf"})
+            for i in range(count)}
+    store = FAISS(embedding_function=FakeEmbeddings(size=dim), index=index,
+                  docstore=InMemoryDocstore(docs),
+                  index_to_docstore_id={i: str(i) for i in range(count)})
+    # Writing the columnar files also refreshes the SQLite docstore
+    # written first.
+    save_store(store, directory, store_format="mmap")
+    save_store(store, directory, store_format="columnar")
+
+
+def memory_kb():
+    """RSS and PSS of this process in kB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def worker(directory, mode, searches):
+    start = time.perf_counter()
+    store = load_store(directory, FakeEmbeddings(size=1), mode)
+    load_seconds = time.perf_counter() - start
+    queries = np.random.default_rng(os.getpid()).random(
+        (searches, store.index.d), dtype=np.float32)
+    _, ids = store.index.search(queries, 4)
+    start = time.perf_counter()
+    for i in ids.ravel():
+        store.docstore.search(store.index_to_docstore_id[int(i)])
+    lookup_us = (time.perf_counter() - start) / ids.size * 1e6
+    print(f"loaded {load_seconds} {lookup_us}", flush=True)
+    sys.stdin.readline()
+    print("memory {} {}".format(*memory_kb()), flush=True)
+    sys.stdin.read()
+
+
+def run_mode(directory, mode, workers, searches):
+    procs = [subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.cold_start", "--worker", directory,
+         "--mode", mode, "--searches", str(searches)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)]
+    loads = [tuple(float(v) for v in p.stdout.readline().split()[1:])
+             for p in procs]
+    for p in procs:
+        p.stdin.write("measure\n")
+        p.stdin.flush()
+    memory = [tuple(int(v) for v in p.stdout.readline().split()[1:])
+              for p in procs]
+    for p in procs:
+        p.stdin.close()
+        p.wait()
+    return loads, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--text-bytes", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=100)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=STORE_FORMATS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.mode, args.searches)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        build_synthetic_store(directory, args.vectors, args.dim,
+                              args.text_bytes)
+        print(f"{args.vectors} vectors x {args.dim} dims, "
+              f"{args.workers} workers")
+        print(f"{'mode':<8} {'load s':>8} {'lookup us':>10} "
+              f"{'RSS MB/worker':>14} {'PSS MB/worker':>14} "
+              f"{'PSS MB total':>13}")
+        for mode in STORE_FORMATS:
+            loads, memory = run_mode(directory, mode, args.workers,
+                                     args.searches)
+            rss = sum(m[0] for m in memory) / len(memory) / 1024
+            pss = sum(m[1] for m in memory) / 1024
+            load = sum(l[0] for l in loads) / len(loads)
+            lookup = sum(l[1] for l in loads) / len(loads)
+            print(f"{mode:<8} {load:>8.4f} {lookup:>10.1f} {rss:>14.1f} "
+                  f"{pss / len(memory):>14.1f} {pss:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
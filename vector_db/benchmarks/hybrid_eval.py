@@ -0,0 +1,91 @@
+"""Dense vs hybrid (BM25 + dense) retrieval on labelled questions.
+
+Each line of the questions file is a JSON object with the question and the
+strings a useful chunk must contain, e.g.
+
+    {"question": "Who should file ITR-2?", "expect": ["ITR-2"]}
+
+A question is answered when one of its top-k hits contains an expected
+string (case-insensitive). Unanswered questions are the ones whose
+documents `grade_documents` would throw away, sending the workflow down
+the transform_query -> web_search path, so "web search rate" is the share
+of questions left unanswered.
+
+Run from the `vector_db` directory against the store in `vector_store`:
+
+    python -m benchmarks.hybrid_eval benchmarks/hybrid_eval_sample.jsonl
+"""
+import argparse
+import json
+import time
+
+
+def load_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_relevant_rank(hits, expect):
+    expect = [text.lower() for text in expect]
+    for rank, hit in enumerate(hits, start=1):
+        content = hit["page_content"].lower()
+        if any(text in content for text in expect):
+            return rank
+    return None
+
+
+def evaluate(storage, questions, k, score_threshold, mode):
+    texts = [item["question"] for item in questions]
+    vectors = storage.embeddings.embed_queries(texts)
+    start = time.perf_counter()
+    results = storage.batch_search(texts, k, score_threshold, vectors, mode)
+    elapsed = time.perf_counter() - start
+    ranks = [first_relevant_rank(hits, item["expect"])
+             for hits, item in zip(results, questions)]
+    answered = [rank for rank in ranks if rank is not None]
+    return {
+        "mode": mode,
+        "hit_rate": len(answered) / len(questions),
+        "mrr": sum(1 / rank for rank in answered) / len(questions),
+        "web_search_rate": 1 - len(answered) / len(questions),
+        "search_ms_per_question": elapsed / len(questions) * 1000,
+        "missed": [item["question"] for item, rank in zip(questions, ranks)
+                   if rank is None],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="JSONL file of labelled questions.")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--score-threshold", type=float, default=0.5)
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Use deterministic fake embeddings, for a store "
+                             "built with ingest --fake-embeddings.")
+    parser.add_argument("--show-missed", action="store_true")
+    args = parser.parse_args()
+
+    from app.services import storage
+    if args.fake_embeddings:
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        dim = next(iter(storage.holders.values())).current.store.index.d
+        storage.embeddings.underlying = DeterministicFakeEmbedding(size=dim)
+        storage.embeddings.query_task_type = None
+
+    questions = load_questions(args.questions)
+    print(f"{len(questions)} questions, k={args.k}, "
+          f"score_threshold={args.score_threshold}")
+    for mode in ("dense", "hybrid"):
+        report = evaluate(storage, questions, args.k, args.score_threshold,
+                          mode)
+        print(f"{mode:<7} hit@{args.k} {report['hit_rate']:.3f}  "
+              f"MRR {report['mrr']:.3f}  "
+              f"web search rate {report['web_search_rate']:.3f}  "
+              f"{report['search_ms_per_question']:.2f} ms/question")
+        if args.show_missed:
+            for question in report["missed"]:
+                print(f"    missed: {question}")
+
+
+if __name__ == "__main__":
+    main()
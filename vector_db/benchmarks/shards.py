@@ -0,0 +1,201 @@
+"""Latency, throughput and recall of sharded search.
+
+Builds a synthetic store, once whole and once split into hash shards, then
+serves it three ways on local ports:
+
+    single       one process serving the whole store
+    in-process   one process searching every shard on its thread pool
+    coordinator  one process per shard behind a scatter-gather coordinator
+
+Queries carry their vectors, as a coordinator would send them, so the
+numbers measure search and merging rather than the embeddings API. Recall
+is the overlap of each top-k with an exact search of the whole store.
+
+Run from the `vector_db` directory:
+
+    python -m benchmarks.shards --vectors 200000 --shards 4
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import httpx
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.services.shards import ShardLayout, shard_path
+from app.services.store_io import save_store
+
+VECTOR_DB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def random_unit_vectors(count, dim, seed):
+    vectors = np.random.default_rng(seed).standard_normal(
+        (count, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_store(vectors, rows):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors[rows])
+    docs = {str(i): Document(id=str(i), page_content=f"chunk {i}",
+                             metadata={"source": f"doc{i // 10}.txt"})
+            for i in rows}
+    return FAISS(embedding_function=FakeEmbeddings(size=vectors.shape[1]),
+                 index=index, docstore=InMemoryDocstore(docs),
+                 index_to_docstore_id={position: str(i)
+                                       for position, i in enumerate(rows)})
+
+
+def build_stores(directory, vectors, shards, store_format):
+    save_store(make_store(vectors, list(range(len(vectors)))),
+               os.path.join(directory, "whole"), store_format=store_format)
+    layout = ShardLayout("hash", shards)
+    assignment = {}
+    for i in range(len(vectors)):
+        assignment.setdefault(layout.shard_for(f"doc{i // 10}.txt"),
+                              []).append(i)
+    sharded = os.path.join(directory, "sharded")
+    for name, rows in assignment.items():
+        save_store(make_store(vectors, rows), shard_path(sharded, name),
+                   store_format=store_format)
+    layout.names = sorted(assignment)
+    layout.dump(sharded)
+    return {"whole": os.path.join(directory, "whole"), "sharded": sharded,
+            "shards": [shard_path(sharded, name) for name in layout.names]}
+
+
+def serve(port):
+    import uvicorn
+    from app.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class Server:
+    """A vector-db process serving `store` (or coordinating `shard_urls`)."""
+
+    def __init__(self, port, directory, store=None, shard_urls=(),
+                 store_format="pickle"):
+        self.url = f"http://127.0.0.1:{port}"
+        self.cwd = tempfile.mkdtemp(prefix="server-", dir=directory)
+        if store is not None:
+            os.symlink(store, os.path.join(self.cwd, "vector_store"))
+        env = {**os.environ, "PYTHONPATH": VECTOR_DB_DIR,
+               "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "unused"),
+               "INDEX_WATCH_INTERVAL": "0", "STORE_FORMAT": store_format,
+               "SHARD_URLS": ",".join(shard_urls)}
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.shards", "--serve", str(port)],
+            cwd=self.cwd, env=env)
+
+    def wait(self, timeout=120):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(
+                    f"{self.url} exited with {self.proc.returncode}")
+            try:
+                httpx.get(f"{self.url}/openapi.json", timeout=1)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise TimeoutError(f"{self.url} did not start")
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+async def run_queries(url, queries, k, concurrency):
+    latencies, results = [], [None] * len(queries)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def one(row):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(f"{url}/vector/batch", json={
+                    "questions": ["q"], "vectors": [queries[row].tolist()],
+                    "k": k, "score_threshold": None})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+                results[row] = [hit["page_content"]
+                                for hit in response.json()["results"][0]]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(row) for row in range(len(queries))))
+        elapsed = time.perf_counter() - start
+    return latencies, results, elapsed
+
+
+def report(name, latencies, results, elapsed, truth):
+    recall = np.mean([len(set(found) & expected) / len(expected)
+                      for found, expected in zip(results, truth)])
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    print(f"{name:<12} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+          f"{len(latencies) / elapsed:8.1f} qps  recall {recall:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--store-format", default="pickle")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve)
+
+    vectors = random_unit_vectors(args.vectors, args.dim, seed=0)
+    queries = random_unit_vectors(args.queries, args.dim, seed=1)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, ids = exact.search(queries, args.k)
+    truth = [{f"chunk {i}" for i in row} for row in ids]
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Building {args.vectors} vectors in {args.shards} shards...")
+        stores = build_stores(directory, vectors, args.shards,
+                              args.store_format)
+        shard_servers = [Server(args.port + 3 + i, directory, store,
+                                store_format=args.store_format)
+                         for i, store in enumerate(stores["shards"])]
+        setups = [
+            ("single", [Server(args.port, directory, stores["whole"],
+                               store_format=args.store_format)]),
+            ("in-process", [Server(args.port + 1, directory, stores["sharded"],
+                                   store_format=args.store_format)]),
+            ("coordinator", [Server(args.port + 2, directory, shard_urls=[
+                server.url for server in shard_servers])] + shard_servers),
+        ]
+        try:
+            for _, servers in setups:
+                for server in servers:
+                    server.wait()
+            for name, servers in setups:
+                asyncio.run(run_queries(servers[0].url, queries[:20], args.k,
+                                        args.concurrency))
+                report(name, *asyncio.run(run_queries(
+                    servers[0].url, queries, args.k, args.concurrency)), truth)
+        finally:
+            for _, servers in setups:
+                for server in servers:
+                    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,610 @@
+import unittest
+from unittest.mock import patch
+import faiss
+import httpx
+from fastapi.testclient import TestClient
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+import logging
+import os
+import socket
+import tempfile
+import time
+import numpy as np
+
+from app.services import chunk_store, docstore, storage
+from app.services.ann import EXACT_INDEX_FILE, describe
+from app.services.bm25 import BM25Index, tokenize
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.index_holder import IndexHolder
+from app.services.ingest import ingest
+from app.services.manifest import Manifest
+from app.services.shards import ShardLayout, shard_path
+from app.services.store_io import load_exact_index, load_store, save_store
+
+DIMENSION = 32
+
+
+def write_corpus(directory, files):
+    """Write {relative path: text} under `directory`."""
+    for name, text in files.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def sections(topic, count):
+    """Paragraphs different enough to be split into separate chunks."""
+    return "\n\n".join(f"Section {topic}-{i}: rules on {topic} item {i}."
+                       for i in range(count))
+
+
+CORPUS = {
+    "act/income_tax.txt": sections("80C", 8),
+    "act/gst.txt": sections("GST", 8),
+    "faq/itr.txt": sections("ITR", 8),
+}
+
+
+class TestIncrementalIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "corpus")
+        self.output = os.path.join(self.tmp.name, "store")
+        self.embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+        write_corpus(self.source, CORPUS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ingest(self, **options):
+        return ingest(self.source, self.output, self.embeddings,
+                      chunk_size=60, chunk_overlap=0, workers=1, **options)
+
+    def stored_sources(self):
+        store = load_store(self.output, self.embeddings)
+        return [store.docstore.search(i).metadata["source"]
+                for i in store.index_to_docstore_id.values()], store
+
+    def test_unchanged_files_are_skipped(self):
+        first = self.ingest()
+        second = self.ingest()
+
+        self.assertGreater(first["chunks"], 0)
+        self.assertEqual(second["unchanged_files"], len(CORPUS))
+        self.assertEqual(second["chunks"], 0)
+        self.assertEqual(second["removed_chunks"], 0)
+
+    def test_modified_file_replaces_its_chunks(self):
+        self.ingest()
+        write_corpus(self.source, {"faq/itr.txt": sections("ITR-2", 3)})
+
+        report = self.ingest()
+
+        manifest = Manifest.load(self.output)
+        _, store = self.stored_sources()
+        texts = [store.docstore.search(i).page_content
+                 for i in manifest.sources["faq/itr.txt"]["chunks"]]
+        self.assertEqual(report["unchanged_files"], 2)
+        self.assertEqual(report["removed_chunks"], 8)
+        self.assertTrue(all("ITR-2" in text for text in texts))
+        self.assertEqual(store.index.ntotal, 8 + 8 + 3)
+
+    def test_deleted_file_is_removed_from_manifest_and_index(self):
+        self.ingest()
+        os.remove(os.path.join(self.source, "act", "gst.txt"))
+
+        report = self.ingest()
+
+        sources, store = self.stored_sources()
+        self.assertEqual(report["removed_chunks"], 8)
+        self.assertNotIn("act/gst.txt", Manifest.load(self.output).sources)
+        self.assertNotIn("act/gst.txt", sources)
+        self.assertEqual(store.index.ntotal, len(sources))
+
+    def test_store_without_a_manifest_needs_rebuild(self):
+        FAISS.from_texts(["Shipped chunk on section 80C."],
+                         self.embeddings).save_local(self.output)
+        shipped = self.read_index_file()
+
+        with self.assertRaisesRegex(ValueError, "--rebuild"):
+            self.ingest()
+        self.assertEqual(self.read_index_file(), shipped)
+
+        report = self.ingest(rebuild=True)
+        self.assertEqual(report["chunks"], 24)
+        self.assertEqual(load_store(self.output, None).index.ntotal, 24)
+
+    def read_index_file(self):
+        with open(os.path.join(self.output, "index.faiss"), "rb") as f:
+            return f.read()
+
+    def test_noop_reingest_leaves_a_converted_index_untouched(self):
+        self.ingest(index_factory="IVF4,PQ16x4")
+        saved = self.read_index_file()
+
+        for _ in range(3):
+            self.ingest(index_factory="IVF4,PQ16x4")
+
+        self.assertEqual(self.read_index_file(), saved)
+        self.assertEqual(describe(load_store(self.output, None).index),
+                         "IndexIVFPQ")
+
+    def test_converted_index_is_retrained_on_the_exact_vectors(self):
+        self.ingest(index_factory="IVF4,PQ16x4")
+        write_corpus(self.source, {"act/gst.txt": sections("IGST", 8)})
+
+        self.ingest(index_factory="IVF4,PQ16x4")
+
+        store = load_store(self.output, self.embeddings)
+        exact = load_exact_index(self.output)
+        texts = [store.docstore.search(store.index_to_docstore_id[i])
+                 .page_content for i in range(store.index.ntotal)]
+        np.testing.assert_allclose(
+            exact.reconstruct_n(0, exact.ntotal),
+            np.array(self.embeddings.embed_documents(texts), dtype=np.float32),
+            rtol=1e-6)
+        self.assertEqual(describe(store.index), "IndexIVFPQ")
+
+    def test_admin_save_drops_a_stale_exact_copy(self):
+        self.ingest(index_factory="IVF4,PQ16x4")
+        holder = IndexHolder(self.output, self.embeddings)
+
+        with patch.multiple(storage, holders={"": holder}, layout=None,
+                            embeddings=self.embeddings):
+            storage.delete_sources(["faq/itr.txt"])
+
+        self.assertFalse(os.path.exists(
+            os.path.join(self.output, EXACT_INDEX_FILE)))
+
+
+class TestAdminRoutes(unittest.TestCase):
+
+    def setUp(self):
+        from app.main import app
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        source = os.path.join(self.tmp.name, "corpus")
+        self.output = os.path.join(self.tmp.name, "store")
+        embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+        write_corpus(source, CORPUS)
+        ingest(source, self.output, embeddings, chunk_size=60,
+               chunk_overlap=0, workers=1)
+        self.holder = IndexHolder(self.output, embeddings)
+        patcher = patch.multiple(storage, holders={"": self.holder},
+                                 layout=None, embeddings=embeddings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = patch.object(storage.settings, "ADMIN_TOKEN", "s3cret")
+        token.start()
+        self.addCleanup(token.stop)
+        self.client = TestClient(app, headers={"X-Admin-Token": "s3cret"})
+
+    def test_wrong_or_missing_token_is_rejected(self):
+        for headers in ({"X-Admin-Token": "guess"}, {}):
+            response = TestClient(self.client.app).get("/admin/index",
+                                                       headers=headers)
+            self.assertEqual(response.status_code, 401)
+
+    def test_admin_api_is_closed_without_a_configured_token(self):
+        with patch.object(storage.settings, "ADMIN_TOKEN", None):
+            response = self.client.post("/admin/documents/delete",
+                                        json={"sources": ["act/gst.txt"]})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("act/gst.txt", self.holder.current.manifest.sources)
+
+    def test_upsert_adds_then_skips_unchanged_documents(self):
+        document = {"source": "circulars/2024-07.txt",
+                    "text": sections("TDS", 2), "metadata": {"year": 2024}}
+
+        added = self.client.post("/admin/documents",
+                                 json={"documents": [document]}).json()
+        again = self.client.post("/admin/documents",
+                                 json={"documents": [document]}).json()
+
+        self.assertEqual(added, {"added": 1, "removed": 0, "total": 25})
+        self.assertEqual(again, {"added": 0, "removed": 0, "total": 25})
+        self.assertEqual(Manifest.load(self.output).sources[
+            "circulars/2024-07.txt"]["hash"],
+            self.holder.current.manifest.sources[
+                "circulars/2024-07.txt"]["hash"])
+
+    def test_upsert_replaces_chunks_whose_metadata_changed(self):
+        document = {"source": "circulars/2024-07.txt",
+                    "text": sections("TDS", 2), "metadata": {"year": 2024}}
+        self.client.post("/admin/documents", json={"documents": [document]})
+
+        document["metadata"] = {"year": 2025}
+        changed = self.client.post("/admin/documents",
+                                   json={"documents": [document]}).json()
+
+        store = self.holder.current.store
+        chunk_id, = self.holder.current.manifest.sources[
+            "circulars/2024-07.txt"]["chunks"]
+        self.assertEqual(changed, {"added": 1, "removed": 1, "total": 25})
+        self.assertEqual(store.docstore.search(chunk_id).metadata["year"],
+                         2025)
+
+    def test_delete_by_source(self):
+        response = self.client.post("/admin/documents/delete",
+                                    json={"sources": ["act/gst.txt"]})
+
+        self.assertEqual(response.json(),
+                         {"added": 0, "removed": 8, "total": 16})
+        self.assertNotIn("act/gst.txt", Manifest.load(self.output).sources)
+        self.assertEqual(load_store(self.output, None).index.ntotal, 16)
+
+    def test_reload_serves_a_new_generation(self):
+        generation = self.holder.current.generation
+
+        response = self.client.post("/admin/reload")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["generation"], generation + 1)
+        self.assertEqual(response.json()[0]["vectors"], 24)
+
+    def test_reloads_and_updates_are_exported_as_metrics(self):
+        self.holder.current
+        self.client.post("/admin/reload")
+        self.client.post("/admin/documents/delete",
+                         json={"sources": ["act/gst.txt"]})
+
+        exported = self.client.get("/metrics").text
+
+        index = f'index="{self.output}"'
+        self.assertIn(f"vectordb_index_generation{{{index}}} 3.0", exported)
+        self.assertIn(f'vectordb_index_reloads_total{{{index},result="ok"}}'
+                      f" 1.0", exported)
+        self.assertIn(f"vectordb_index_reload_seconds_count{{{index}}} 1",
+                      exported)
+        self.assertIn(f"vectordb_index_publishes_total{{{index}}} 1.0",
+                      exported)
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Fake embeddings recording each `embed_documents` batch."""
+
+    batches: list = []
+
+    def embed_documents(self, texts, task_type=None):
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+class TestBatchSearch(unittest.TestCase):
+
+    def setUp(self):
+        from app.main import app
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        source = os.path.join(self.tmp.name, "corpus")
+        output = os.path.join(self.tmp.name, "store")
+        self.embeddings = CountingEmbeddings(size=DIMENSION)
+        write_corpus(source, CORPUS)
+        ingest(source, output, self.embeddings, chunk_size=60,
+               chunk_overlap=0, workers=1)
+        self.embeddings.batches.clear()
+        self.holder = IndexHolder(output, self.embeddings)
+        patcher = patch.multiple(
+            storage, holders={"": self.holder}, layout=None, coordinator=None,
+            embeddings=CachedEmbeddings(self.embeddings,
+                                        query_task_type="RETRIEVAL_QUERY"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+        self.questions = [sections(topic, 8).split("\n\n")[0]
+                          for topic in ("80C", "GST", "ITR")]
+
+    def batch(self, **body):
+        return self.client.post("/vector/batch", json={
+            "questions": self.questions, "mode": "dense", **body})
+
+    def test_one_embedding_call_and_one_index_search_per_batch(self):
+        index = self.holder.current.store.index
+        searched = []
+        search = type(index).search
+
+        def counted(self, x, k, **kwargs):
+            searched.append(x.shape)
+            return search(self, x, k, **kwargs)
+
+        with patch.object(type(index), "search", counted):
+            results = self.batch().json()["results"]
+
+        self.assertEqual(self.embeddings.batches, [self.questions])
+        self.assertEqual(searched, [(3, DIMENSION)])
+        self.assertEqual([hits[0]["page_content"] for hits in results],
+                         self.questions)
+
+    def test_k_is_applied_per_request(self):
+        for k in (1, 7):
+            with self.subTest(k=k):
+                results = self.batch(k=k, score_threshold=None).json()
+                self.assertEqual([len(hits) for hits in results["results"]],
+                                 [k] * 3)
+
+    def test_score_threshold_filters_hits(self):
+        unfiltered = self.batch(score_threshold=None).json()["results"]
+        filtered = self.batch(score_threshold=0.9).json()["results"]
+
+        self.assertEqual([len(hits) for hits in unfiltered], [4] * 3)
+        self.assertEqual([[hit["page_content"] for hit in hits]
+                          for hits in filtered],
+                         [[question] for question in self.questions])
+        self.assertTrue(all(hit["score"] >= 0.9
+                            for hits in filtered for hit in hits))
+
+    def test_given_vectors_skip_embedding_and_must_match_questions(self):
+        vectors = self.embeddings.embed_documents(self.questions)
+        self.embeddings.batches.clear()
+
+        given = self.batch(vectors=vectors)
+        mismatched = self.batch(vectors=vectors[:2])
+
+        self.assertEqual(given.status_code, 200)
+        self.assertEqual(self.embeddings.batches, [])
+        self.assertEqual(mismatched.status_code, 422)
+        self.assertIn("one entry per question", mismatched.text)
+
+
+class TestIndexReload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, "corpus")
+        self.output = os.path.join(self.tmp.name, "store")
+        self.embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+        write_corpus(self.source, CORPUS)
+        self.ingest()
+        self.holder = IndexHolder(self.output, self.embeddings)
+        self.assertEqual(self.holder.current.generation, 1)
+
+    def ingest(self):
+        ingest(self.source, self.output, self.embeddings, chunk_size=60,
+               chunk_overlap=0, workers=1)
+
+    def test_watcher_reloads_a_rewritten_store(self):
+        self.holder.start_watching(0.05)
+        self.addCleanup(self.holder.stop_watching)
+        os.remove(os.path.join(self.source, "act", "gst.txt"))
+
+        self.ingest()
+
+        for _ in range(100):
+            if self.holder.current.generation > 1:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.holder.current.generation, 2)
+        self.assertEqual(self.holder.current.store.index.ntotal, 16)
+        self.assertNotIn("act/gst.txt", self.holder.current.manifest.sources)
+
+    def test_search_finishes_on_the_snapshot_it_started_with(self):
+        question = sections("GST", 8).split("\n\n")[0]
+        os.remove(os.path.join(self.source, "act", "gst.txt"))
+        self.ingest()
+        fetch = storage.document_at
+
+        def reload_mid_search(store, position):
+            # The new store no longer has GST; swap it in between the
+            # index search and reading the hits.
+            if self.holder.current.generation == 1:
+                self.holder.reload()
+            return fetch(store, position)
+
+        with patch.multiple(storage, holders={"": self.holder}, layout=None,
+                            embeddings=CachedEmbeddings(self.embeddings),
+                            document_at=reload_mid_search):
+            hits, = storage.batch_search([question], k=1,
+                                         score_threshold=None)
+
+        self.assertEqual(hits[0]["page_content"], question)
+        self.assertEqual(hits[0]["metadata"]["source"], "act/gst.txt")
+        self.assertEqual(self.holder.current.generation, 2)
+        self.assertEqual(self.holder.current.store.index.ntotal, 16)
+
+
+class TestStoreFormats(unittest.TestCase):
+
+    TEXTS = ["Section 80C allows a deduction of up to Rs 1.5 lakh.",
+             "Section 80CCD(1B) adds Rs 50,000 for NPS contributions.",
+             "ITR-2 is for individuals with capital gains.",
+             "GST registration is required above Rs 40 lakh turnover.",
+             "TDS on salary is deducted under section 192."]
+    METADATAS = [{"source": "act/80c.pdf", "page": 3},
+                 {"source": "act/80c.pdf", "page": 4, "note": "NPS"},
+                 {"source": "faq/itr.md"},
+                 {"source": "gst/registration.txt", "year": 2024,
+                  "tags": ["gst", "threshold"]},
+                 {"source": "act/tds.pdf", "page": 0}]
+
+    def setUp(self):
+        from app.main import app
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "store")
+        self.embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+        save_store(FAISS.from_texts(self.TEXTS, self.embeddings,
+                                    metadatas=self.METADATAS),
+                   self.path)
+        for cli in (docstore, chunk_store):
+            with patch("sys.argv", ["convert", self.path]):
+                cli.main()
+        self.client = TestClient(app)
+
+    def search(self, store_format):
+        holder = IndexHolder(self.path, self.embeddings,
+                             store_format=store_format)
+        with patch.multiple(storage, holders={"": holder}, layout=None,
+                            embeddings=CachedEmbeddings(self.embeddings)):
+            exact = [self.client.post("/vector", json={
+                "question": text, "mode": "dense"}).json()
+                for text in self.TEXTS]
+            ranked = self.client.post("/vector/batch", json={
+                "questions": ["80C deduction", "GST turnover"], "k": 5,
+                "score_threshold": None, "mode": "dense"}).json()
+        return exact, ranked
+
+    def test_results_match_across_formats(self):
+        pickle_results = self.search("pickle")
+
+        for store_format in ("mmap", "columnar"):
+            with self.subTest(store_format=store_format):
+                self.assertEqual(self.search(store_format), pickle_results)
+
+    def test_documents_round_trip_with_their_metadata(self):
+        exact, ranked = self.search("columnar")
+
+        for response, text, metadata in zip(exact, self.TEXTS,
+                                             self.METADATAS):
+            top = response["document"][0]
+            self.assertEqual(top["page_content"], text)
+            self.assertEqual(top["metadata"], metadata)
+        self.assertEqual(len(ranked["results"][0]), 5)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestShardedSearch(unittest.TestCase):
+    """Sharded search must return the same top-k as one whole store."""
+
+    @classmethod
+    def setUpClass(cls):
+        from benchmarks.shards import build_stores
+        cls.tmp = tempfile.TemporaryDirectory()
+        embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+        vectors = np.array(embeddings.embed_documents(
+            [f"chunk about section {i}" for i in range(300)]),
+            dtype=np.float32)
+        cls.queries = np.array(embeddings.embed_documents(
+            [f"question {i}" for i in range(10)]), dtype=np.float32)
+        cls.stores = build_stores(cls.tmp.name, vectors, 3, "pickle")
+        cls.embeddings = embeddings
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def top_k(self, holders):
+        with patch.multiple(storage, holders=holders):
+            results = storage.batch_search(
+                ["q"] * len(self.queries), k=5, score_threshold=None,
+                vectors=self.queries)
+        return [[hit["page_content"] for hit in hits] for hits in results]
+
+    def whole(self):
+        return self.top_k({"": IndexHolder(self.stores["whole"],
+                                           self.embeddings)})
+
+    def test_sharded_top_k_matches_the_whole_store(self):
+        layout = ShardLayout.load(self.stores["sharded"])
+        sharded = self.top_k({
+            name: IndexHolder(shard_path(self.stores["sharded"], name),
+                              self.embeddings)
+            for name in layout.names})
+
+        self.assertEqual(len(layout.names), 3)
+        self.assertEqual(sharded, self.whole())
+
+    def test_coordinator_over_local_shard_processes(self):
+        from benchmarks.shards import Server
+        shards = [Server(free_port(), self.tmp.name, store)
+                  for store in self.stores["shards"]]
+        coordinator = Server(free_port(), self.tmp.name,
+                             shard_urls=[shard.url for shard in shards])
+        servers = shards + [coordinator]
+        self.addCleanup(lambda: [server.stop() for server in servers])
+        for server in servers:
+            server.wait()
+
+        response = httpx.post(f"{coordinator.url}/vector/batch", json={
+            "questions": ["q"] * len(self.queries),
+            "vectors": self.queries.tolist(), "k": 5,
+            "score_threshold": None}, timeout=30)
+
+        found = [[hit["page_content"] for hit in hits]
+                 for hits in response.json()["results"]]
+        self.assertEqual(found, self.whole())
+
+    def test_non_l2_indexes_are_refused(self):
+        path = os.path.join(self.tmp.name, "inner_product")
+        store = FAISS.from_texts(["80C", "GST"], self.embeddings)
+        store.index = faiss.IndexFlatIP(DIMENSION)
+        store.index.add(np.array(self.embeddings.embed_documents(
+            ["80C", "GST"]), dtype=np.float32))
+        save_store(store, path)
+
+        with self.assertRaises(ValueError):
+            IndexHolder(path, self.embeddings).current
+
+
+class TestHybridSearch(unittest.TestCase):
+
+    TARGET = "Section 80CCD(1B) allows an extra Rs 50,000 for NPS."
+    QUESTION = "How much can I claim under 80CCD(1B)?"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = os.path.join(self.tmp.name, "store")
+        self.embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+        texts = [f"Guidance note {i} on filing returns and paying advance "
+                 f"tax." for i in range(30)]
+        texts += [self.TARGET, "Deductions for life insurance and PPF are "
+                               "covered elsewhere."]
+        save_store(FAISS.from_texts(texts, self.embeddings), path)
+        self.holder = IndexHolder(path, self.embeddings)
+
+    def search(self, mode):
+        with patch.multiple(storage, holders={"": self.holder}):
+            hits = storage.batch_search(
+                [self.QUESTION], k=4, score_threshold=None,
+                vectors=[self.embeddings.embed_query(self.QUESTION)],
+                mode=mode)[0]
+        return [hit["page_content"] for hit in hits]
+
+    def test_compound_section_numbers_stay_whole(self):
+        self.assertEqual(tokenize("u/s 80CCD(1B) and ITR-2"),
+                         ["u/s", "u", "s", "80ccd(1b)", "80ccd", "1b",
+                          "itr-2", "itr", "2"])
+
+    def test_bm25_ranks_the_exact_term_first(self):
+        index = BM25Index.build({0: "Section 80C deduction limit",
+                                 1: self.TARGET,
+                                 2: "Section 80CCD(2) employer contribution"})
+
+        _, positions = index.search([self.QUESTION], 3)
+
+        self.assertEqual(positions[0][0], 1)
+
+    def test_hybrid_promotes_an_exact_section_number(self):
+        dense = self.search("dense")
+        hybrid = self.search("hybrid")
+
+        self.assertNotIn(self.TARGET, dense)
+        self.assertEqual(hybrid[0], self.TARGET)
+        self.assertEqual(hybrid[1:], dense[:3])
+        self.assertEqual(self.search("hybrid"), hybrid)
+
+    def test_rrf_orders_by_fused_rank_and_keeps_ties_stable(self):
+        fused = storage._fuse(["a", "b", "c"], ["c", "a", "d"], k=4)
+        tied = [storage._fuse(["a", "b"], ["b", "a"], k=2)
+                for _ in range(3)]
+
+        self.assertEqual([key for key, _ in fused], ["a", "c", "b", "d"])
+        rrf_k = storage.settings.RRF_K
+        self.assertAlmostEqual(fused[0][1], 1 / (rrf_k + 1) + 1 / (rrf_k + 2))
+        self.assertEqual([[key for key, _ in ranking] for ranking in tied],
+                         [["a", "b"]] * 3)
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)  # to suppress logging output in test results
+    unittest.main()